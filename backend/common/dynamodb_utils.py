@@ -2,6 +2,7 @@ import boto3
 import os
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
+from stamp_catalog import get_catalog_stamp
 
 
 # DynamoDBクライアントの初期化
@@ -75,37 +76,17 @@ def get_stamp_master(stamp_id: str) -> Optional[Dict[str, Any]]:
     """
     スタンプマスタ情報を取得
     
+    StampMastersはコンテナ内のカタログ（stamp_catalog.py）から参照するため、
+    通常はDynamoDBを読まない
+    
     Args:
         stamp_id (str): スタンプID
     
     Returns:
         Optional[Dict]: スタンプマスタ情報（存在しない場合はNone）
     """
-    table = get_table('StampMasters')
-    
     try:
-        response = table.get_item(
-            Key={
-                'StampId': stamp_id
-            }
-        )
-        
-        if 'Item' not in response:
-            return None
-        
-        item = response['Item']
-        # Decimal型を変換
-        converted_item = {}
-        for key, value in item.items():
-            if isinstance(value, Decimal):
-                converted_item[key] = int(value) if value % 1 == 0 else float(value)
-            elif isinstance(value, dict):
-                # Map型のLocationなども変換
-                converted_item[key] = {k: (int(v) if isinstance(v, Decimal) and v % 1 == 0 else float(v) if isinstance(v, Decimal) else v) for k, v in value.items()}
-            else:
-                converted_item[key] = value
-        
-        return converted_item
+        return get_catalog_stamp(stamp_id)
     except Exception as e:
         raise Exception(f"Failed to get stamp master: {str(e)}")
 
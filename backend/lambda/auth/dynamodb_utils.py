@@ -111,13 +111,15 @@ def create_or_update_user(user_id: str, display_name: str, line_id: str) -> Dict
                 converted_item[key] = value
         
         # CreatedAtが0の場合は現在時刻を設定
+        # 新規ユーザーはスタンプ数（award関数が加算する非正規化カウンター）を0で初期化
         if converted_item.get('CreatedAt') == 0:
             table.update_item(
                 Key={'UserId': user_id},
-                UpdateExpression='SET CreatedAt = :created',
-                ExpressionAttributeValues={':created': current_time}
+                UpdateExpression='SET CreatedAt = :created, StampCount = if_not_exists(StampCount, :zero)',
+                ExpressionAttributeValues={':created': current_time, ':zero': 0}
             )
             converted_item['CreatedAt'] = current_time
+            converted_item.setdefault('StampCount', 0)
         
         return converted_item
     except Exception as e:
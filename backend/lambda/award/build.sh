@@ -25,7 +25,10 @@ echo "一時ディレクトリ: $TEMP_DIR"
 echo "Pythonファイルをコピー中..."
 cp lambda_function.py "$TEMP_DIR/"
 cp dynamodb_utils.py "$TEMP_DIR/"
+cp stamp_catalog.py "$TEMP_DIR/"
+cp notification_outbox.py "$TEMP_DIR/"
 cp response_utils.py "$TEMP_DIR/"
+cp idempotency.py "$TEMP_DIR/"
 
 # 依存ライブラリをインストール（オプション）
 if [ -f "requirements.txt" ]; then
@@ -61,9 +64,12 @@ echo ""
 echo "✅ ビルド完了!"
 echo ""
 echo "次のステップ:"
-echo "1. AWS Lambdaコンソールで関数を作成または更新"
-echo "2. ZIPファイルをアップロード"
-echo "3. 環境変数を設定（TABLE_USERSTAMPS, TABLE_STAMPMASTERS）"
-echo "4. IAMロールにDynamoDB権限を追加"
+echo "1. 初回のみ backend/scripts/create_notification_outbox.py でNotificationOutboxテーブルとnotify関数へのストリームのトリガーを作成"
+echo "   （notify関数を先にデプロイしておく）"
+echo "2. AWS Lambdaコンソールで関数を作成または更新"
+echo "3. ZIPファイルをアップロード"
+echo "4. 環境変数を設定（TABLE_USERSTAMPS, TABLE_STAMPMASTERS, TABLE_RANKINGCOUNTERS, TABLE_NOTIFICATIONOUTBOX, TABLE_IDEMPOTENCYKEYS）"
+echo "5. IAMロールにDynamoDB権限を追加（NotificationOutboxへのPutItem、IdempotencyKeysへのPutItem / DeleteItemを含む）"
+echo "6. API Gatewayに /stamps/award/batch（POST、一括授与）を追加し、この関数に統合"
 echo ""
 
@@ -1,12 +1,18 @@
 import json
 import os
 import time
-import boto3
-from dynamodb_utils import get_stamp_master, check_stamp_exists, add_user_stamp
+from dynamodb_utils import (
+    get_stamp_master, get_stamp_masters, check_stamp_validity, add_user_stamp, add_user_stamps, StampAlreadyExistsError
+)
 from response_utils import create_response, create_error_response
+from idempotency import handle_idempotent_request
+from notification_outbox import enqueue_notification
 
-# Lambdaクライアント（通知送信用）
-lambda_client = boto3.client('lambda')
+# 一括授与（POST /stamps/award/batch）で1回に受け付ける最大件数
+AWARD_BATCH_MAX_ENTRIES = int(os.environ.get('AWARD_BATCH_MAX_ENTRIES', '100'))
+# 一括授与で受け付けるクライアントの収集日時の範囲（過去の秒数、未来方向の許容誤差の秒数）
+AWARD_SYNC_MAX_AGE_SECONDS = int(os.environ.get('AWARD_SYNC_MAX_AGE_SECONDS', str(7 * 86400)))
+AWARD_SYNC_CLOCK_SKEW_SECONDS = int(os.environ.get('AWARD_SYNC_CLOCK_SKEW_SECONDS', '300'))
 
 
 def validate_award_request(body: dict) -> tuple[bool, str, dict]:
@@ -47,10 +53,69 @@ def validate_award_request(body: dict) -> tuple[bool, str, dict]:
     }
 
 
+def validate_stamp_master(stamp_master: dict, method: str, collected_at: int) -> tuple[bool, str, str]:
+    """
+    スタンプマスタの有効期間・タイプのチェック
+    
+    Args:
+        stamp_master (dict): スタンプマスタ情報
+        method (str): 収集方法（GPS/IMAGE）
+        collected_at (int): 収集日時（Unixタイムスタンプ）
+    
+    Returns:
+        tuple: (is_valid, error_message, error_code)
+    """
+    # スタンプマスタの有効期間チェック（オプション、カタログのスタンプの ValidFrom / ValidTo と比較）
+    validity = check_stamp_validity(stamp_master.get('StampId'), collected_at)
+    
+    if validity == 'STAMP_NOT_VALID_YET':
+        return False, f"Stamp is not yet valid. Valid from: {stamp_master.get('ValidFrom')}", 'STAMP_NOT_VALID_YET'
+    
+    if validity == 'STAMP_EXPIRED':
+        return False, f"Stamp has expired. Valid until: {stamp_master.get('ValidTo')}", 'STAMP_EXPIRED'
+    
+    if validity == 'STAMP_NOT_FOUND':
+        return False, f"Stamp not found: {stamp_master.get('StampId')}", 'STAMP_NOT_FOUND'
+    
+    if validity == 'INVALID_STAMP_VALIDITY':
+        return False, f"Invalid validity period: {stamp_master.get('ValidFrom')} - {stamp_master.get('ValidTo')}", 'INVALID_STAMP_VALIDITY'
+    
+    # スタンプタイプのチェック（GPS/IMAGEと一致しているか）
+    # 注意: スタンプマスターのTypeが設定されている場合のみチェック
+    # Typeが設定されていない場合は、GPS/IMAGEのどちらでも許可
+    stamp_type = stamp_master.get('Type', '').upper()
+    if stamp_type and stamp_type not in ['GPS', 'IMAGE']:
+        # TypeがGPS/IMAGE以外の場合はエラー
+        return False, f'Invalid stamp type: {stamp_type}', 'INVALID_STAMP_TYPE'
+    
+    # Typeが設定されている場合、methodと一致することを確認
+    # ただし、Typeが設定されていない場合は、GPS/IMAGEのどちらでも許可
+    if stamp_type and stamp_type != method:
+        # 警告ログを出力するが、エラーにはしない（両方の方法で取得可能にする）
+        print(f'Warning: Stamp type mismatch. Expected: {stamp_type}, Got: {method}. Proceeding anyway.')
+    
+    return True, '', ''
+
+
 def lambda_handler(event, context):
+    """
+    POST /stamps/award, POST /stamps/award/batch のエントリーポイント
+    
+    Idempotency-Keyヘッダーがある場合、同じキーの再送には最初の応答をそのまま返す
+    （"Idempotent-Replayed: true" ヘッダー付き。idempotency.pyを参照）
+    """
+    # OPTIONSリクエストの処理（CORS preflight）
+    if event.get('httpMethod') == 'OPTIONS':
+        return create_response(200, {})
+    
+    return handle_idempotent_request(event, 'award', process_award_request, create_error_response)
+
+
+def process_award_request(event):
     """
     スタンプを授与する
     POST /stamps/award
+    POST /stamps/award/batch（一括授与、handle_batch_awardを参照）
     
     リクエストボディ:
     {
@@ -84,6 +149,10 @@ def lambda_handler(event, context):
         # リクエストボディの取得
         body = json.loads(event.get('body', '{}'))
         
+        # 一括授与（オフライン中に収集したスタンプの同期）
+        if event.get('path', '').rstrip('/').endswith('/stamps/award/batch'):
+            return handle_batch_award(body)
+        
         # バリデーション
         is_valid, error_message, validated_data = validate_award_request(body)
         if not is_valid:
@@ -101,47 +170,12 @@ def lambda_handler(event, context):
         except Exception as e:
             return create_error_response(500, f'Failed to check stamp master: {str(e)}', 'DATABASE_ERROR')
         
-        # スタンプマスタの有効期間チェック（オプション）
-        current_time = int(time.time())
-        valid_from = stamp_master.get('ValidFrom')
-        valid_to = stamp_master.get('ValidTo')
-        
-        if valid_from and current_time < valid_from:
-            return create_error_response(400, f'Stamp is not yet valid. Valid from: {valid_from}', 'STAMP_NOT_VALID_YET')
-        
-        if valid_to and current_time > valid_to:
-            return create_error_response(400, f'Stamp has expired. Valid until: {valid_to}', 'STAMP_EXPIRED')
-        
-        # スタンプタイプのチェック（GPS/IMAGEと一致しているか）
-        # 注意: スタンプマスターのTypeが設定されている場合のみチェック
-        # Typeが設定されていない場合は、GPS/IMAGEのどちらでも許可
-        stamp_type = stamp_master.get('Type', '').upper()
-        if stamp_type and stamp_type not in ['GPS', 'IMAGE']:
-            # TypeがGPS/IMAGE以外の場合はエラー
-            return create_error_response(400, 
-                f'Invalid stamp type: {stamp_type}', 
-                'INVALID_STAMP_TYPE')
-        
-        # Typeが設定されている場合、methodと一致することを確認
-        # ただし、Typeが設定されていない場合は、GPS/IMAGEのどちらでも許可
-        if stamp_type and stamp_type != method:
-            # 警告ログを出力するが、エラーにはしない（両方の方法で取得可能にする）
-            print(f'Warning: Stamp type mismatch. Expected: {stamp_type}, Got: {method}. Proceeding anyway.')
-            # エラーにしない（両方の方法で取得可能にする）
-            # return create_error_response(400, 
-            #     f'Stamp type mismatch. Expected: {stamp_type}, Got: {method}', 
-            #     'STAMP_TYPE_MISMATCH')
-        
-        # 重複チェック
-        try:
-            if check_stamp_exists(user_id, stamp_id):
-                return create_error_response(409, 
-                    f'User already has this stamp: {stamp_id}', 
-                    'STAMP_ALREADY_EXISTS')
-        except Exception as e:
-            return create_error_response(500, f'Failed to check stamp existence: {str(e)}', 'DATABASE_ERROR')
+        # スタンプマスタの有効期間・タイプのチェック
+        is_valid, error_message, error_code = validate_stamp_master(stamp_master, method, int(time.time()))
+        if not is_valid:
+            return create_error_response(400, error_message, error_code)
         
-        # スタンプを追加
+        # スタンプを追加（重複は条件付き書き込みで判定）
         try:
             result = add_user_stamp(user_id, stamp_id, method)
             
@@ -160,6 +194,10 @@ def lambda_handler(event, context):
             
             return create_response(200, response_data)
             
+        except StampAlreadyExistsError:
+            return create_error_response(409, 
+                f'User already has this stamp: {stamp_id}', 
+                'STAMP_ALREADY_EXISTS')
         except Exception as e:
             return create_error_response(500, f'Failed to add stamp: {str(e)}', 'DATABASE_ERROR')
         
@@ -169,41 +207,216 @@ def lambda_handler(event, context):
         return create_error_response(500, f'Internal Server Error: {str(e)}', 'INTERNAL_ERROR')
 
 
+def validate_batch_award_request(body: dict) -> tuple[bool, str, dict]:
+    """
+    一括授与リクエストのバリデーション（リクエスト全体の形式のみ。各エントリーはhandle_batch_awardで検証）
+    
+    Args:
+        body (dict): リクエストボディ
+    
+    Returns:
+        tuple: (is_valid, error_message, validated_data)
+    """
+    user_id = body.get('user_id')
+    entries = body.get('entries')
+    
+    if not user_id:
+        return False, 'user_id is required', {}
+    
+    if not isinstance(entries, list) or not entries:
+        return False, 'entries must be a non-empty list', {}
+    
+    if len(entries) > AWARD_BATCH_MAX_ENTRIES:
+        return False, f'entries must not exceed {AWARD_BATCH_MAX_ENTRIES} items', {}
+    
+    return True, '', {
+        'user_id': user_id,
+        'entries': entries
+    }
+
+
+def validate_batch_entry(entry, now: int) -> tuple[bool, str, str, dict]:
+    """
+    一括授与の各エントリーのバリデーション
+    
+    Args:
+        entry: エントリー（{"stamp_id", "method", "client_collected_at"}）
+        now (int): 現在時刻（Unixタイムスタンプ）
+    
+    Returns:
+        tuple: (is_valid, error_message, error_code, validated_entry)
+            validated_entryのcollected_atは、client_collected_atが省略された場合は現在時刻
+    """
+    if not isinstance(entry, dict):
+        return False, 'entry must be an object', 'VALIDATION_ERROR', {}
+    
+    stamp_id = entry.get('stamp_id')
+    method = entry.get('method')
+    collected_at = entry.get('client_collected_at')
+    
+    if not stamp_id or not isinstance(stamp_id, str):
+        return False, 'stamp_id is required', 'VALIDATION_ERROR', {}
+    
+    if method not in ['GPS', 'IMAGE']:
+        return False, 'method must be either GPS or IMAGE', 'VALIDATION_ERROR', {}
+    
+    if collected_at is None:
+        collected_at = now
+    elif isinstance(collected_at, bool) or not isinstance(collected_at, (int, float)):
+        return False, 'client_collected_at must be a Unix timestamp', 'INVALID_COLLECTED_AT', {}
+    else:
+        collected_at = int(collected_at)
+        # 端末の時刻は信用しきれないため、受け付ける範囲を制限する
+        if collected_at > now + AWARD_SYNC_CLOCK_SKEW_SECONDS or collected_at < now - AWARD_SYNC_MAX_AGE_SECONDS:
+            return False, f'client_collected_at is out of range: {collected_at}', 'INVALID_COLLECTED_AT', {}
+        collected_at = min(collected_at, now)
+    
+    return True, '', '', {
+        'stamp_id': stamp_id,
+        'method': method,
+        'collected_at': collected_at
+    }
+
+
+def handle_batch_award(body: dict):
+    """
+    スタンプを一括で授与する（オフライン中に収集したスタンプの同期）
+    POST /stamps/award/batch
+    
+    リクエストボディ:
+    {
+        "user_id": "USER_ID",
+        "entries": [
+            {"stamp_id": "STAMP_ID", "method": "GPS" or "IMAGE", "client_collected_at": 1234567890},
+            ...
+        ]
+    }
+    
+    スタンプマスタはカタログを1回参照して全エントリーを検証し、新しいスタンプは
+    条件付き書き込みでまとめて追加する。エントリーごとの失敗はリクエスト全体の失敗にせず、
+    resultsに記録する。通知は授与したスタンプをまとめて1回だけ送信する
+    
+    レスポンス（成功時）:
+    {
+        "ok": true,
+        "user_id": "USER_ID",
+        "awarded_count": 1,
+        "results": [
+            {"stamp_id": "STAMP_ID", "ok": true, "collected_at": 1234567890},
+            {"stamp_id": "STAMP_ID", "ok": false, "error_code": "STAMP_ALREADY_EXISTS", "message": "..."}
+        ],
+        "message": "Stamps synchronized successfully"
+    }
+    """
+    is_valid, error_message, validated_data = validate_batch_award_request(body)
+    if not is_valid:
+        return create_error_response(400, error_message, 'VALIDATION_ERROR')
+    
+    user_id = validated_data['user_id']
+    entries = validated_data['entries']
+    now = int(time.time())
+    
+    results = [None] * len(entries)
+    pending = []
+    seen_stamp_ids = set()
+    for index, entry in enumerate(entries):
+        is_valid, error_message, error_code, validated_entry = validate_batch_entry(entry, now)
+        stamp_id = entry.get('stamp_id') if isinstance(entry, dict) else None
+        if not is_valid:
+            results[index] = {'stamp_id': stamp_id, 'ok': False, 'error_code': error_code, 'message': error_message}
+        elif validated_entry['stamp_id'] in seen_stamp_ids:
+            results[index] = {'stamp_id': stamp_id, 'ok': False, 'error_code': 'DUPLICATE_ENTRY',
+                              'message': f'Duplicate entry in request: {stamp_id}'}
+        else:
+            seen_stamp_ids.add(validated_entry['stamp_id'])
+            pending.append((index, validated_entry))
+    
+    # スタンプマスタの存在確認（カタログを1回だけ参照）
+    try:
+        stamp_masters = get_stamp_masters([entry['stamp_id'] for _, entry in pending])
+    except Exception as e:
+        return create_error_response(500, f'Failed to check stamp master: {str(e)}', 'DATABASE_ERROR')
+    
+    writes = []
+    for index, entry in pending:
+        stamp_id = entry['stamp_id']
+        stamp_master = stamp_masters.get(stamp_id)
+        if not stamp_master:
+            results[index] = {'stamp_id': stamp_id, 'ok': False, 'error_code': 'STAMP_NOT_FOUND',
+                              'message': f'Stamp not found: {stamp_id}'}
+            continue
+        
+        # 有効期間は収集した時点で判定する
+        is_valid, error_message, error_code = validate_stamp_master(stamp_master, entry['method'], entry['collected_at'])
+        if not is_valid:
+            results[index] = {'stamp_id': stamp_id, 'ok': False, 'error_code': error_code, 'message': error_message}
+            continue
+        
+        writes.append((index, entry))
+    
+    # スタンプを追加（重複は条件付き書き込みで判定）
+    awarded = []
+    for (index, entry), result in zip(writes, add_user_stamps(user_id, [entry for _, entry in writes])):
+        stamp_id = entry['stamp_id']
+        if result['status'] == 'awarded':
+            results[index] = {'stamp_id': stamp_id, 'ok': True, 'method': entry['method'],
+                              'collected_at': result['collected_at']}
+            awarded.append(stamp_masters[stamp_id])
+        elif result['status'] == 'already_exists':
+            results[index] = {'stamp_id': stamp_id, 'ok': False, 'error_code': 'STAMP_ALREADY_EXISTS',
+                              'message': f'User already has this stamp: {stamp_id}'}
+        else:
+            results[index] = {'stamp_id': stamp_id, 'ok': False, 'error_code': 'DATABASE_ERROR',
+                              'message': f"Failed to add stamp: {result.get('error', '')}"}
+    
+    # 授与したスタンプをまとめて1回だけ通知
+    if len(awarded) == 1:
+        send_notification_async(user_id, awarded[0]['StampId'], awarded[0])
+    elif awarded:
+        send_batch_notification_async(user_id, awarded)
+    
+    print(f'一括授与: user_id={user_id}, entries={len(entries)}, awarded={len(awarded)}')
+    
+    return create_response(200, {
+        'ok': True,
+        'user_id': user_id,
+        'awarded_count': len(awarded),
+        'results': results,
+        'message': 'Stamps synchronized successfully'
+    })
+
+
 def send_notification_async(user_id: str, stamp_id: str, stamp_master: dict):
     """
-    スタンプ取得通知を非同期で送信
+    スタンプ取得通知をアウトボックスに積む（送信はnotify関数が別途まとめて行う）
     
     Args:
         user_id (str): ユーザーID
         stamp_id (str): スタンプID
         stamp_master (dict): スタンプマスタ情報
     """
-    try:
-        # notify関数の関数名を環境変数から取得（デフォルト: notify）
-        notify_function_name = os.environ.get('NOTIFY_FUNCTION_NAME', 'notify')
-        
-        # 通知データの準備
-        stamp_name = stamp_master.get('Name', 'スタンプ')
-        stamp_image_url = stamp_master.get('ImageUrl', '')
-        
-        # notify関数を非同期で呼び出し
-        lambda_client.invoke(
-            FunctionName=notify_function_name,
-            InvocationType='Event',  # 非同期実行
-            Payload=json.dumps({
-                'httpMethod': 'POST',
-                'body': json.dumps({
-                    'user_id': user_id,
-                    'type': 'stamp_awarded',
-                    'data': {
-                        'stamp_id': stamp_id,
-                        'stamp_name': stamp_name,
-                        'stamp_image_url': stamp_image_url
-                    }
-                })
-            })
-        )
-    except Exception as e:
-        # 通知失敗はログのみ（スタンプ授与は成功）
-        print(f'Failed to send notification: {str(e)}')
+    enqueue_notification(user_id, 'stamp_awarded', {
+        'stamp_id': stamp_id,
+        'stamp_name': stamp_master.get('Name', 'スタンプ'),
+        'stamp_image_url': stamp_master.get('ImageUrl', '')
+    })
+
 
+def send_batch_notification_async(user_id: str, stamp_masters: list):
+    """
+    複数スタンプの取得通知をまとめて1件としてアウトボックスに積む
+    
+    Args:
+        user_id (str): ユーザーID
+        stamp_masters (list): 授与したスタンプのマスタ情報のリスト
+    """
+    enqueue_notification(user_id, 'stamps_awarded', {
+        'stamps': [
+            {
+                'stamp_id': stamp_master.get('StampId', ''),
+                'stamp_name': stamp_master.get('Name', 'スタンプ'),
+                'stamp_image_url': stamp_master.get('ImageUrl', '')
+            }
+            for stamp_master in stamp_masters
+        ]
+    })
@@ -0,0 +1,126 @@
+import boto3
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict
+
+
+# 通知の送り方
+#   'dynamodb': NotificationOutboxテーブルに書き込むだけで返す（デフォルト）。notify関数がテーブルの
+#               DynamoDB Streamsからまとめて取り出して送信する（授与のレスポンスはLambda Invokeを待たない）。
+#               テーブルとストリームのトリガーは backend/scripts/create_notification_outbox.py で作成する
+#   'invoke':   従来どおり授与のたびにnotify関数を非同期Invokeする
+NOTIFICATION_OUTBOX = os.environ.get('NOTIFICATION_OUTBOX', 'dynamodb')
+# アウトボックスのレコードの保持日数（TTLで自動削除。送信はストリーム経由のため短くてよい）
+NOTIFICATION_OUTBOX_TTL_DAYS = int(os.environ.get('NOTIFICATION_OUTBOX_TTL_DAYS', '3'))
+
+dynamodb = boto3.resource('dynamodb')
+lambda_client = boto3.client('lambda')
+
+# NotificationOutboxテーブルが存在しない場合True（以降は書き込みを試さずにnotify関数を呼び出す）
+_outbox_table_missing = False
+
+
+def get_outbox_table():
+    """
+    NotificationOutboxテーブルリソースを取得
+
+    Returns:
+        dynamodb.Table: テーブルリソース
+    """
+    return dynamodb.Table(os.environ.get('TABLE_NOTIFICATIONOUTBOX', 'NotificationOutbox'))
+
+
+def build_notification(user_id: str, notify_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    notify関数に渡す通知（POST /notify のボディと同じ形式）を作成
+
+    Args:
+        user_id (str): ユーザーID
+        notify_type (str): 通知タイプ（stamp_awarded / stamps_awarded など）
+        data (Dict): 通知データ
+
+    Returns:
+        Dict: {'user_id', 'type', 'data'}
+    """
+    return {'user_id': user_id, 'type': notify_type, 'data': data}
+
+
+def invoke_notify(notification: Dict[str, Any]):
+    """
+    notify関数を非同期で呼び出す
+
+    Args:
+        notification (Dict): build_notification()で作成した通知
+    """
+    # notify関数の関数名を環境変数から取得（デフォルト: notify）
+    notify_function_name = os.environ.get('NOTIFY_FUNCTION_NAME', 'notify')
+    lambda_client.invoke(
+        FunctionName=notify_function_name,
+        InvocationType='Event',  # 非同期実行
+        Payload=json.dumps({
+            'httpMethod': 'POST',
+            'body': json.dumps(notification)
+        })
+    )
+
+
+def is_resource_not_found(error: Exception) -> bool:
+    """ResourceNotFoundException（テーブルが存在しない）かどうかを判定"""
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ResourceNotFoundException'
+
+
+def mark_outbox_table_missing():
+    """
+    NotificationOutboxテーブルがないことを記録し、コンテナごとに1回だけログを出す
+
+    以降の通知はテーブルへの書き込みを試さずにnotify関数を直接呼び出す
+    """
+    global _outbox_table_missing
+    if not _outbox_table_missing:
+        _outbox_table_missing = True
+        print(f'NotificationOutbox table not found ({get_outbox_table().name}), '
+              f'invoking notify directly until the container is recycled')
+
+
+def enqueue_notification(user_id: str, notify_type: str, data: Dict[str, Any]):
+    """
+    通知をアウトボックスに積む（送信はnotify関数が別途まとめて行う）
+
+    アウトボックスへの書き込みに失敗した場合は、通知を落とさないようnotify関数を直接呼び出す
+    （テーブルが存在しない場合はコンテナごとに1回だけログを出し、以降は書き込みを試さない）。
+    通知の失敗はログのみ（スタンプ授与は成功扱い）
+
+    Args:
+        user_id (str): ユーザーID
+        notify_type (str): 通知タイプ
+        data (Dict): 通知データ
+    """
+    notification = build_notification(user_id, notify_type, data)
+
+    try:
+        if NOTIFICATION_OUTBOX == 'dynamodb' and not _outbox_table_missing:
+            now = int(time.time())
+            try:
+                get_outbox_table().put_item(Item={
+                    'NotificationId': str(uuid.uuid4()),
+                    'UserId': user_id,
+                    'Type': notify_type,
+                    'Data': json.dumps(data, ensure_ascii=False),
+                    'CreatedAt': now,
+                    'TTL': now + NOTIFICATION_OUTBOX_TTL_DAYS * 86400
+                })
+                return
+            except Exception as e:
+                if is_resource_not_found(e):
+                    mark_outbox_table_missing()
+                else:
+                    print(f'Failed to write notification outbox, invoking notify directly: {str(e)}')
+
+        invoke_notify(notification)
+    except Exception as e:
+        # 通知失敗はログのみ（スタンプ授与は成功）
+        print(f'Failed to send notification: {str(e)}')
+
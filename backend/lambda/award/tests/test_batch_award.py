@@ -0,0 +1,219 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# award関数はboto3を同梱しているため、そのまま読み込む（リソースの作成にはリージョンだけが必要）
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import dynamodb_utils  # noqa: E402
+import lambda_function  # noqa: E402
+
+NOW = 1762700000
+
+STAMP_MASTERS = {
+    'stamp_001': {'StampId': 'stamp_001', 'Name': '駅前広場', 'ImageUrl': 'https://example.com/001.png'},
+    'stamp_002': {'StampId': 'stamp_002', 'Name': '市役所', 'ImageUrl': 'https://example.com/002.png'},
+    'stamp_003': {'StampId': 'stamp_003', 'Name': '図書館', 'ImageUrl': ''},
+    'expired': {'StampId': 'expired', 'Name': '期間限定', 'ValidTo': NOW - 86400}
+}
+
+
+def check_stamp_validity(stamp_id, at):
+    """カタログの代わりに STAMP_MASTERS の ValidFrom / ValidTo で判定する"""
+    stamp = STAMP_MASTERS.get(stamp_id)
+    if not stamp:
+        return 'STAMP_NOT_FOUND'
+    if stamp.get('ValidFrom') and at < stamp['ValidFrom']:
+        return 'STAMP_NOT_VALID_YET'
+    if stamp.get('ValidTo') and at > stamp['ValidTo']:
+        return 'STAMP_EXPIRED'
+    return None
+
+
+class HandleBatchAwardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.owned = {'stamp_003'}
+        self.written = []
+        self.notifications = []
+        patches = [
+            mock.patch('time.time', return_value=NOW),
+            mock.patch.object(lambda_function, 'get_stamp_masters', self.get_stamp_masters),
+            mock.patch.object(lambda_function, 'check_stamp_validity', check_stamp_validity),
+            mock.patch.object(lambda_function, 'add_user_stamps', self.add_user_stamps),
+            mock.patch.object(lambda_function, 'enqueue_notification', self.enqueue_notification)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get_stamp_masters(self, stamp_ids):
+        return {stamp_id: dict(STAMP_MASTERS[stamp_id]) for stamp_id in stamp_ids if stamp_id in STAMP_MASTERS}
+
+    def add_user_stamps(self, user_id, entries):
+        self.written.extend(entry['stamp_id'] for entry in entries)
+        return [
+            {'stamp_id': entry['stamp_id'], 'collected_at': entry['collected_at'],
+             'status': 'already_exists' if entry['stamp_id'] in self.owned else 'awarded'}
+            for entry in entries
+        ]
+
+    def enqueue_notification(self, user_id, notify_type, data):
+        self.notifications.append((user_id, notify_type, data))
+
+    def award(self, entries):
+        response = lambda_function.handle_batch_award({'user_id': 'U0001', 'entries': entries})
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_results_are_reported_per_entry(self):
+        status, body = self.award([
+            {'stamp_id': 'stamp_001', 'method': 'GPS', 'client_collected_at': NOW - 3600},
+            {'stamp_id': 'missing', 'method': 'GPS'},
+            {'stamp_id': 'stamp_003', 'method': 'IMAGE'},
+            {'stamp_id': 'expired', 'method': 'GPS'},
+            {'stamp_id': 'stamp_002', 'method': 'QR'},
+            'not an object'
+        ])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['awarded_count'], 1)
+        self.assertEqual(body['results'][0], {'stamp_id': 'stamp_001', 'ok': True, 'method': 'GPS',
+                                              'collected_at': NOW - 3600})
+        self.assertEqual([result.get('error_code') for result in body['results'][1:]],
+                         ['STAMP_NOT_FOUND', 'STAMP_ALREADY_EXISTS', 'STAMP_EXPIRED',
+                          'VALIDATION_ERROR', 'VALIDATION_ERROR'])
+        # 検証に失敗したエントリーは書き込まない
+        self.assertEqual(self.written, ['stamp_001', 'stamp_003'])
+
+    def test_duplicate_entries_are_rejected(self):
+        status, body = self.award([
+            {'stamp_id': 'stamp_001', 'method': 'GPS'},
+            {'stamp_id': 'stamp_001', 'method': 'IMAGE'}
+        ])
+
+        self.assertEqual(status, 200)
+        self.assertTrue(body['results'][0]['ok'])
+        self.assertEqual(body['results'][1]['error_code'], 'DUPLICATE_ENTRY')
+        self.assertEqual(self.written, ['stamp_001'])
+
+    def test_client_collected_at_limits(self):
+        max_age = lambda_function.AWARD_SYNC_MAX_AGE_SECONDS
+        skew = lambda_function.AWARD_SYNC_CLOCK_SKEW_SECONDS
+        self.assertEqual((max_age, skew), (7 * 86400, 300))
+
+        status, body = self.award([
+            {'stamp_id': 'stamp_001', 'method': 'GPS', 'client_collected_at': NOW - max_age},
+            {'stamp_id': 'stamp_002', 'method': 'GPS', 'client_collected_at': NOW + skew},
+            {'stamp_id': 'stamp_003', 'method': 'GPS', 'client_collected_at': NOW - max_age - 1},
+            {'stamp_id': 'expired', 'method': 'GPS', 'client_collected_at': NOW + skew + 1},
+            {'stamp_id': 'missing', 'method': 'GPS', 'client_collected_at': '2025-11-09'}
+        ])
+
+        self.assertEqual(status, 200)
+        results = body['results']
+        self.assertEqual(results[0]['collected_at'], NOW - max_age)
+        # 許容誤差内の未来の時刻は現在時刻に丸める
+        self.assertEqual(results[1]['collected_at'], NOW)
+        self.assertEqual([result['error_code'] for result in results[2:]], ['INVALID_COLLECTED_AT'] * 3)
+
+    def test_single_combined_notification(self):
+        self.award([
+            {'stamp_id': 'stamp_001', 'method': 'GPS'},
+            {'stamp_id': 'stamp_002', 'method': 'GPS'},
+            {'stamp_id': 'stamp_003', 'method': 'GPS'}
+        ])
+
+        self.assertEqual(len(self.notifications), 1)
+        user_id, notify_type, data = self.notifications[0]
+        self.assertEqual((user_id, notify_type), ('U0001', 'stamps_awarded'))
+        self.assertEqual([stamp['stamp_id'] for stamp in data['stamps']], ['stamp_001', 'stamp_002'])
+
+    def test_single_award_uses_single_stamp_notification(self):
+        self.award([{'stamp_id': 'stamp_001', 'method': 'GPS'}, {'stamp_id': 'stamp_003', 'method': 'GPS'}])
+
+        self.assertEqual([(n[1], n[2]['stamp_id']) for n in self.notifications], [('stamp_awarded', 'stamp_001')])
+
+    def test_no_notification_without_awards(self):
+        self.award([{'stamp_id': 'stamp_003', 'method': 'GPS'}])
+
+        self.assertEqual(self.notifications, [])
+
+    def test_invalid_request(self):
+        for body in ({'entries': [{'stamp_id': 'stamp_001', 'method': 'GPS'}]},
+                     {'user_id': 'U0001', 'entries': []},
+                     {'user_id': 'U0001', 'entries': [{}] * (lambda_function.AWARD_BATCH_MAX_ENTRIES + 1)}):
+            response = lambda_function.handle_batch_award(body)
+            self.assertEqual(response['statusCode'], 400)
+            self.assertEqual(json.loads(response['body'])['error_code'], 'VALIDATION_ERROR')
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class FakeDynamoDBClient:
+    """条件付きPutItemだけを持つ低レベルクライアント（existing のキーは条件チェックで失敗する）"""
+
+    exceptions = mock.Mock(ConditionalCheckFailedException=ConditionalCheckFailedException)
+
+    def __init__(self, existing, failing=()):
+        self.existing = set(existing)
+        self.failing = set(failing)
+        self.items = {}
+
+    def put_item(self, TableName, Item, ConditionExpression):
+        stamp_id = Item['StampId']['S']
+        if stamp_id in self.failing:
+            raise Exception('ProvisionedThroughputExceededException')
+        if stamp_id in self.existing:
+            raise ConditionalCheckFailedException('The conditional request failed')
+        self.existing.add(stamp_id)
+        self.items[stamp_id] = Item
+
+
+class AddUserStampsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeDynamoDBClient(existing={'stamp_002'}, failing={'stamp_004'})
+        self.calls = []
+        patches = [
+            mock.patch.object(dynamodb_utils, 'dynamodb_client', self.client),
+            mock.patch.object(dynamodb_utils, 'RANKING_COUNTERS_SOURCE', 'award'),
+            mock.patch.object(dynamodb_utils, 'bump_collection_version',
+                              lambda user_id, at: self.calls.append(('version', at))),
+            mock.patch.object(dynamodb_utils, 'add_ranking_counters',
+                              lambda user_id, ats: self.calls.append(('counters', sorted(ats)))),
+            mock.patch.object(dynamodb_utils, 'increment_user_stamp_count',
+                              lambda user_id, count=1: self.calls.append(('stamp_count', count)))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_conditional_check_failure_maps_to_already_exists(self):
+        results = dynamodb_utils.add_user_stamps('U0001', [
+            {'stamp_id': 'stamp_001', 'method': 'GPS', 'collected_at': NOW - 60},
+            {'stamp_id': 'stamp_002', 'method': 'GPS', 'collected_at': NOW - 30},
+            {'stamp_id': 'stamp_003', 'method': 'IMAGE', 'collected_at': NOW},
+            {'stamp_id': 'stamp_004', 'method': 'GPS', 'collected_at': NOW}
+        ])
+
+        self.assertEqual([result['status'] for result in results], ['awarded', 'already_exists', 'awarded', 'error'])
+        self.assertIn('ProvisionedThroughputExceededException', results[3]['error'])
+        self.assertEqual(sorted(self.client.items), ['stamp_001', 'stamp_003'])
+        # 成功した件数だけをまとめて1回ずつ加算する
+        self.assertEqual(self.calls, [('version', NOW), ('counters', [NOW - 60, NOW]), ('stamp_count', 2)])
+
+    def test_nothing_is_incremented_when_all_exist(self):
+        results = dynamodb_utils.add_user_stamps('U0001', [{'stamp_id': 'stamp_002', 'method': 'GPS', 'collected_at': NOW}])
+
+        self.assertEqual(results[0]['status'], 'already_exists')
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
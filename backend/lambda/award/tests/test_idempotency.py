@@ -0,0 +1,196 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# award関数はboto3を同梱しているため、そのまま読み込む（クライアントの作成にはリージョンだけが必要）
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import idempotency  # noqa: E402
+
+NOW = 1762700000
+
+
+class ConditionalCheckFailedException(Exception):
+    """botocoreのClientError（ConditionalCheckFailedException）と同じ形のresponseを持つ例外"""
+
+    def __init__(self, item=None):
+        super().__init__('The conditional request failed')
+        self.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+        if item is not None:
+            self.response['Item'] = item
+
+
+class FakeDynamoDBClient:
+    """IdempotencyKeysの条件式を評価してメモリ上のアイテムを更新する低レベルクライアント"""
+
+    exceptions = mock.Mock(ConditionalCheckFailedException=ConditionalCheckFailedException)
+
+    def __init__(self):
+        self.items = {}
+        self.calls = []
+
+    def put_item(self, TableName, Item, **kwargs):
+        record_key = Item['RecordKey']['S']
+        self.calls.append(('put_item', record_key, Item['Status']['S']))
+        existing = self.items.get(record_key)
+        if 'ConditionExpression' in kwargs and existing is not None:
+            now = int(kwargs['ExpressionAttributeValues'][':now']['N'])
+            expired_lock = (existing['Status']['S'] == idempotency.STATUS_IN_PROGRESS
+                            and int(existing['LockedUntil']['N']) < now)
+            if not expired_lock:
+                raise ConditionalCheckFailedException(existing)
+        self.items[record_key] = Item
+
+    def delete_item(self, TableName, Key, **kwargs):
+        record_key = Key['RecordKey']['S']
+        self.calls.append(('delete_item', record_key))
+        existing = self.items.get(record_key)
+        if existing is None or existing['Status']['S'] != idempotency.STATUS_IN_PROGRESS:
+            raise ConditionalCheckFailedException()
+        del self.items[record_key]
+
+
+def error_response(status_code, message, error_code):
+    return {'statusCode': status_code, 'body': json.dumps({'message': message, 'error_code': error_code})}
+
+
+def make_event(key='key-1', user_id='U0001', stamp_id='stamp_001'):
+    return {
+        'path': '/stamps/award',
+        'headers': {'Idempotency-Key': key},
+        'body': json.dumps({'user_id': user_id, 'stamp_id': stamp_id, 'method': 'GPS'})
+    }
+
+
+class HandleIdempotentRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeDynamoDBClient()
+        self.processed = []
+        self.status_code = 200
+        patches = [
+            mock.patch.object(idempotency, 'dynamodb_client', self.client),
+            mock.patch('time.time', return_value=NOW)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        idempotency._response_cache.clear()
+
+    def process(self, event):
+        self.processed.append(event)
+        return {'statusCode': self.status_code, 'headers': {}, 'body': json.dumps({'count': len(self.processed)})}
+
+    def handle(self, event):
+        return idempotency.handle_idempotent_request(event, 'award', self.process, error_response)
+
+    def error_code(self, response):
+        return json.loads(response['body'])['error_code']
+
+    def test_replay_from_cache(self):
+        first = self.handle(make_event())
+        self.client.calls.clear()
+
+        replayed = self.handle(make_event())
+
+        self.assertEqual(len(self.processed), 1)
+        self.assertEqual(replayed['body'], first['body'])
+        self.assertEqual(replayed['headers']['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first['headers'])
+        # 同じコンテナへの再送はテーブルにアクセスしない
+        self.assertEqual(self.client.calls, [])
+
+    def test_replay_from_table(self):
+        first = self.handle(make_event())
+        # 別のコンテナへの再送（キャッシュなし）
+        idempotency._response_cache.clear()
+
+        replayed = self.handle(make_event())
+
+        self.assertEqual(len(self.processed), 1)
+        self.assertEqual(replayed['body'], first['body'])
+        self.assertEqual(replayed['headers']['Idempotent-Replayed'], 'true')
+        # テーブルから読んだ応答はキャッシュに保持する
+        self.assertEqual(len(idempotency._response_cache), 1)
+
+    def test_reused_key_returns_422(self):
+        self.handle(make_event())
+
+        response = self.handle(make_event(stamp_id='stamp_002'))
+        self.assertEqual(response['statusCode'], 422)
+        self.assertEqual(self.error_code(response), 'IDEMPOTENCY_KEY_REUSED')
+
+        idempotency._response_cache.clear()
+        response = self.handle(make_event(stamp_id='stamp_002'))
+        self.assertEqual(response['statusCode'], 422)
+        self.assertEqual(len(self.processed), 1)
+
+    def test_in_progress_returns_409(self):
+        record_key = 'award#U0001#key-1'
+        idempotency.claim_request(record_key, idempotency.get_request_hash(make_event()))
+
+        response = self.handle(make_event())
+
+        self.assertEqual(response['statusCode'], 409)
+        self.assertEqual(self.error_code(response), 'IDEMPOTENCY_REQUEST_IN_PROGRESS')
+        self.assertEqual(self.processed, [])
+
+    def test_expired_lock_is_reclaimed(self):
+        record_key = 'award#U0001#key-1'
+        idempotency.claim_request(record_key, idempotency.get_request_hash(make_event()))
+
+        # ロックの有効期限が切れた後の再送は処理をやり直す
+        with mock.patch('time.time', return_value=NOW + idempotency.IDEMPOTENCY_LOCK_SECONDS + 1):
+            response = self.handle(make_event())
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(len(self.processed), 1)
+        self.assertEqual(self.client.items[record_key]['Status']['S'], idempotency.STATUS_COMPLETED)
+
+    def test_server_error_releases_lock(self):
+        self.status_code = 500
+        response = self.handle(make_event())
+
+        self.assertEqual(response['statusCode'], 500)
+        self.assertIn(('delete_item', 'award#U0001#key-1'), self.client.calls)
+        self.assertEqual(self.client.items, {})
+
+        # 再送で処理をやり直す
+        self.status_code = 200
+        response = self.handle(make_event())
+        self.assertEqual(response['statusCode'], 200)
+        self.assertNotIn('Idempotent-Replayed', response['headers'])
+        self.assertEqual(len(self.processed), 2)
+
+    def test_keys_are_scoped_per_user(self):
+        self.handle(make_event(user_id='U0001'))
+
+        response = self.handle(make_event(user_id='U0002'))
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertNotIn('Idempotent-Replayed', response['headers'])
+        self.assertEqual(len(self.processed), 2)
+        self.assertEqual(sorted(self.client.items), ['award#U0001#key-1', 'award#U0002#key-1'])
+
+    def test_authorizer_user_takes_precedence(self):
+        event = make_event(user_id='U0001')
+        event['requestContext'] = {'authorizer': {'principalId': 'U9999'}}
+
+        self.handle(event)
+
+        self.assertEqual(list(self.client.items), ['award#U9999#key-1'])
+
+    def test_requests_without_key_or_user_are_processed(self):
+        self.handle({'path': '/stamps/award', 'headers': {}, 'body': '{}'})
+        self.handle({'path': '/stamps/award', 'headers': {'Idempotency-Key': 'key-1'}, 'body': 'not json'})
+
+        self.assertEqual(len(self.processed), 2)
+        self.assertEqual(self.client.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# award関数はboto3を同梱しているため、そのまま読み込む（リソースの作成にはリージョンだけが必要）
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import dynamodb_utils  # noqa: E402
+
+# 2025-11-12（水）と2025-11-13（木）の正午（UTC）。どちらも2025-W46
+WEDNESDAY_NOON = 1762948800
+THURSDAY_NOON = 1763035200
+# 2025-11-03（月）の正午（UTC）、2025-W45
+PREVIOUS_MONDAY_NOON = 1762171200
+
+
+class FakeCountersTable:
+    """RankingCountersの update_item（ADD）だけを持つテーブル"""
+
+    def __init__(self, fail_periods=()):
+        self.items = {}
+        self.calls = []
+        self.fail_periods = set(fail_periods)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+        self.calls.append(Key['Period'])
+        if Key['Period'] in self.fail_periods:
+            raise Exception('ProvisionedThroughputExceededException')
+        item = self.items.setdefault((Key['Period'], Key['UserId']), dict(Key, StampCount=0))
+        item['StampCount'] += ExpressionAttributeValues[':count']
+        item['UpdatedAt'] = ExpressionAttributeValues[':now']
+        item['TTL'] = ExpressionAttributeValues[':ttl']
+
+
+class RankingCountersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = FakeCountersTable()
+        patcher = mock.patch.object(dynamodb_utils, 'get_table', lambda table_name: self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counter(self, period_key, user_id='U0001'):
+        return self.table.items.get((period_key, user_id), {}).get('StampCount', 0)
+
+    def test_period_keys(self):
+        self.assertEqual(dynamodb_utils.get_period_keys(WEDNESDAY_NOON),
+                         ['weekly-2025-W46', 'monthly-2025-11', 'daily-2025-11-12'])
+
+    def test_counters_are_added_once_per_period(self):
+        dynamodb_utils.add_ranking_counters('U0001', [WEDNESDAY_NOON, THURSDAY_NOON, PREVIOUS_MONDAY_NOON])
+
+        self.assertEqual(self.counter('weekly-2025-W46'), 2)
+        self.assertEqual(self.counter('weekly-2025-W45'), 1)
+        self.assertEqual(self.counter('monthly-2025-11'), 3)
+        self.assertEqual(self.counter('daily-2025-11-12'), 1)
+        self.assertEqual(self.counter('daily-2025-11-13'), 1)
+        # 期間ごとに1回の更新にまとめる
+        self.assertEqual(len(self.table.calls), len(set(self.table.calls)))
+        # TTLは期間内で最も新しい収集日時から数える
+        weekly = self.table.items[('weekly-2025-W46', 'U0001')]
+        self.assertEqual(weekly['TTL'], THURSDAY_NOON + dynamodb_utils.RANKING_COUNTER_TTL_DAYS * 86400)
+
+    def test_increment_ranking_counters(self):
+        dynamodb_utils.increment_ranking_counters('U0001', WEDNESDAY_NOON)
+        dynamodb_utils.increment_ranking_counters('U0001', WEDNESDAY_NOON)
+
+        self.assertEqual(self.counter('weekly-2025-W46'), 2)
+        self.assertEqual(self.counter('daily-2025-11-12'), 2)
+
+    def test_counter_failure_is_not_raised(self):
+        self.table.fail_periods.add('weekly-2025-W46')
+
+        dynamodb_utils.increment_ranking_counters('U0001', WEDNESDAY_NOON)
+
+        # 失敗した期間以外は加算される
+        self.assertEqual(self.counter('weekly-2025-W46'), 0)
+        self.assertEqual(self.counter('monthly-2025-11'), 1)
+
+
+class AddUserStampCountersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.put_items = []
+        self.calls = []
+        table = mock.Mock()
+        table.put_item.side_effect = lambda **kwargs: self.put_items.append(kwargs['Item'])
+        patches = [
+            mock.patch.object(dynamodb_utils, 'get_table', lambda table_name: table),
+            mock.patch.object(dynamodb_utils, 'AWARD_TRANSACTIONAL_WRITES', False),
+            mock.patch.object(dynamodb_utils, 'bump_collection_version', lambda user_id, at: None),
+            mock.patch.object(dynamodb_utils, 'increment_ranking_counters',
+                              lambda user_id, at: self.calls.append('counters')),
+            mock.patch.object(dynamodb_utils, 'increment_user_stamp_count',
+                              lambda user_id, count=1: self.calls.append('stamp_count'))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_award_increments_counters(self):
+        with mock.patch.object(dynamodb_utils, 'RANKING_COUNTERS_SOURCE', 'award'):
+            dynamodb_utils.add_user_stamp('U0001', 'stamp_001', 'GPS')
+
+        self.assertEqual(len(self.put_items), 1)
+        self.assertEqual(self.calls, ['counters', 'stamp_count'])
+
+    def test_stream_source_skips_counters(self):
+        # ranking関数がストリームで加算する構成では二重計上しない
+        with mock.patch.object(dynamodb_utils, 'RANKING_COUNTERS_SOURCE', 'stream'):
+            dynamodb_utils.add_user_stamp('U0001', 'stamp_001', 'GPS')
+
+        self.assertEqual(len(self.put_items), 1)
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
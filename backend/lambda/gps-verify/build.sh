@@ -25,7 +25,9 @@ echo "一時ディレクトリ: $TEMP_DIR"
 echo "Pythonファイルをコピー中..."
 cp lambda_function.py "$TEMP_DIR/"
 cp dynamodb_utils.py "$TEMP_DIR/"
+cp stamp_catalog.py "$TEMP_DIR/"
 cp response_utils.py "$TEMP_DIR/"
+cp idempotency.py "$TEMP_DIR/"
 
 # 依存ライブラリをインストール（オプション）
 if [ -f "requirements.txt" ]; then
@@ -63,8 +65,8 @@ echo ""
 echo "次のステップ:"
 echo "1. AWS Lambdaコンソールで関数を作成または更新"
 echo "2. ZIPファイルをアップロード"
-echo "3. 環境変数を設定（TABLE_STAMPMASTERS）"
-echo "4. IAMロールにDynamoDB読み取り権限を追加"
+echo "3. 環境変数を設定（TABLE_STAMPMASTERS, TABLE_IDEMPOTENCYKEYS）"
+echo "4. IAMロールにDynamoDB読み取り権限と、IdempotencyKeysへのPutItem / DeleteItem権限を追加"
 echo "5. API Gatewayでエンドポイントを設定（POST /gps/verify または /gps/check）"
 echo ""
 
@@ -0,0 +1,319 @@
+import boto3
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+
+# DynamoDBクライアント（低レベルAPI。条件失敗時の既存アイテムをそのまま受け取るため）
+dynamodb_client = boto3.client('dynamodb')
+
+# 記録した応答の保持時間（秒、TTLで自動削除）
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+# 処理中のロックの有効時間（秒）。Lambdaのタイムアウトより長くすること
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '60'))
+# コンテナ内に保持する記録済み応答の件数
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '256'))
+# Idempotency-Keyの最大長
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+STATUS_IN_PROGRESS = 'IN_PROGRESS'
+STATUS_COMPLETED = 'COMPLETED'
+
+# 記録済み応答のLRUキャッシュ（ウォームスタート間で保持）
+_response_cache = OrderedDict()
+_response_cache_lock = Lock()
+
+
+class IdempotencyKeyReusedError(Exception):
+    """同じIdempotency-Keyが異なるリクエストに使われた場合の例外"""
+    pass
+
+
+class IdempotencyInProgressError(Exception):
+    """同じIdempotency-Keyのリクエストが処理中の場合の例外"""
+    pass
+
+
+def get_table_name() -> str:
+    """
+    IdempotencyKeysテーブル名を取得
+
+    Returns:
+        str: テーブル名
+    """
+    return os.environ.get('TABLE_IDEMPOTENCYKEYS', 'IdempotencyKeys')
+
+
+def get_idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    """
+    リクエストヘッダーからIdempotency-Keyを取得（大文字小文字を区別しない）
+
+    Args:
+        event (Dict): Lambdaイベント
+
+    Returns:
+        Optional[str]: Idempotency-Key（ヘッダーがない場合はNone）
+
+    Raises:
+        ValueError: キーが長すぎる場合
+    """
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'idempotency-key' and value and value.strip():
+            key = value.strip()
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                raise ValueError(f'Idempotency-Key must not exceed {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+            return key
+    return None
+
+
+def get_request_user_id(event: Dict[str, Any]) -> Optional[str]:
+    """
+    リクエストのユーザーIDを取得（記録をユーザーごとに分けるため）
+
+    API Gatewayのオーソライザーで認証済みのユーザーがあればそれを、なければボディの user_id（userId）を使う
+
+    Args:
+        event (Dict): Lambdaイベント
+
+    Returns:
+        Optional[str]: ユーザーID（特定できない場合はNone）
+    """
+    authorizer = (event.get('requestContext') or {}).get('authorizer') or {}
+    user_id = authorizer.get('userId') or (authorizer.get('claims') or {}).get('sub') or authorizer.get('principalId')
+    if user_id:
+        return str(user_id)
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(body, dict):
+        return None
+    user_id = body.get('user_id') or body.get('userId')
+    return str(user_id) if user_id else None
+
+
+def get_request_hash(event: Dict[str, Any]) -> str:
+    """
+    リクエストの内容（パスとボディ）のハッシュを返す（同じキーの使い回しを検出するため）
+
+    Args:
+        event (Dict): Lambdaイベント
+
+    Returns:
+        str: SHA-256のハッシュ
+    """
+    raw = f"{event.get('path', '')}\n{event.get('body') or ''}".encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def get_cached_response(record_key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    コンテナ内のキャッシュから記録済みの応答を取得
+
+    Args:
+        record_key (str): "{scope}#{UserId}#{Idempotency-Key}"
+        request_hash (str): リクエストのハッシュ
+
+    Returns:
+        Optional[Dict]: 記録済みの応答（キャッシュにない、または期限切れの場合はNone）
+
+    Raises:
+        IdempotencyKeyReusedError: 異なるリクエストの応答が記録されている場合
+    """
+    with _response_cache_lock:
+        cached = _response_cache.get(record_key)
+        if cached is None:
+            return None
+        if cached['expires_at'] <= time.time():
+            del _response_cache[record_key]
+            return None
+        _response_cache.move_to_end(record_key)
+
+    if cached['request_hash'] != request_hash:
+        raise IdempotencyKeyReusedError('Idempotency-Key was already used for a different request')
+    return cached['response']
+
+
+def cache_response(record_key: str, request_hash: str, response: Dict[str, Any], expires_at: int):
+    """
+    記録済みの応答をコンテナ内のキャッシュに保持
+
+    Args:
+        record_key (str): "{scope}#{UserId}#{Idempotency-Key}"
+        request_hash (str): リクエストのハッシュ
+        response (Dict): 応答
+        expires_at (int): 有効期限（Unixタイムスタンプ）
+    """
+    with _response_cache_lock:
+        _response_cache[record_key] = {
+            'request_hash': request_hash,
+            'response': response,
+            'expires_at': expires_at
+        }
+        _response_cache.move_to_end(record_key)
+        while len(_response_cache) > IDEMPOTENCY_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+def claim_request(record_key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Idempotency-Keyを処理中として確保する（記録済みの場合はその応答を返す）
+
+    条件付きPutItemの失敗時に既存のアイテムを返させる（ReturnValuesOnConditionCheckFailure）ため、
+    確保と記録済み応答の取得は1回の書き込みで済む。期限切れの処理中ロックは取り直す
+
+    Args:
+        record_key (str): "{scope}#{UserId}#{Idempotency-Key}"
+        request_hash (str): リクエストのハッシュ
+
+    Returns:
+        Optional[Dict]: 記録済みの応答（確保できた場合はNone）
+
+    Raises:
+        IdempotencyKeyReusedError: 異なるリクエストにキーが使われている場合
+        IdempotencyInProgressError: 同じキーのリクエストが処理中の場合
+    """
+    now = int(time.time())
+    try:
+        dynamodb_client.put_item(
+            TableName=get_table_name(),
+            Item={
+                'RecordKey': {'S': record_key},
+                'RequestHash': {'S': request_hash},
+                'Status': {'S': STATUS_IN_PROGRESS},
+                'LockedUntil': {'N': str(now + IDEMPOTENCY_LOCK_SECONDS)},
+                'TTL': {'N': str(now + IDEMPOTENCY_TTL_SECONDS)}
+            },
+            ConditionExpression='attribute_not_exists(RecordKey) OR (#status = :in_progress AND LockedUntil < :now)',
+            ExpressionAttributeNames={'#status': 'Status'},
+            ExpressionAttributeValues={
+                ':in_progress': {'S': STATUS_IN_PROGRESS},
+                ':now': {'N': str(now)}
+            },
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+        return None
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        existing = e.response.get('Item', {})
+
+    if existing.get('RequestHash', {}).get('S') != request_hash:
+        raise IdempotencyKeyReusedError('Idempotency-Key was already used for a different request')
+    if existing.get('Status', {}).get('S') != STATUS_COMPLETED:
+        raise IdempotencyInProgressError('A request with the same Idempotency-Key is in progress')
+
+    response = json.loads(existing['Response']['S'])
+    cache_response(record_key, request_hash, response, int(existing['TTL']['N']))
+    return response
+
+
+def complete_request(record_key: str, request_hash: str, response: Dict[str, Any]):
+    """
+    処理結果の応答を記録する
+
+    Args:
+        record_key (str): "{scope}#{UserId}#{Idempotency-Key}"
+        request_hash (str): リクエストのハッシュ
+        response (Dict): 応答
+    """
+    expires_at = int(time.time()) + IDEMPOTENCY_TTL_SECONDS
+    dynamodb_client.put_item(
+        TableName=get_table_name(),
+        Item={
+            'RecordKey': {'S': record_key},
+            'RequestHash': {'S': request_hash},
+            'Status': {'S': STATUS_COMPLETED},
+            'Response': {'S': json.dumps(response, ensure_ascii=False)},
+            'TTL': {'N': str(expires_at)}
+        }
+    )
+    cache_response(record_key, request_hash, response, expires_at)
+
+
+def release_request(record_key: str):
+    """
+    処理中のロックを解放する（サーバーエラーの場合、再試行で処理をやり直せるように）
+
+    Args:
+        record_key (str): "{scope}#{UserId}#{Idempotency-Key}"
+    """
+    dynamodb_client.delete_item(
+        TableName=get_table_name(),
+        Key={'RecordKey': {'S': record_key}},
+        ConditionExpression='#status = :in_progress',
+        ExpressionAttributeNames={'#status': 'Status'},
+        ExpressionAttributeValues={':in_progress': {'S': STATUS_IN_PROGRESS}}
+    )
+
+
+def mark_replayed(response: Dict[str, Any]) -> Dict[str, Any]:
+    """記録済みの応答に再送であることを示すヘッダーを付ける"""
+    replayed = dict(response)
+    replayed['headers'] = dict(response.get('headers') or {}, **{'Idempotent-Replayed': 'true'})
+    return replayed
+
+
+def handle_idempotent_request(event: Dict[str, Any], scope: str,
+                              process: Callable[[Dict[str, Any]], Dict[str, Any]],
+                              error_response: Callable[[int, str, str], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Idempotency-Keyヘッダーに従ってリクエストを1回だけ処理する
+
+    ヘッダーがない場合はそのまま処理する。キーはユーザーごとに記録し、同じユーザーの同じキーの再送には、
+    StampMasters・UserStampsを参照せずに最初の応答を返す（同じコンテナではキャッシュから、それ以外はテーブルから）。
+    ユーザーを特定できないリクエストはキーを無視して処理する（バリデーションエラーになる）。
+    サーバーエラー（5xx）の応答は記録せず、再送で処理をやり直す。
+    IdempotencyKeysテーブルにアクセスできない場合は、キーを無視して処理する
+
+    Args:
+        event (Dict): Lambdaイベント
+        scope (str): 関数ごとの名前空間（例: "award"）
+        process (Callable): (event) -> 応答
+        error_response (Callable): (status_code, message, error_code) -> 応答
+
+    Returns:
+        Dict: API Gateway用のレスポンス形式
+    """
+    try:
+        key = get_idempotency_key(event)
+    except ValueError as e:
+        return error_response(400, str(e), 'VALIDATION_ERROR')
+
+    user_id = get_request_user_id(event)
+    if key is None or user_id is None:
+        return process(event)
+
+    # 他のユーザーが同じキーを使っても、その応答を返さないようにユーザーIDを含める
+    record_key = f'{scope}#{user_id}#{key}'
+    request_hash = get_request_hash(event)
+
+    try:
+        cached = get_cached_response(record_key, request_hash)
+        if cached is not None:
+            return mark_replayed(cached)
+        recorded = claim_request(record_key, request_hash)
+        if recorded is not None:
+            return mark_replayed(recorded)
+    except IdempotencyKeyReusedError as e:
+        return error_response(422, str(e), 'IDEMPOTENCY_KEY_REUSED')
+    except IdempotencyInProgressError as e:
+        return error_response(409, str(e), 'IDEMPOTENCY_REQUEST_IN_PROGRESS')
+    except Exception as e:
+        print(f'Warning: Idempotency check failed, processing without it: {str(e)}')
+        return process(event)
+
+    response = process(event)
+
+    try:
+        if response.get('statusCode', 500) >= 500:
+            release_request(record_key)
+        else:
+            complete_request(record_key, request_hash, response)
+    except Exception as e:
+        print(f'Warning: Failed to record idempotent response: key={record_key}, error={str(e)}')
+
+    return response
@@ -2,6 +2,7 @@ import json
 import math
 from dynamodb_utils import get_stamp_master
 from response_utils import create_response, create_error_response
+from idempotency import handle_idempotent_request
 
 
 def calculate_distance_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -83,6 +84,20 @@ def validate_gps_request(body: dict) -> tuple[bool, str, dict]:
 
 
 def lambda_handler(event, context):
+    """
+    POST /gps/verify, POST /gps/check のエントリーポイント
+    
+    Idempotency-Keyヘッダーがある場合、同じキーの再送には最初の応答をそのまま返す
+    （"Idempotent-Replayed: true" ヘッダー付き。idempotency.pyを参照）
+    """
+    # OPTIONSリクエストの処理（CORS preflight）
+    if event.get('httpMethod') == 'OPTIONS':
+        return create_response(200, {})
+    
+    return handle_idempotent_request(event, 'gps-verify', process_gps_request, create_error_response)
+
+
+def process_gps_request(event):
     """
     GPS位置情報を検証する
     POST /gps/verify または POST /gps/check
@@ -24,6 +24,7 @@ echo "一時ディレクトリ: $TEMP_DIR"
 # 必要なPythonファイルをコピー
 echo "Pythonファイルをコピー中..."
 cp lambda_function.py "$TEMP_DIR/"
+cp outbox_consumer.py "$TEMP_DIR/"
 cp response_utils.py "$TEMP_DIR/"
 
 # 依存ライブラリをインストール
@@ -70,6 +71,8 @@ echo "4. IAMロールに追加の権限は不要（LINE API呼び出しのみ）
 echo "5. API Gatewayでエンドポイントを設定:"
 echo "   - POST /notify"
 echo "6. CORS設定を確認"
-echo "7. award関数からnotify関数を呼び出すように統合"
+echo "7. IAMロールにNotificationOutboxのストリームの読み取り権限を追加し、"
+echo "   backend/scripts/create_notification_outbox.py でテーブルとこの関数へのトリガーを作成"
+echo "   （award / objectCustomLabel 関数が積んだ通知をまとめて送信。award関数より先にデプロイする）"
 echo ""
 
@@ -2,6 +2,7 @@ import json
 import os
 import requests
 from response_utils import create_response, create_error_response
+from outbox_consumer import is_outbox_event, process_outbox_batch
 
 # LINE Messaging API設定
 LINE_CHANNEL_ACCESS_TOKEN = os.environ.get('LINE_CHANNEL_ACCESS_TOKEN')
@@ -16,7 +17,7 @@ def lambda_handler(event, context):
     POST /notify
     {
         "user_id": "USER_ID",
-        "type": "stamp_awarded" | "event_started" | "reminder",
+        "type": "stamp_awarded" | "stamps_awarded" | "event_started" | "reminder",
         "data": {
             "stamp_id": "STAMP_ID",
             "stamp_name": "スタンプ名",
@@ -24,8 +25,15 @@ def lambda_handler(event, context):
             ...
         }
     }
+    
+    stamps_awarded（一括授与でまとめて通知）の場合:
+        "data": {"stamps": [{"stamp_id": "...", "stamp_name": "...", "stamp_image_url": "..."}, ...]}
     """
     try:
+        # NotificationOutboxテーブルのストリーム（award関数などが積んだ通知）をまとめて送信
+        if is_outbox_event(event):
+            return process_outbox_batch(event, create_message, send_push_messages)
+        
         # OPTIONSリクエストの処理（CORS preflight）
         if event.get('httpMethod') == 'OPTIONS':
             return create_response(200, {})
@@ -46,17 +54,8 @@ def lambda_handler(event, context):
             return create_error_response(400, 'user_id is required')
         
         # 通知タイプに応じてメッセージを生成
-        if notify_type == 'stamp_awarded':
-            message = create_stamp_flex_message(
-                data.get('stamp_name', 'スタンプ'),
-                data.get('stamp_id', ''),
-                data.get('stamp_image_url', '')
-            )
-        elif notify_type == 'event_started':
-            message = create_event_text_message(data.get('event_name', 'イベント'))
-        elif notify_type == 'reminder':
-            message = create_reminder_text_message(data.get('stamp_name', 'スタンプ'))
-        else:
+        message = create_message(notify_type, data)
+        if message is None:
             return create_error_response(400, f'Invalid notification type: {notify_type}')
         
         # プッシュ通知送信
@@ -92,6 +91,34 @@ def lambda_handler(event, context):
         return create_error_response(500, error_msg)
 
 
+def create_message(notify_type: str, data: dict):
+    """
+    通知タイプに応じてメッセージを生成
+    
+    Args:
+        notify_type (str): 通知タイプ
+        data (dict): 通知データ
+    
+    Returns:
+        dict: メッセージ（不明な通知タイプの場合はNone）
+    """
+    if notify_type == 'stamp_awarded':
+        return create_stamp_flex_message(
+            data.get('stamp_name', 'スタンプ'),
+            data.get('stamp_id', ''),
+            data.get('stamp_image_url', '')
+        )
+    if notify_type == 'stamps_awarded':
+        return create_stamps_summary_text_message(
+            [stamp.get('stamp_name', 'スタンプ') for stamp in data.get('stamps', [])]
+        )
+    if notify_type == 'event_started':
+        return create_event_text_message(data.get('event_name', 'イベント'))
+    if notify_type == 'reminder':
+        return create_reminder_text_message(data.get('stamp_name', 'スタンプ'))
+    return None
+
+
 def send_push_message(user_id: str, message: dict):
     """
     LINEプッシュ通知を送信
@@ -100,6 +127,20 @@ def send_push_message(user_id: str, message: dict):
         user_id (str): LINEユーザーID
         message (dict): 送信するメッセージ（Flex MessageまたはText Message）
     
+    Raises:
+        Exception: LINE APIからのエラーレスポンスを含む例外
+    """
+    return send_push_messages(user_id, [message])
+
+
+def send_push_messages(user_id: str, messages: list):
+    """
+    LINEプッシュ通知を送信（1回のリクエストで最大5件のメッセージ）
+    
+    Args:
+        user_id (str): LINEユーザーID
+        messages (list): 送信するメッセージのリスト（最大5件）
+    
     Raises:
         Exception: LINE APIからのエラーレスポンスを含む例外
     """
@@ -123,7 +164,7 @@ def send_push_message(user_id: str, message: dict):
     
     payload = {
         'to': user_id,
-        'messages': [message]
+        'messages': messages
     }
     
     try:
@@ -225,6 +266,27 @@ def create_stamp_flex_message(stamp_name: str, stamp_id: str = '', image_url: st
     }
 
 
+def create_stamps_summary_text_message(stamp_names: list):
+    """
+    複数スタンプ取得通知用のテキストメッセージを生成（一括授与でまとめて通知する場合）
+    
+    Args:
+        stamp_names (list): スタンプ名のリスト
+    
+    Returns:
+        dict: Text Message形式のメッセージ
+    """
+    # メッセージが長くなりすぎないよう、表示するスタンプ名は先頭の10件まで
+    names = '\n'.join(f'・{name}' for name in stamp_names[:10])
+    if len(stamp_names) > 10:
+        names += f'\nほか{len(stamp_names) - 10}件'
+    
+    return {
+        'type': 'text',
+        'text': f'🎉 スタンプを{len(stamp_names)}個獲得しました！\n\n{names}\n\nスタンプラリーアプリを開いて確認しましょう！'
+    }
+
+
 def create_event_text_message(event_name: str):
     """
     イベント開始通知用のテキストメッセージを生成
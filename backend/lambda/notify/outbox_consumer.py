@@ -0,0 +1,152 @@
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+# LINEのプッシュメッセージ1回で送れるメッセージ数の上限
+MAX_MESSAGES_PER_PUSH = 5
+# ユーザーごとの送信を並列に実行する数
+OUTBOX_SEND_WORKERS = int(os.environ.get('OUTBOX_SEND_WORKERS', '8'))
+
+
+def is_outbox_event(event: Dict[str, Any]) -> bool:
+    """
+    NotificationOutboxテーブルのDynamoDB Streamsからの呼び出しかどうかを判定
+
+    Args:
+        event (Dict): Lambdaイベント
+
+    Returns:
+        bool: DynamoDB Streamsのレコードを含む場合True
+    """
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:dynamodb'
+
+
+def group_outbox_records(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    アウトボックスのINSERTレコードをユーザーごとにまとめる（バッチ内の順序のまま）
+
+    Args:
+        records (List[Dict]): DynamoDB Streamsのレコード
+
+    Returns:
+        Dict[str, List[Dict]]: UserId -> [{'type', 'data'}, ...]
+    """
+    groups = {}
+    for index, record in enumerate(records):
+        # TTLによる削除（REMOVE）などは対象外
+        if record.get('eventName') != 'INSERT':
+            continue
+
+        new_image = record.get('dynamodb', {}).get('NewImage', {})
+        try:
+            user_id = new_image['UserId']['S']
+            notify_type = new_image['Type']['S']
+            data = json.loads(new_image.get('Data', {}).get('S', '{}'))
+        except (KeyError, ValueError) as e:
+            # 不正なレコードで後続の通知を止めないよう、ログを出してスキップ
+            print(f'Skipping malformed outbox record: index={index}, error={str(e)}')
+            continue
+
+        groups.setdefault(user_id, []).append({'type': notify_type, 'data': data})
+
+    return groups
+
+
+def merge_stamp_notifications(notifications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    1回のプッシュに収まらない場合、スタンプ取得通知を1件のまとめ通知（stamps_awarded）に集約する
+
+    Args:
+        notifications (List[Dict]): ユーザーの通知（{'type', 'data'}）のリスト
+
+    Returns:
+        List[Dict]: 集約後の通知のリスト
+    """
+    if len(notifications) <= MAX_MESSAGES_PER_PUSH:
+        return notifications
+
+    stamps = []
+    others = []
+    for notification in notifications:
+        if notification['type'] == 'stamp_awarded':
+            stamps.append(notification['data'])
+        elif notification['type'] == 'stamps_awarded':
+            stamps.extend(notification['data'].get('stamps', []))
+        else:
+            others.append(notification)
+
+    if not stamps:
+        return notifications
+    return [{'type': 'stamps_awarded', 'data': {'stamps': stamps}}] + others
+
+
+def process_outbox_batch(event: Dict[str, Any], create_message: Callable, send_push_messages: Callable,
+                         dry_run: bool = False) -> Dict[str, Any]:
+    """
+    NotificationOutboxのストリームバッチをユーザーごとにまとめて送信
+
+    同じユーザーへの通知は1回のプッシュ（最大5件のメッセージ）にまとめる。
+    通知の失敗はログのみで再送しない（再配信すると送信済みのユーザーにも重複して届くため）
+
+    Args:
+        event (Dict): DynamoDB Streamsのイベント
+        create_message (Callable): (notify_type, data) -> メッセージ（不明な通知タイプはNone）
+        send_push_messages (Callable): (user_id, messages) -> None
+        dry_run (bool): Trueの場合は送信せずにメッセージ数を表示（記録したイベントの確認用）
+
+    Returns:
+        Dict: {'batchItemFailures': []}
+    """
+    records = event.get('Records') or []
+    groups = group_outbox_records(records)
+
+    def send_user_notifications(user_id: str) -> int:
+        messages = []
+        for notification in merge_stamp_notifications(groups[user_id]):
+            message = create_message(notification['type'], notification['data'])
+            if message is None:
+                print(f"Skipping unknown notification type: {notification['type']}")
+                continue
+            messages.append(message)
+
+        sent = 0
+        for start in range(0, len(messages), MAX_MESSAGES_PER_PUSH):
+            chunk = messages[start:start + MAX_MESSAGES_PER_PUSH]
+            if dry_run:
+                print(json.dumps({'user_id': user_id, 'messages': len(chunk)}, ensure_ascii=False))
+                sent += len(chunk)
+                continue
+            try:
+                send_push_messages(user_id, chunk)
+                sent += len(chunk)
+            except Exception as e:
+                print(f'Failed to send outbox notification: user_id={user_id}, error={str(e)}')
+        return sent
+
+    sent = 0
+    if groups:
+        with ThreadPoolExecutor(max_workers=min(OUTBOX_SEND_WORKERS, len(groups))) as executor:
+            sent = sum(executor.map(send_user_notifications, list(groups.keys())))
+
+    print(f'通知アウトボックス処理: records={len(records)}, users={len(groups)}, messages={sent}')
+    return {'batchItemFailures': []}
+
+
+if __name__ == '__main__':
+    # 記録したストリームイベントをローカルで確認する
+    # 使用方法: python outbox_consumer.py <event.json> [--apply]
+    if len(sys.argv) < 2:
+        print('Usage: python outbox_consumer.py <event.json> [--apply]')
+        sys.exit(1)
+
+    from lambda_function import create_message, send_push_messages
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        recorded_event = json.load(f)
+
+    result = process_outbox_batch(recorded_event, create_message, send_push_messages,
+                                  dry_run='--apply' not in sys.argv[2:])
+    print(json.dumps(result, ensure_ascii=False))
@@ -25,6 +25,8 @@ echo "一時ディレクトリ: $TEMP_DIR"
 echo "Pythonファイルをコピー中..."
 cp lambda_function.py "$TEMP_DIR/"
 cp dynamodb_utils.py "$TEMP_DIR/"
+cp stamp_catalog.py "$TEMP_DIR/"
+cp notification_outbox.py "$TEMP_DIR/"
 cp response_utils.py "$TEMP_DIR/"
 
 # 依存ライブラリをインストール（オプション）
@@ -61,13 +63,16 @@ echo ""
 echo "✅ ビルド完了!"
 echo ""
 echo "次のステップ:"
-echo "1. AWS Lambdaコンソールで関数を作成または更新"
-echo "2. ZIPファイルをアップロード"
-echo "3. 環境変数を設定（MODEL_ARN, TABLE_USERSTAMPS, TABLE_STAMPMASTERS, NOTIFY_FUNCTION_NAME）"
-echo "4. IAMロールに以下の権限を追加:"
+echo "1. 初回のみ backend/scripts/create_notification_outbox.py でNotificationOutboxテーブルとnotify関数へのストリームのトリガーを作成"
+echo "   （notify関数を先にデプロイしておく）"
+echo "2. AWS Lambdaコンソールで関数を作成または更新"
+echo "3. ZIPファイルをアップロード"
+echo "4. 環境変数を設定（MODEL_ARN, TABLE_USERSTAMPS, TABLE_STAMPMASTERS, TABLE_RANKINGCOUNTERS, TABLE_NOTIFICATIONOUTBOX, NOTIFY_FUNCTION_NAME）"
+echo "5. IAMロールに以下の権限を追加:"
 echo "   - Rekognition: detect_custom_labels"
 echo "   - DynamoDB: GetItem, PutItem, Query, Scan (StampMasters, UserStamps)"
-echo "   - Lambda: InvokeFunction (通知用)"
-echo "5. S3バケットにイベント通知を設定"
+echo "   - DynamoDB: PutItem (NotificationOutbox、通知用)"
+echo "   - Lambda: InvokeFunction (NotificationOutboxに書き込めない場合の通知用)"
+echo "6. S3バケットにイベント通知を設定"
 echo ""
 
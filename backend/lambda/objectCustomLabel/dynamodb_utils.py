@@ -1,13 +1,29 @@
 import boto3
 import os
+import time
+from datetime import datetime
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
+from boto3.dynamodb.types import TypeSerializer
+from stamp_catalog import get_catalog_stamp, find_catalog_stamp_by_label, get_stamp_validity
 
 
 # DynamoDBクライアントの初期化
 dynamodb = boto3.resource('dynamodb')
 dynamodb_client = boto3.client('dynamodb')
 
+# ランキングカウンターの保持日数（TTLで自動削除）
+RANKING_COUNTER_TTL_DAYS = int(os.environ.get('RANKING_COUNTER_TTL_DAYS', '400'))
+# ランキングカウンターの更新元（'award': 授与時にこの関数で加算、'stream': ranking関数がUserStampsのストリームで加算）
+RANKING_COUNTERS_SOURCE = os.environ.get('RANKING_COUNTERS_SOURCE', 'award')
+# 'true'の場合、スタンプの追加とUsers・RankingCountersの加算を1つのトランザクションで書き込む
+AWARD_TRANSACTIONAL_WRITES = os.environ.get('AWARD_TRANSACTIONAL_WRITES', 'false').lower() == 'true'
+
+
+class StampAlreadyExistsError(Exception):
+    """ユーザーが既に同じスタンプを持っている場合の例外（条件付き書き込みの失敗）"""
+    pass
+
 
 def get_table(table_name: str):
     """
@@ -37,37 +53,17 @@ def get_stamp_master(stamp_id: str) -> Optional[Dict[str, Any]]:
     """
     スタンプマスタ情報を取得
     
+    StampMastersはコンテナ内のカタログ（stamp_catalog.py）から参照するため、
+    通常はDynamoDBを読まない
+    
     Args:
         stamp_id (str): スタンプID
     
     Returns:
         Optional[Dict]: スタンプマスタ情報（存在しない場合はNone）
     """
-    table = get_table('StampMasters')
-    
     try:
-        response = table.get_item(
-            Key={
-                'StampId': stamp_id
-            }
-        )
-        
-        if 'Item' not in response:
-            return None
-        
-        item = response['Item']
-        # Decimal型を変換
-        converted_item = {}
-        for key, value in item.items():
-            if isinstance(value, Decimal):
-                converted_item[key] = int(value) if value % 1 == 0 else float(value)
-            elif isinstance(value, dict):
-                # Map型のLocationなども変換
-                converted_item[key] = {k: (int(v) if isinstance(v, Decimal) and v % 1 == 0 else float(v) if isinstance(v, Decimal) else v) for k, v in value.items()}
-            else:
-                converted_item[key] = value
-        
-        return converted_item
+        return get_catalog_stamp(stamp_id)
     except Exception as e:
         raise Exception(f"Failed to get stamp master: {str(e)}")
 
@@ -76,80 +72,49 @@ def find_stamp_by_image_label(image_label: str) -> Optional[Dict[str, Any]]:
     """
     ImageLabelでスタンプマスターを検索
     
+    コンテナ内のカタログ（stamp_catalog.py）のImageLabel索引を参照するため、
+    StampMastersはスキャンしない
+    
     Args:
         image_label (str): 画像認識ラベル
     
     Returns:
         Optional[Dict]: スタンプマスタ情報（存在しない場合はNone）
     """
-    table = get_table('StampMasters')
-    
     try:
-        # Scan操作でImageLabelが一致するスタンプを検索
-        # 注意: データ量が多い場合はGSIの追加を検討
         # Typeに関係なく、ImageLabelが一致するスタンプを検索（GPS/IMAGEの両方で取得可能にする）
-        response = table.scan(
-            FilterExpression='ImageLabel = :label',
-            ExpressionAttributeValues={
-                ':label': image_label
-            }
-        )
-        
-        items = response.get('Items', [])
-        if not items:
-            return None
-        
-        # 最初に見つかったスタンプを返す（複数ある場合は最初の1つ）
-        item = items[0]
-        
-        # Decimal型を変換
-        converted_item = {}
-        for key, value in item.items():
-            if isinstance(value, Decimal):
-                converted_item[key] = int(value) if value % 1 == 0 else float(value)
-            elif isinstance(value, dict):
-                # Map型のLocationなども変換
-                converted_item[key] = {k: (int(v) if isinstance(v, Decimal) and v % 1 == 0 else float(v) if isinstance(v, Decimal) else v) for k, v in value.items()}
-            else:
-                converted_item[key] = value
-        
-        return converted_item
+        return find_catalog_stamp_by_label(image_label)
     except Exception as e:
         raise Exception(f"Failed to find stamp by image label: {str(e)}")
 
 
-def check_stamp_exists(user_id: str, stamp_id: str) -> bool:
+def check_stamp_validity(stamp_id: str, at: int) -> Optional[str]:
     """
-    ユーザーが既に特定のスタンプを持っているかチェック
+    スタンプが指定した時刻に有効期間内かを判定
+    
+    カタログ（stamp_catalog.py）のスタンプの ValidFrom / ValidTo と比較する
     
     Args:
-        user_id (str): ユーザーID（LINE UID）
         stamp_id (str): スタンプID
+        at (int): 判定する時刻（Unixタイムスタンプ）
     
     Returns:
-        bool: スタンプが存在する場合はTrue、存在しない場合はFalse
+        Optional[str]: 有効な場合はNone、無効な場合はエラーコード
+            （'STAMP_NOT_FOUND' / 'STAMP_NOT_VALID_YET' / 'STAMP_EXPIRED' / 'INVALID_STAMP_VALIDITY'）
     """
-    table = get_table('UserStamps')
-    
     try:
-        response = table.get_item(
-            Key={
-                'UserId': user_id,
-                'StampId': stamp_id
-            }
-        )
-        
-        return 'Item' in response
+        return get_stamp_validity(stamp_id, at)
     except Exception as e:
-        raise Exception(f"Failed to check stamp existence: {str(e)}")
+        raise Exception(f"Failed to check stamp validity: {str(e)}")
 
 
 def add_user_stamp(user_id: str, stamp_id: str, method: str) -> Dict[str, Any]:
     """
     ユーザーにスタンプを追加
     
-    注意: この関数は重複チェックを行いません。
-    呼び出し側で事前にcheck_stamp_exists()を使用してチェックしてください。
+    重複チェックは attribute_not_exists(StampId) の条件付き書き込みで行うため、
+    事前の存在確認（GetItem）は不要。同時に同じスタンプを授与しようとした場合も
+    書き込みに成功するのは1件のみ
     
     Args:
         user_id (str): ユーザーID（LINE UID）
@@ -160,10 +125,10 @@ def add_user_stamp(user_id: str, stamp_id: str, method: str) -> Dict[str, Any]:
         Dict: 追加されたスタンプ情報
     
     Raises:
+        StampAlreadyExistsError: ユーザーが既にスタンプを持っている場合
         Exception: DynamoDBへの書き込みに失敗した場合
     """
     table = get_table('UserStamps')
-    import time
     
     current_time = int(time.time())
     
@@ -172,12 +137,31 @@ def add_user_stamp(user_id: str, stamp_id: str, method: str) -> Dict[str, Any]:
             'UserId': user_id,
             'StampId': stamp_id,
             'CollectedAt': current_time,
+            'CollectedDay': get_day_bucket(current_time),
             'Method': method
         }
         
-        # put_itemを使用してスタンプを追加
-        # 既に存在する場合は上書きされるが、呼び出し側でチェック済みであることを前提とする
-        table.put_item(Item=item)
+        if AWARD_TRANSACTIONAL_WRITES and put_user_stamp_transaction(item):
+            # 収集バージョンとランキングカウンターはトランザクション内で加算済み
+            if RANKING_COUNTERS_SOURCE != 'stream':
+                increment_user_stamp_count(user_id)
+        else:
+            try:
+                table.put_item(
+                    Item=item,
+                    ConditionExpression='attribute_not_exists(StampId)'
+                )
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                raise StampAlreadyExistsError(f'User already has this stamp: {stamp_id}')
+            
+            # スタンプ一覧のキャッシュ（ETag）を無効にするため、ユーザーの収集バージョンを上げる
+            bump_collection_version(user_id, current_time)
+            
+            # ランキング用の期間別カウンターとユーザーの累計スタンプ数を加算
+            # （ストリームで加算する構成では二重計上を防ぐためスキップ）
+            if RANKING_COUNTERS_SOURCE != 'stream':
+                increment_ranking_counters(user_id, current_time)
+                increment_user_stamp_count(user_id)
         
         return {
             'UserId': user_id,
@@ -185,6 +169,198 @@ def add_user_stamp(user_id: str, stamp_id: str, method: str) -> Dict[str, Any]:
             'CollectedAt': current_time,
             'Method': method
         }
+    except StampAlreadyExistsError:
+        raise
     except Exception as e:
         raise Exception(f"Failed to add user stamp: {str(e)}")
 
+
+def put_user_stamp_transaction(item: Dict[str, Any]) -> bool:
+    """
+    スタンプの追加と非正規化カウンターの加算を1つのトランザクションで書き込む
+    
+    UserStampsへの条件付きPut、Usersの CollectionVersion の加算、
+    （RANKING_COUNTERS_SOURCEが'award'の場合）RankingCountersの期間別カウンターの加算をまとめて行う。
+    StampCountは未初期化のユーザーで不正確な値を作らないよう、トランザクション外で加算する
+    
+    Args:
+        item (Dict): UserStampsに書き込むアイテム
+    
+    Returns:
+        bool: 書き込んだ場合True、Usersにユーザーの行がない場合False（呼び出し側で通常の書き込みを行う）
+    
+    Raises:
+        StampAlreadyExistsError: ユーザーが既にスタンプを持っている場合
+    """
+    serializer = TypeSerializer()
+    user_id = item['UserId']
+    collected_at = item['CollectedAt']
+    
+    transact_items = [
+        {
+            'Put': {
+                'TableName': get_table('UserStamps').name,
+                'Item': {k: serializer.serialize(v) for k, v in item.items()},
+                'ConditionExpression': 'attribute_not_exists(StampId)'
+            }
+        },
+        {
+            'Update': {
+                'TableName': get_table('Users').name,
+                'Key': {'UserId': {'S': user_id}},
+                'UpdateExpression': 'ADD CollectionVersion :one SET LastAwardedAt = :now',
+                'ConditionExpression': 'attribute_exists(UserId)',
+                'ExpressionAttributeValues': {':one': {'N': '1'}, ':now': {'N': str(collected_at)}}
+            }
+        }
+    ]
+    if RANKING_COUNTERS_SOURCE != 'stream':
+        expires_at = collected_at + RANKING_COUNTER_TTL_DAYS * 86400
+        for period_key in get_period_keys(collected_at):
+            transact_items.append({
+                'Update': {
+                    'TableName': get_table('RankingCounters').name,
+                    'Key': {'Period': {'S': period_key}, 'UserId': {'S': user_id}},
+                    'UpdateExpression': 'ADD StampCount :one SET UpdatedAt = :now, #ttl = :ttl',
+                    'ExpressionAttributeNames': {'#ttl': 'TTL'},
+                    'ExpressionAttributeValues': {
+                        ':one': {'N': '1'},
+                        ':now': {'N': str(collected_at)},
+                        ':ttl': {'N': str(expires_at)}
+                    }
+                }
+            })
+    
+    try:
+        dynamodb_client.transact_write_items(TransactItems=transact_items)
+        return True
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+        if reasons and reasons[0] == 'ConditionalCheckFailed':
+            raise StampAlreadyExistsError(f"User already has this stamp: {item['StampId']}")
+        if len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed':
+            # Usersに行がないユーザーは、カウンターを個別に加算する通常の書き込みで追加する
+            return False
+        raise
+
+
+def get_day_bucket(timestamp: int) -> str:
+    """
+    タイムスタンプの日付バケット（UserStampsのCollectedDayIndex用）を返す
+    
+    Args:
+        timestamp (int): Unixタイムスタンプ
+    
+    Returns:
+        str: 日付文字列（例: "2025-11-10"）
+    """
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+
+def get_period_keys(timestamp: int) -> List[str]:
+    """
+    タイムスタンプが属するランキング期間キーを返す
+    
+    ranking関数の期間キー（"weekly-2025-W45", "monthly-2025-11", "daily-2025-11-10"）と同じ形式。
+    日別バケットはローリング期間やイベント期間のランキングを合算で求めるために使用する
+    
+    Args:
+        timestamp (int): Unixタイムスタンプ
+    
+    Returns:
+        List[str]: 期間キーのリスト（週間・月間・日別）
+    """
+    dt = datetime.fromtimestamp(timestamp)
+    year, week, _ = dt.isocalendar()
+    return [
+        f'weekly-{year}-W{week:02d}',
+        f'monthly-{dt.year}-{dt.month:02d}',
+        f'daily-{get_day_bucket(timestamp)}'
+    ]
+
+
+def increment_ranking_counters(user_id: str, collected_at: int):
+    """
+    ユーザーの期間別スタンプ数カウンターをアトミックに加算
+    
+    RankingCountersテーブル（Period/UserId）にADDで加算するため、
+    ランキング計算はUserStampsをスキャンせずにカウンターを並べ替えるだけで済む。
+    カウンター更新の失敗はログのみ（スタンプ授与は成功扱い、
+    POST /ranking/calculate?source=scan で再集計可能）
+    
+    Args:
+        user_id (str): ユーザーID（LINE UID）
+        collected_at (int): 収集日時（Unixタイムスタンプ）
+    """
+    table = get_table('RankingCounters')
+    expires_at = collected_at + RANKING_COUNTER_TTL_DAYS * 86400
+    
+    for period_key in get_period_keys(collected_at):
+        try:
+            table.update_item(
+                Key={
+                    'Period': period_key,
+                    'UserId': user_id
+                },
+                UpdateExpression='ADD StampCount :one SET UpdatedAt = :now, #ttl = :ttl',
+                ExpressionAttributeNames={'#ttl': 'TTL'},
+                ExpressionAttributeValues={
+                    ':one': 1,
+                    ':now': collected_at,
+                    ':ttl': expires_at
+                }
+            )
+        except Exception as e:
+            print(f'Failed to increment ranking counter: period={period_key}, user_id={user_id}, error={str(e)}')
+
+
+def bump_collection_version(user_id: str, collected_at: int):
+    """
+    Usersテーブルのスタンプ収集バージョン（CollectionVersion）をアトミックに加算
+    
+    stamps関数は CollectionVersion を ETag として返し、If-None-Match が一致すれば
+    UserStampsを読まずに304を返す。存在しないユーザーの行は作らない
+    
+    Args:
+        user_id (str): ユーザーID（LINE UID）
+        collected_at (int): 収集日時（Unixタイムスタンプ）
+    """
+    table = get_table('Users')
+    
+    try:
+        table.update_item(
+            Key={'UserId': user_id},
+            UpdateExpression='ADD CollectionVersion :one SET LastAwardedAt = :now',
+            ConditionExpression='attribute_exists(UserId)',
+            ExpressionAttributeValues={':one': 1, ':now': collected_at}
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    except Exception as e:
+        print(f'Failed to bump collection version: user_id={user_id}, error={str(e)}')
+
+
+def increment_user_stamp_count(user_id: str):
+    """
+    Usersテーブルの累計スタンプ数（StampCount）をアトミックに加算
+    
+    StampCountはauth関数が新規ユーザー作成時に0で初期化する。
+    初期化されていない既存ユーザーは加算しない（不正確な値を作らないため、
+    ranking関数はUserStampsのCOUNTクエリにフォールバックする）
+    
+    Args:
+        user_id (str): ユーザーID（LINE UID）
+    """
+    table = get_table('Users')
+    
+    try:
+        table.update_item(
+            Key={'UserId': user_id},
+            UpdateExpression='ADD StampCount :one',
+            ConditionExpression='attribute_exists(StampCount)',
+            ExpressionAttributeValues={':one': 1}
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    except Exception as e:
+        print(f'Failed to increment user stamp count: user_id={user_id}, error={str(e)}')
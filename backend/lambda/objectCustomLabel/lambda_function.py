@@ -2,14 +2,14 @@ import json
 import boto3
 import os
 import time
-from dynamodb_utils import find_stamp_by_image_label, check_stamp_exists, add_user_stamp, get_stamp_master
+from dynamodb_utils import (
+    find_stamp_by_image_label, check_stamp_validity, add_user_stamp, get_stamp_master, StampAlreadyExistsError
+)
+from notification_outbox import enqueue_notification
 
 # Rekognitionクライアント
 rekognition = boto3.client('rekognition')
 
-# Lambdaクライアント（通知送信用）
-lambda_client = boto3.client('lambda')
-
 # 環境変数からモデルARNを取得
 MODEL_ARN = os.environ['MODEL_ARN']
 
@@ -44,41 +44,18 @@ def extract_user_id_from_s3_key(key: str) -> str:
 
 def send_notification_async(user_id: str, stamp_id: str, stamp_master: dict):
     """
-    スタンプ取得通知を非同期で送信
+    スタンプ取得通知をアウトボックスに積む（送信はnotify関数が別途まとめて行う）
     
     Args:
         user_id (str): ユーザーID
         stamp_id (str): スタンプID
         stamp_master (dict): スタンプマスタ情報
     """
-    try:
-        # notify関数の関数名を環境変数から取得（デフォルト: notify）
-        notify_function_name = os.environ.get('NOTIFY_FUNCTION_NAME', 'notify')
-        
-        # 通知データの準備
-        stamp_name = stamp_master.get('Name', 'スタンプ')
-        stamp_image_url = stamp_master.get('ImageUrl', '')
-        
-        # notify関数を非同期で呼び出し
-        lambda_client.invoke(
-            FunctionName=notify_function_name,
-            InvocationType='Event',  # 非同期実行
-            Payload=json.dumps({
-                'httpMethod': 'POST',
-                'body': json.dumps({
-                    'user_id': user_id,
-                    'type': 'stamp_awarded',
-                    'data': {
-                        'stamp_id': stamp_id,
-                        'stamp_name': stamp_name,
-                        'stamp_image_url': stamp_image_url
-                    }
-                })
-            })
-        )
-    except Exception as e:
-        # 通知失敗はログのみ（スタンプ授与は成功）
-        print(f'Failed to send notification: {str(e)}')
+    enqueue_notification(user_id, 'stamp_awarded', {
+        'stamp_id': stamp_id,
+        'stamp_name': stamp_master.get('Name', 'スタンプ'),
+        'stamp_image_url': stamp_master.get('ImageUrl', '')
+    })
 
 
 def award_stamp_for_label(user_id: str, label_name: str) -> dict:
@@ -104,21 +81,32 @@ def award_stamp_for_label(user_id: str, label_name: str) -> dict:
         
         stamp_id = stamp_master.get('StampId')
         
-        # スタンプマスタの有効期間チェック
+        # スタンプマスタの有効期間チェック（カタログのスタンプの ValidFrom / ValidTo と比較）
         current_time = int(time.time())
-        valid_from = stamp_master.get('ValidFrom')
-        valid_to = stamp_master.get('ValidTo')
+        validity = check_stamp_validity(stamp_id, current_time)
         
-        if valid_from and current_time < valid_from:
+        if validity == 'STAMP_NOT_VALID_YET':
             return {
                 'awarded': False,
-                'reason': f'Stamp is not yet valid. Valid from: {valid_from}'
+                'reason': f"Stamp is not yet valid. Valid from: {stamp_master.get('ValidFrom')}"
             }
         
-        if valid_to and current_time > valid_to:
+        if validity == 'STAMP_EXPIRED':
             return {
                 'awarded': False,
-                'reason': f'Stamp has expired. Valid until: {valid_to}'
+                'reason': f"Stamp has expired. Valid until: {stamp_master.get('ValidTo')}"
+            }
+        
+        if validity == 'STAMP_NOT_FOUND':
+            return {
+                'awarded': False,
+                'reason': f'No stamp found for label: {label_name}'
+            }
+        
+        if validity == 'INVALID_STAMP_VALIDITY':
+            return {
+                'awarded': False,
+                'reason': f"Invalid validity period: {stamp_master.get('ValidFrom')} - {stamp_master.get('ValidTo')}"
             }
         
         # スタンプタイプのチェック
@@ -132,16 +120,15 @@ def award_stamp_for_label(user_id: str, label_name: str) -> dict:
             }
         # Typeが設定されていない場合、またはGPS/IMAGEの場合は許可
         
-        # 重複チェック
-        if check_stamp_exists(user_id, stamp_id):
+        # スタンプを追加（重複は条件付き書き込みで判定）
+        try:
+            result = add_user_stamp(user_id, stamp_id, 'IMAGE')
+        except StampAlreadyExistsError:
             return {
                 'awarded': False,
                 'reason': f'User already has this stamp: {stamp_id}'
             }
         
-        # スタンプを追加
-        result = add_user_stamp(user_id, stamp_id, 'IMAGE')
-        
         # スタンプ授与成功時に通知を送信（非同期）
         send_notification_async(user_id, stamp_id, stamp_master)
         
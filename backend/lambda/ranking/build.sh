@@ -24,6 +24,9 @@ echo "一時ディレクトリ: $TEMP_DIR"
 # 必要なPythonファイルをコピー
 echo "Pythonファイルをコピー中..."
 cp lambda_function.py "$TEMP_DIR/"
+cp dynamodb_utils.py "$TEMP_DIR/"
+cp stream_consumer.py "$TEMP_DIR/"
+cp s3_utils.py "$TEMP_DIR/"
 cp response_utils.py "$TEMP_DIR/"
 
 # 依存ライブラリをインストール
@@ -63,14 +66,20 @@ echo ""
 echo "次のステップ:"
 echo "1. AWS Lambdaコンソールで関数を作成または更新"
 echo "2. ZIPファイルをアップロード"
-echo "3. 環境変数を設定（TABLE_RANKINGS, TABLE_USERSTAMPS, TABLE_USERS）"
+echo "3. 環境変数を設定（TABLE_RANKINGS, TABLE_RANKINGUSERS, TABLE_RANKINGCOUNTERS, TABLE_USERSTAMPS, TABLE_USERS, TABLE_STAMPMASTERS）"
 echo "4. IAMロールにDynamoDB読み書き権限を追加"
 echo "5. API Gatewayでエンドポイントを設定:"
 echo "   - POST /ranking/calculate"
 echo "   - GET /ranking/weekly"
 echo "   - GET /ranking/monthly"
 echo "   - GET /ranking/compare"
+echo "   - GET /ranking/me"
+echo "   - GET /ranking"
 echo "6. CORS設定を確認"
 echo "7. DynamoDBテーブル 'Rankings' を作成（必要に応じて）"
+echo "8. DynamoDBテーブル 'RankingCounters' を作成し、初回デプロイ時に backend/scripts/backfill_ranking_counters.py でカウンターを初期化"
+echo "9. （任意）UserStampsのDynamoDB Streams（NEW_IMAGE）をトリガーに追加し、ReportBatchItemFailuresを有効化"
+echo "   RANKING_COUNTERS_SOURCE=stream を ranking / award / objectCustomLabel 関数に設定"
+echo "10. （任意）RANKING_S3_BUCKET を設定すると静的ランキングをS3に公開（IAMロールに s3:GetObject / s3:PutObject を追加）"
 echo ""
 
@@ -0,0 +1,481 @@
+import boto3
+import os
+import time
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+# DynamoDBクライアントの初期化
+dynamodb = boto3.resource('dynamodb')
+# 低レベルクライアントはスレッドセーフなので並列処理ではこちらを使用
+dynamodb_client = boto3.client('dynamodb')
+
+# 並列スキャンのセグメント数（デフォルト: 8）
+SCAN_TOTAL_SEGMENTS = int(os.environ.get('RANKING_SCAN_SEGMENTS', '8'))
+
+# UserStampsの日付バケットGSI名（パーティションキー: CollectedDay, ソートキー: CollectedAt）
+USERSTAMPS_DAY_INDEX = os.environ.get('USERSTAMPS_DAY_INDEX', 'CollectedDayIndex')
+
+# BatchGetItemの1リクエストあたりの最大キー数（DynamoDBの上限）
+BATCH_GET_MAX_KEYS = 100
+# BatchGetItemを並列実行するスレッド数
+BATCH_GET_MAX_WORKERS = int(os.environ.get('RANKING_BATCH_GET_WORKERS', '8'))
+# BatchWriteItemの1リクエストあたりの最大アイテム数（DynamoDBの上限）
+BATCH_WRITE_MAX_ITEMS = 25
+# BatchWriteItemを並列実行するスレッド数
+BATCH_WRITE_MAX_WORKERS = int(os.environ.get('RANKING_BATCH_WRITE_WORKERS', '8'))
+# UpdateItemを並列実行するスレッド数（カウンター更新用）
+UPDATE_MAX_WORKERS = int(os.environ.get('RANKING_UPDATE_WORKERS', '16'))
+# UnprocessedKeys / UnprocessedItems の最大リトライ回数
+BATCH_MAX_RETRIES = 8
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+# UserId -> (取得時刻, DisplayName) のLRUキャッシュ（ウォームスタート間で保持）
+DISPLAY_NAME_CACHE_SIZE = int(os.environ.get('DISPLAY_NAME_CACHE_SIZE', '50000'))
+# 表示名のキャッシュ秒数（LINEのプロフィール変更をこの秒数以内にランキングへ反映する）
+DISPLAY_NAME_CACHE_SECONDS = int(os.environ.get('DISPLAY_NAME_CACHE_SECONDS', '300'))
+_display_name_cache = OrderedDict()
+_display_name_cache_lock = Lock()
+
+
+def get_table_name(table_name: str) -> str:
+    """
+    実際のテーブル名を取得（環境変数 TABLE_{NAME} があればそれを使用）
+    
+    Args:
+        table_name (str): 論理テーブル名
+    
+    Returns:
+        str: テーブル名
+    """
+    return os.environ.get(f'TABLE_{table_name.upper()}', table_name)
+
+
+def get_table(table_name: str):
+    """
+    DynamoDBテーブルリソースを取得
+    
+    Args:
+        table_name (str): テーブル名（環境変数から取得可）
+    
+    Returns:
+        dynamodb.Table: テーブルリソース
+    """
+    return dynamodb.Table(get_table_name(table_name))
+
+
+def parallel_scan(table_name: str,
+                  fold_page: Callable[[Any, List[Dict[str, Any]]], None],
+                  new_accumulator: Callable[[], Any],
+                  total_segments: int = None,
+                  **scan_kwargs) -> List[Any]:
+    """
+    DynamoDBの並列スキャン（Segment/TotalSegments）をスレッドプールで実行
+    
+    各セグメントはLastEvaluatedKeyを辿って全ページを読み、ページごとに
+    fold_pageで自分のアキュムレータへ畳み込む。ページは畳み込み後に破棄されるため、
+    メモリ使用量はテーブルサイズに依存しない。
+    
+    注意: アイテムは低レベルクライアントの形式（例: {'UserId': {'S': 'U123'}}）で渡される
+    
+    Args:
+        table_name (str): 論理テーブル名
+        fold_page (Callable): (accumulator, items) を受け取りアキュムレータを更新する関数
+        new_accumulator (Callable): セグメントごとのアキュムレータを生成する関数
+        total_segments (int, optional): セグメント数（省略時は RANKING_SCAN_SEGMENTS）
+        **scan_kwargs: FilterExpression, ProjectionExpression などScanの追加パラメータ
+    
+    Returns:
+        List[Any]: セグメントごとのアキュムレータ（マージは呼び出し側で行う）
+    """
+    total_segments = total_segments or SCAN_TOTAL_SEGMENTS
+    resolved_table_name = get_table_name(table_name)
+    
+    def scan_segment(segment: int):
+        accumulator = new_accumulator()
+        paginator = dynamodb_client.get_paginator('scan')
+        pages = paginator.paginate(
+            TableName=resolved_table_name,
+            Segment=segment,
+            TotalSegments=total_segments,
+            **scan_kwargs
+        )
+        for page in pages:
+            fold_page(accumulator, page.get('Items', []))
+        return accumulator
+    
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        return list(executor.map(scan_segment, range(total_segments)))
+
+
+def scan_stamp_counts_between(start_timestamp: int, end_timestamp: int, total_segments: int = None,
+                              by_day: bool = False) -> Counter:
+    """
+    UserStampsを並列スキャンし、指定期間内のスタンプ数をユーザーごとに集計
+    
+    CollectedAtの条件はFilterExpressionとしてDynamoDB側で評価し、
+    取得する属性は UserId と CollectedAt のみに絞る
+    
+    Args:
+        start_timestamp (int): 集計開始日時（Unixタイムスタンプ、この日時を含む）
+        end_timestamp (int): 集計終了日時（Unixタイムスタンプ、この日時を含まない）
+        total_segments (int, optional): セグメント数
+        by_day (bool): Trueの場合は日付バケットごとに集計（カウンターの再構築用）
+    
+    Returns:
+        Counter: UserId -> スタンプ数（by_dayの場合は (UserId, 日付バケット) -> スタンプ数）
+    """
+    def fold_page(counts: Counter, items: List[Dict[str, Any]]):
+        if by_day:
+            counts.update(
+                (item['UserId']['S'], datetime.fromtimestamp(int(item['CollectedAt']['N'])).strftime('%Y-%m-%d'))
+                for item in items
+            )
+        else:
+            counts.update(item['UserId']['S'] for item in items)
+    
+    segment_counts = parallel_scan(
+        'UserStamps',
+        fold_page,
+        Counter,
+        total_segments,
+        FilterExpression='CollectedAt BETWEEN :start AND :end',
+        ProjectionExpression='UserId, CollectedAt',
+        ExpressionAttributeValues={
+            ':start': {'N': str(start_timestamp)},
+            ':end': {'N': str(end_timestamp - 1)}
+        }
+    )
+    
+    total_counts = Counter()
+    for counts in segment_counts:
+        total_counts.update(counts)
+    return total_counts
+
+
+def query_day_bucket_stamp_counts(days: List[str], start_timestamp: int, end_timestamp: int,
+                                  by_day: bool = False) -> Counter:
+    """
+    UserStampsの日付バケットGSI（CollectedDay/CollectedAt）から期間内のスタンプ数を集計
+    
+    期間に含まれる日のパーティションだけを同時にQueryするため、
+    読み取り量は期間内のスタンプ数に比例し、過去の全履歴は読まない
+    
+    Args:
+        days (List[str]): 対象の日付バケット（例: ["2025-11-10", "2025-11-11"]）
+        start_timestamp (int): 集計開始日時（この日時を含む）
+        end_timestamp (int): 集計終了日時（この日時を含まない）
+        by_day (bool): Trueの場合は日付バケットごとに集計（カウンターの再構築用）
+    
+    Returns:
+        Counter: UserId -> スタンプ数（by_dayの場合は (UserId, 日付バケット) -> スタンプ数）
+    """
+    queries = [
+        {
+            'IndexName': USERSTAMPS_DAY_INDEX,
+            'KeyConditionExpression': 'CollectedDay = :day AND CollectedAt BETWEEN :start AND :end',
+            'ExpressionAttributeValues': {
+                ':day': day,
+                ':start': start_timestamp,
+                ':end': end_timestamp - 1
+            },
+            'ProjectionExpression': 'UserId'
+        }
+        for day in days
+    ]
+    
+    total_counts = Counter()
+    if not queries:
+        return total_counts
+    for day, day_items in zip(days, parallel_query('UserStamps', queries)):
+        if by_day:
+            total_counts.update((item['UserId'], day) for item in day_items)
+        else:
+            total_counts.update(item['UserId'] for item in day_items)
+    return total_counts
+
+
+def deserialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    低レベルクライアント形式のアイテムをPython型に変換（数値はDecimal）
+    
+    Args:
+        item (Dict): 例: {'UserId': {'S': 'U123'}, 'Rank': {'N': '1'}}
+    
+    Returns:
+        Dict: 例: {'UserId': 'U123', 'Rank': Decimal('1')}
+    """
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    """
+    リストを指定サイズごとに分割
+    
+    Args:
+        items (List): 分割するリスト
+        size (int): チャンクサイズ
+    
+    Returns:
+        Iterable[List]: チャンクのイテレータ
+    """
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def batch_get_items(table_name: str, keys: List[Dict[str, Any]],
+                    projection_expression: str = None,
+                    expression_attribute_names: Dict[str, str] = None) -> List[Dict[str, Any]]:
+    """
+    BatchGetItemでアイテムをまとめて取得
+    
+    キーを100件ずつのチャンクに分けて並列に取得し、UnprocessedKeysは
+    指数バックオフでリトライする
+    
+    注意: キー・アイテムは低レベルクライアントの形式（例: {'UserId': {'S': 'U123'}}）
+    
+    Args:
+        table_name (str): 論理テーブル名
+        keys (List[Dict]): 取得するキーのリスト
+        projection_expression (str, optional): 取得する属性
+        expression_attribute_names (Dict, optional): 属性名のプレースホルダー
+    
+    Returns:
+        List[Dict]: 取得したアイテム（存在しないキーは含まれない、順序は不定）
+    
+    Raises:
+        Exception: リトライ後も未処理のキーが残った場合
+    """
+    resolved_table_name = get_table_name(table_name)
+    
+    def get_chunk(chunk_keys: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        request = {'Keys': chunk_keys}
+        if projection_expression:
+            request['ProjectionExpression'] = projection_expression
+        if expression_attribute_names:
+            request['ExpressionAttributeNames'] = expression_attribute_names
+        request_items = {resolved_table_name: request}
+        
+        items = []
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            items.extend(response.get('Responses', {}).get(resolved_table_name, []))
+            
+            request_items = response.get('UnprocessedKeys') or {}
+            if not request_items:
+                return items
+            # スロットリング時は指数バックオフ（最大約2.5秒）
+            time.sleep(min(0.05 * (2 ** attempt), 2.5))
+        
+        raise Exception(f'BatchGetItem left unprocessed keys on {resolved_table_name}')
+    
+    if not keys:
+        return []
+    
+    chunks = list(chunked(keys, BATCH_GET_MAX_KEYS))
+    if len(chunks) == 1:
+        return get_chunk(chunks[0])
+    
+    items = []
+    with ThreadPoolExecutor(max_workers=min(BATCH_GET_MAX_WORKERS, len(chunks))) as executor:
+        for chunk_items in executor.map(get_chunk, chunks):
+            items.extend(chunk_items)
+    return items
+
+
+def batch_write_items(table_name: str, items: List[Dict[str, Any]]):
+    """
+    BatchWriteItemでアイテムをまとめて書き込み（PutRequest）
+    
+    アイテムを25件ずつのチャンクに分けて並列に書き込み、UnprocessedItemsは
+    指数バックオフでリトライする
+    
+    Args:
+        table_name (str): 論理テーブル名
+        items (List[Dict]): 書き込むアイテム（Python型、resourceのput_itemと同じ形式）
+    
+    Raises:
+        Exception: リトライ後も未処理のアイテムが残った場合
+    """
+    resolved_table_name = get_table_name(table_name)
+    
+    def write_chunk(chunk_items: List[Dict[str, Any]]):
+        request_items = {
+            resolved_table_name: [
+                {'PutRequest': {'Item': {k: _serializer.serialize(v) for k, v in item.items()}}}
+                for item in chunk_items
+            ]
+        }
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            response = dynamodb_client.batch_write_item(RequestItems=request_items)
+            request_items = response.get('UnprocessedItems') or {}
+            if not request_items:
+                return
+            time.sleep(min(0.05 * (2 ** attempt), 2.5))
+        
+        raise Exception(f'BatchWriteItem left unprocessed items on {resolved_table_name}')
+    
+    chunks = list(chunked(items, BATCH_WRITE_MAX_ITEMS))
+    if not chunks:
+        return
+    
+    with ThreadPoolExecutor(max_workers=min(BATCH_WRITE_MAX_WORKERS, len(chunks))) as executor:
+        # list()で例外を呼び出し側に伝播させる
+        list(executor.map(write_chunk, chunks))
+
+
+def update_items(table_name: str, updates: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+    """
+    複数のUpdateItemをスレッドプールで同時に実行
+    
+    1件の失敗で残りを止めないよう、例外は送出せずに結果として返す
+    
+    Args:
+        table_name (str): 論理テーブル名
+        updates (List[Dict]): UpdateItemパラメータ（Key, ExpressionAttributeValuesはPython型で指定）
+    
+    Returns:
+        List[Optional[Exception]]: 更新ごとの例外（成功はNone、updatesと同じ順序）
+    """
+    resolved_table_name = get_table_name(table_name)
+    
+    def run_update(update: Dict[str, Any]) -> Optional[Exception]:
+        update_kwargs = dict(update, TableName=resolved_table_name)
+        update_kwargs['Key'] = {k: _serializer.serialize(v) for k, v in update['Key'].items()}
+        if 'ExpressionAttributeValues' in update:
+            update_kwargs['ExpressionAttributeValues'] = {
+                k: _serializer.serialize(v) for k, v in update['ExpressionAttributeValues'].items()
+            }
+        try:
+            dynamodb_client.update_item(**update_kwargs)
+            return None
+        except Exception as e:
+            return e
+    
+    if not updates:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(UPDATE_MAX_WORKERS, len(updates))) as executor:
+        return list(executor.map(run_update, updates))
+
+
+def parallel_query(table_name: str, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    複数のQueryをスレッドプールで同時に実行（シャードのscatter-gather用）
+    
+    各QueryはLastEvaluatedKeyを辿り、Limitが指定されていればその件数で打ち切る
+    
+    Args:
+        table_name (str): 論理テーブル名
+        queries (List[Dict]): Queryパラメータ（ExpressionAttributeValuesはPython型で指定）
+    
+    Returns:
+        List[List[Dict]]: Queryごとの結果（Python型に変換済み、queriesと同じ順序）
+    """
+    resolved_table_name = get_table_name(table_name)
+    
+    def run_query(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query_kwargs = dict(query, TableName=resolved_table_name)
+        query_kwargs['ExpressionAttributeValues'] = {
+            k: _serializer.serialize(v) for k, v in query['ExpressionAttributeValues'].items()
+        }
+        limit = query.get('Limit')
+        
+        items = []
+        while True:
+            response = dynamodb_client.query(**query_kwargs)
+            items.extend(deserialize_item(item) for item in response.get('Items', []))
+            
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key or (limit and len(items) >= limit):
+                break
+            query_kwargs['ExclusiveStartKey'] = last_key
+        return items[:limit] if limit else items
+    
+    if len(queries) == 1:
+        return [run_query(queries[0])]
+    
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        return list(executor.map(run_query, queries))
+
+
+def resolve_display_names(user_ids: List[str]) -> Dict[str, str]:
+    """
+    ユーザーIDから表示名をまとめて解決
+    
+    コンテナ内のLRUキャッシュ（DISPLAY_NAME_CACHE_SECONDS 秒で期限切れ）を優先し、
+    キャッシュにない・期限切れのユーザーのみUsersテーブルからBatchGetItemで取得する。
+    Usersに存在しないユーザーは 'Unknown'
+    
+    Args:
+        user_ids (List[str]): ユーザーIDのリスト
+    
+    Returns:
+        Dict[str, str]: UserId -> DisplayName
+    """
+    display_names = {}
+    missing_ids = []
+    now = time.time()
+    
+    with _display_name_cache_lock:
+        for user_id in user_ids:
+            cached = _display_name_cache.get(user_id)
+            if cached and now - cached[0] < DISPLAY_NAME_CACHE_SECONDS:
+                _display_name_cache.move_to_end(user_id)
+                display_names[user_id] = cached[1]
+            else:
+                missing_ids.append(user_id)
+    
+    if not missing_ids:
+        return display_names
+    
+    items = batch_get_items(
+        'Users',
+        [{'UserId': {'S': user_id}} for user_id in missing_ids],
+        projection_expression='UserId, DisplayName'
+    )
+    fetched = {
+        item['UserId']['S']: item.get('DisplayName', {}).get('S', 'Unknown')
+        for item in items
+    }
+    
+    with _display_name_cache_lock:
+        for user_id in missing_ids:
+            display_name = fetched.get(user_id, 'Unknown')
+            display_names[user_id] = display_name
+            # 未登録ユーザーはキャッシュせず、登録後に解決できるようにする
+            if user_id in fetched:
+                _display_name_cache[user_id] = (now, display_name)
+                _display_name_cache.move_to_end(user_id)
+            else:
+                _display_name_cache.pop(user_id, None)
+        while len(_display_name_cache) > DISPLAY_NAME_CACHE_SIZE:
+            _display_name_cache.popitem(last=False)
+    
+    return display_names
+
+
+def count_user_stamps(user_id: str) -> int:
+    """
+    ユーザーの保有スタンプ数をSelect='COUNT'のQueryで数える（アイテム本体は読まない）
+    
+    Args:
+        user_id (str): ユーザーID
+    
+    Returns:
+        int: スタンプ数
+    """
+    paginator = dynamodb_client.get_paginator('query')
+    pages = paginator.paginate(
+        TableName=get_table_name('UserStamps'),
+        KeyConditionExpression='UserId = :user_id',
+        ExpressionAttributeValues={':user_id': {'S': user_id}},
+        Select='COUNT'
+    )
+    return sum(page.get('Count', 0) for page in pages)
@@ -1,305 +1,1708 @@
+import base64
 import json
 import os
-import boto3
+import time
+import zlib
+import heapq
+import hashlib
+import re
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
-from response_utils import create_response, create_error_response
+from response_utils import create_response, create_error_response, create_not_modified_response
+from dynamodb_utils import (
+    get_table, parallel_scan, scan_stamp_counts_between, query_day_bucket_stamp_counts, resolve_display_names,
+    batch_get_items, batch_write_items, deserialize_item, parallel_query, update_items, count_user_stamps
+)
+from stream_consumer import is_stream_event, process_stream_batch
+from s3_utils import is_static_publish_enabled, publish_static_board
 
-# DynamoDBクライアントの初期化
-dynamodb = boto3.resource('dynamodb')
-dynamodb_client = boto3.client('dynamodb')
+# スナップショットポインターを保存するRank（実データは1から）
+SNAPSHOT_POINTER_RANK = 0
+# POST /ranking/calculate で source を省略した場合の集計元
+# カウンター導入前のスタンプはRankingCountersに含まれないため、デプロイ時に
+# backend/scripts/backfill_ranking_counters.py でカウンターを初期化しておくこと
+RANKING_CALCULATE_SOURCE = os.environ.get('RANKING_CALCULATE_SOURCE', 'counters')
+# 期間別カウンターの保持日数（award関数と同じ値）
+RANKING_COUNTER_TTL_DAYS = int(os.environ.get('RANKING_COUNTER_TTL_DAYS', '400'))
+# スナップショットの保持期間（期間終了からの日数、TTLで自動削除）
+SNAPSHOT_RETENTION_DAYS = int(os.environ.get('RANKING_SNAPSHOT_RETENTION_DAYS', '35'))
+# 期間タイプごとのシャード数（1の場合はシャーディングしない）
+# 大規模イベント時に RANKING_SHARDS_WEEKLY=4 などとすると、ランキング行を複数パーティションに分散する
+RANKING_SHARD_COUNTS = {
+    'weekly': int(os.environ.get('RANKING_SHARDS_WEEKLY', '1')),
+    'monthly': int(os.environ.get('RANKING_SHARDS_MONTHLY', '1'))
+}
+# ポインター・レスポンスのコンテナ内キャッシュ秒数（Cache-Controlのmax-ageにも使用）
+RANKING_CACHE_SECONDS = int(os.environ.get('RANKING_CACHE_SECONDS', '30'))
+# レスポンスキャッシュの最大件数（友達ランキングなどユーザー別のキーを含む）
+RANKING_RESPONSE_CACHE_SIZE = int(os.environ.get('RANKING_RESPONSE_CACHE_SIZE', '2000'))
+# 期間キー -> (取得時刻, ポインター)
+_pointer_cache = {}
+# キャッシュキー -> {'version', 'expires_at', 'body', 'etag'}
+_response_cache = OrderedDict()
+# ウィンドウランキング（/ranking?window=...）で合算できる最大日数（日別カウンターのTTL以内）
+WINDOW_MAX_DAYS = int(os.environ.get('RANKING_WINDOW_MAX_DAYS', '92'))
+# 一括計算（POST /ranking/calculate?type=all）で公開するランキング
+# "weekly", "monthly" に加え、"weekly:method"（GPS/IMAGE別）や "monthly:type"（スタンプ種別別）を指定できる
+RANKING_BOARDS = os.environ.get('RANKING_BOARDS', 'weekly,monthly')
+# 次元別ランキング（method/type）で保存する上位件数
+DIMENSION_BOARD_TOP_K = int(os.environ.get('RANKING_BOARD_TOP_K', '100'))
+# スナップショットの保存形式（'items': 1位ごとに1アイテム、'packed': 数百件ずつ圧縮したチャンク）
+RANKING_STORAGE_MODE = os.environ.get('RANKING_STORAGE_MODE', 'items')
+# packed形式の1チャンクあたりの件数
+PACKED_CHUNK_SIZE = int(os.environ.get('RANKING_PACKED_CHUNK_SIZE', '500'))
+# packed形式のユーザー索引（UserId -> 順位）の1バケットあたりの目安件数
+PACKED_INDEX_BUCKET_SIZE = int(os.environ.get('RANKING_PACKED_INDEX_BUCKET_SIZE', '2000'))
+# 展開済みチャンク・索引のLRUキャッシュ件数（スナップショットは不変なので期限なし）
+PACKED_CACHE_SIZE = int(os.environ.get('RANKING_PACKED_CACHE_SIZE', '256'))
+# (パーティションキー, 番号) -> 展開済みのチャンクまたは索引
+_packed_cache = OrderedDict()
+# ランキング読み取りの1ページあたりの件数（デフォルト・上限）
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = int(os.environ.get('RANKING_PAGE_SIZE_MAX', '200'))
+# ウィンドウランキングの集計結果のコンテナ内キャッシュ（ページ送りで再集計しないため）
+# (開始日, 終了日) -> (集計時刻, スタンプ数の降順に並んだ (UserId, スタンプ数) のリスト)
+_window_counts_cache = OrderedDict()
+WINDOW_COUNTS_CACHE_SIZE = 32
+# limit / cursor でページ送りできるGETのパス（これ以外のルートではページ指定を解釈しない）
+PAGINATED_ROUTES = ('/ranking/friends/weekly', '/ranking/friends/monthly', '/ranking/weekly', '/ranking/monthly')
+# カーソルに含めるスナップショットのバージョン（publish_ranking_snapshotの "v{ミリ秒}"）
+SNAPSHOT_VERSION_PATTERN = re.compile(r'^v\d{1,20}$')
+# /ranking/me で前後に返す人数（デフォルト・上限）
+NEIGHBOR_RANGE_DEFAULT = 5
+NEIGHBOR_RANGE_MAX = 50
 
 
-def get_table(table_name: str):
+def decimal_to_number(obj):
+    """Decimal型をint/floatに変換"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    elif isinstance(obj, dict):
+        return {k: decimal_to_number(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [decimal_to_number(item) for item in obj]
+    return obj
+
+
+def lambda_handler(event, context):
+    """
+    ランキング関連API
+    
+    エンドポイント:
+    - POST /ranking/calculate?type=weekly&period=2025-W45&source=counters - ランキング計算（バッチ処理用、
+      source省略時は RANKING_CALCULATE_SOURCE。scan / index はRankingCountersも再集計値で上書きする）
+    - POST /ranking/calculate?type=all - RANKING_BOARDSの全ランキングを1回のスキャンで計算
+    - GET /ranking/weekly?period=2025-W45 - 週間ランキング取得（method=GPS, stamp_type=IMAGE で次元別）
+    - GET /ranking/monthly?period=2025-11 - 月間ランキング取得（同上）
+    - GET /ranking/friends/weekly?user_id=XXX, /ranking/friends/monthly?user_id=XXX - 友達ランキング
+    - GET /ranking/compare?user_id=XXX&friend_id=YYY - 友達比較
+    - GET /ranking/me?user_id=XXX&type=weekly&period=2025-W45&range=5 - 自分の順位と前後のユーザー
+    - GET /ranking?window=rolling-7d - 任意期間のランキング
+      （window: daily, rolling-{N}d, YYYY-MM-DD..YYYY-MM-DD）
+    
+    ランキング一覧（weekly, monthly, friends, window）は limit（最大 RANKING_PAGE_SIZE_MAX）と
+    レスポンスの next_cursor を cursor に渡すことでページ送りできる
+    
+    UserStampsのDynamoDB Streamsから呼び出された場合は、ランキングカウンターを更新する
+    （RANKING_COUNTERS_SOURCE=stream の場合、stream_consumer.py を参照）
+    """
+    if is_stream_event(event):
+        return process_stream_batch(event)
+    
+    try:
+        # OPTIONSリクエストの処理（CORS preflight）
+        if event.get('httpMethod') == 'OPTIONS':
+            return create_response(200, {})
+        
+        method = event.get('httpMethod')
+        path = event.get('path', '')
+        query_params = event.get('queryStringParameters') or {}
+        if_none_match = get_header(event, 'If-None-Match')
+        page = None
+        if method == 'GET' and is_paginated_route(path):
+            try:
+                page = get_page_params(query_params)
+            except ValueError as e:
+                return create_error_response(400, str(e))
+        
+        if method == 'POST' and '/ranking/calculate' in path:
+            # ランキング計算
+            period_type = query_params.get('type', 'weekly')  # weekly or monthly
+            source = query_params.get('source', RANKING_CALCULATE_SOURCE)  # counters, index or scan
+            period = query_params.get('period')  # 省略時は現在の期間（過去期間の再計算・修復に使用）
+            if period_type == 'all':
+                return calculate_all_rankings()
+            if period_type not in ['weekly', 'monthly']:
+                return create_error_response(400, 'type must be either weekly or monthly')
+            if source not in ['counters', 'index', 'scan']:
+                return create_error_response(400, 'source must be one of counters, index, scan')
+            if period and not is_valid_period(period_type, period):
+                return create_error_response(400, f'Invalid period: {period}')
+            return calculate_rankings(period_type, source, period)
+        elif method == 'GET' and '/ranking/friends/weekly' in path:
+            # 友達週間ランキング取得
+            user_id = query_params.get('user_id')
+            period = query_params.get('period') or get_current_week_period()
+            if not user_id:
+                return create_error_response(400, 'user_id is required')
+            return get_friends_weekly_rankings(user_id, period, if_none_match, page)
+        elif method == 'GET' and '/ranking/friends/monthly' in path:
+            # 友達月間ランキング取得
+            user_id = query_params.get('user_id')
+            period = query_params.get('period') or get_current_month_period()
+            if not user_id:
+                return create_error_response(400, 'user_id is required')
+            return get_friends_monthly_rankings(user_id, period, if_none_match, page)
+        elif method == 'GET' and '/ranking/weekly' in path:
+            # 週間ランキング取得
+            period = query_params.get('period') or get_current_week_period()
+            return get_weekly_rankings(period, if_none_match, get_board_dimension(query_params), page)
+        elif method == 'GET' and '/ranking/monthly' in path:
+            # 月間ランキング取得
+            period = query_params.get('period') or get_current_month_period()
+            return get_monthly_rankings(period, if_none_match, get_board_dimension(query_params), page)
+        elif method == 'GET' and '/ranking/me' in path:
+            # 自分の順位と前後のユーザー
+            user_id = query_params.get('user_id')
+            period_type = query_params.get('type', 'weekly')
+            if not user_id:
+                return create_error_response(400, 'user_id is required')
+            if period_type not in ['weekly', 'monthly']:
+                return create_error_response(400, 'type must be either weekly or monthly')
+            period = query_params.get('period') or (
+                get_current_week_period() if period_type == 'weekly' else get_current_month_period())
+            try:
+                neighbor_range = int(query_params.get('range', NEIGHBOR_RANGE_DEFAULT))
+            except ValueError:
+                return create_error_response(400, 'range must be an integer')
+            neighbor_range = max(0, min(neighbor_range, NEIGHBOR_RANGE_MAX))
+            return get_my_ranking(user_id, period_type, period, neighbor_range, if_none_match)
+        elif method == 'GET' and '/ranking/compare' in path:
+            # 友達比較
+            user_id = query_params.get('user_id')
+            friend_id = query_params.get('friend_id')
+            if not user_id or not friend_id:
+                return create_error_response(400, 'user_id and friend_id are required')
+            return compare_users(user_id, friend_id)
+        elif method == 'GET' and path.rstrip('/').endswith('/ranking'):
+            # 任意期間（日別・ローリング・イベント期間）のランキング
+            window = query_params.get('window')
+            if not window:
+                return create_error_response(400, 'window is required')
+            try:
+                window_days = parse_window(window)
+            except ValueError as e:
+                return create_error_response(400, str(e))
+            return get_window_rankings(window, window_days, if_none_match, page)
+        else:
+            return create_error_response(404, 'Not Found')
+            
+    except Exception as e:
+        error_msg = f'Internal Server Error: {str(e)}'
+        print(error_msg)
+        return create_error_response(500, error_msg)
+
+
+def calculate_rankings(period_type='weekly', source=None, period=None):
+    """
+    ランキングを計算してDynamoDBに保存
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        source (str, optional): 'counters'（RankingCountersから集計）、
+                      'index'（UserStampsの日付バケットGSIから期間内の日だけを集計）
+                      または 'scan'（UserStampsを全件スキャンして再集計）。
+                      index / scan は期間のRankingCountersも再集計値で上書きする。
+                      省略時は RANKING_CALCULATE_SOURCE
+        period (str, optional): 期間文字列（例: "2025-W45", "2025-11"）、省略時は現在の期間
+    
+    Returns:
+        dict: API Gateway用のレスポンス
+    """
+    try:
+        source = source or RANKING_CALCULATE_SOURCE
+        if not period:
+            period = get_current_week_period() if period_type == 'weekly' else get_current_month_period()
+        period_key = f'weekly-{period}' if period_type == 'weekly' else f'monthly-{period}'
+        
+        print(f'ランキング計算開始: period_type={period_type}, period={period}, period_key={period_key}, source={source}')
+        
+        # ユーザーごとのスタンプ数を集計
+        if source == 'scan':
+            user_stamp_counts = scan_period_stamp_counts(period_type, period)
+        elif source == 'index':
+            user_stamp_counts = index_period_stamp_counts(period_type, period)
+        else:
+            user_stamp_counts = load_counter_stamp_counts(period_key)
+        
+        print(f'ユーザー数: {len(user_stamp_counts)}')
+        
+        version, rankings_count = publish_board(period_key, period_type, period, user_stamp_counts)
+        
+        return create_response(200, {
+            'ok': True,
+            'period': period,
+            'period_type': period_type,
+            'version': version,
+            'rankings_count': rankings_count
+        })
+        
+    except Exception as e:
+        error_msg = f'Failed to calculate rankings: {str(e)}'
+        print(error_msg)
+        return create_error_response(500, error_msg)
+
+
+def publish_board(period_key: str, period_type: str, period: str, user_stamp_counts: Dict[str, int],
+                  top_k: int = None) -> tuple[str, int]:
+    """
+    集計済みのスタンプ数を順位付けし、スナップショットとして公開
+    
+    RANKING_S3_BUCKET が設定されている場合は、上位100件をS3にも静的JSONとして公開する
+    
+    Args:
+        period_key (str): ランキングのキー（例: "weekly-2025-W45", "weekly-method-GPS-2025-W45"）
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+        user_stamp_counts (Dict[str, int]): UserId -> スタンプ数
+        top_k (int, optional): 上位何件を保存するか（省略時は全件）
+    
+    Returns:
+        tuple: (公開したバージョン, 保存した件数)
+    """
+    # スタンプ数でソート（上位K件のみの場合はヒープで選択）
+    if top_k:
+        sorted_users = heapq.nlargest(top_k, user_stamp_counts.items(), key=lambda x: x[1])
+    else:
+        sorted_users = sorted(user_stamp_counts.items(), key=lambda x: x[1], reverse=True)
+    print(f'ソート後のユーザー数: {len(sorted_users)}')
+    
+    # 表示名をまとめて取得（BatchGetItem + コンテナ内キャッシュ）
+    try:
+        display_names = resolve_display_names([user_id for user_id, _ in sorted_users])
+    except Exception as e:
+        print(f'Warning: Failed to resolve display names: {str(e)}')
+        display_names = {}
+    
+    # ランキングデータを作成
+    rankings_to_save = []
+    for rank, (user_id, stamp_count) in enumerate(sorted_users, start=1):
+        rankings_to_save.append({
+            'Rank': rank,
+            'UserId': user_id,
+            'StampCount': stamp_count,
+            'DisplayName': display_names.get(user_id, 'Unknown')
+        })
+    
+    # 新しいバージョンのスナップショットとして保存し、ポインターを切り替える
+    _, period_end = get_period_range(period_type, period)
+    version = publish_ranking_snapshot(period_key, rankings_to_save, period_end,
+                                       RANKING_SHARD_COUNTS.get(period_type, 1))
+    
+    # 上位100件を静的JSONとしてS3にも公開（CDN配信用、失敗してもランキング計算は成功扱い）
+    if is_static_publish_enabled():
+        try:
+            publish_static_board(period_key, period_key[:-len(period) - 1], version, {
+                'ok': True,
+                'board': period_key,
+                'period': period,
+                'period_type': period_type,
+                'rankings': [format_ranking_item(ranking) for ranking in rankings_to_save[:100]]
+            })
+        except Exception as e:
+            print(f'Warning: Failed to publish static board {period_key}: {str(e)}')
+    
+    return version, len(rankings_to_save)
+
+
+def parse_board_specs(boards: str) -> List[tuple]:
+    """
+    RANKING_BOARDS の設定を解析
+    
+    Args:
+        boards (str): カンマ区切りの設定（例: "weekly,monthly,weekly:method,monthly:type"）
+    
+    Returns:
+        List[tuple]: (period_type, dimension) のリスト（dimensionはNone, 'method', 'type'）
+    
+    Raises:
+        ValueError: 不正な設定の場合
+    """
+    specs = []
+    for board in boards.split(','):
+        board = board.strip()
+        if not board:
+            continue
+        period_type, _, dimension = board.partition(':')
+        if period_type not in ['weekly', 'monthly'] or dimension not in ['', 'method', 'type']:
+            raise ValueError(f'Invalid ranking board: {board}')
+        specs.append((period_type, dimension or None))
+    return specs
+
+
+def get_board_period_key(period_type: str, period: str, dimension: str = None, value: str = None) -> str:
+    """
+    ランキングのキーを返す
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45"）
+        dimension (str, optional): 'method' または 'type'
+        value (str, optional): 次元の値（例: "GPS"）
+    
+    Returns:
+        str: 例: "weekly-2025-W45", "weekly-method-GPS-2025-W45"
+    """
+    if dimension:
+        return f'{period_type}-{dimension}-{value}-{period}'
+    return f'{period_type}-{period}'
+
+
+def get_board_dimension(query_params: Dict[str, str]) -> Optional[tuple]:
+    """
+    クエリパラメータから次元別ランキングの指定を取得
+    
+    Args:
+        query_params (Dict): クエリパラメータ（method=GPS または stamp_type=IMAGE）
+    
+    Returns:
+        Optional[tuple]: (dimension, value)、指定がない場合はNone
+    """
+    if query_params.get('method'):
+        return ('method', query_params['method'].upper())
+    if query_params.get('stamp_type'):
+        return ('type', query_params['stamp_type'].upper())
+    return None
+
+
+def load_stamp_types() -> Dict[str, str]:
+    """
+    StampMastersから StampId -> Type の対応を取得
+    
+    Returns:
+        Dict[str, str]: StampId -> Type（未設定は "UNKNOWN"）
+    """
+    stamp_masters_table = get_table('StampMasters')
+    
+    stamp_types = {}
+    scan_kwargs = {
+        'ProjectionExpression': 'StampId, #type',
+        'ExpressionAttributeNames': {'#type': 'Type'}
+    }
+    while True:
+        response = stamp_masters_table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if item['StampId'] == '#CATALOG':
+                # スタンプカタログのバージョン管理用アイテム
+                continue
+            stamp_types[item['StampId']] = (item.get('Type') or 'UNKNOWN').upper()
+        
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+    return stamp_types
+
+
+def calculate_all_rankings():
+    """
+    RANKING_BOARDS の全ランキングを、UserStampsの1回の並列スキャンで計算して公開
+    
+    各スタンプを期間・収集方法（Method）・スタンプ種別（StampMastersのType）ごとの
+    アキュムレータへ同時に振り分けるため、ランキングを追加してもテーブルの読み取りは増えない。
+    次元別ランキングは上位 RANKING_BOARD_TOP_K 件のみをヒープで選択して保存する
+    
+    Returns:
+        dict: API Gateway用のレスポンス
+    """
+    try:
+        specs = parse_board_specs(RANKING_BOARDS)
+        periods = {
+            period_type: get_current_week_period() if period_type == 'weekly' else get_current_month_period()
+            for period_type, _ in specs
+        }
+        ranges = {period_type: get_period_range(period_type, period) for period_type, period in periods.items()}
+        stamp_types = load_stamp_types() if any(dimension == 'type' for _, dimension in specs) else {}
+        
+        print(f'一括ランキング計算開始: boards={specs}, periods={periods}')
+        
+        def fold_page(boards: Dict[str, Counter], items: List[Dict[str, Any]]):
+            for item in items:
+                user_id = item['UserId']['S']
+                collected_at = int(item['CollectedAt']['N'])
+                for period_type, dimension in specs:
+                    start, end = ranges[period_type]
+                    if not (start <= collected_at < end):
+                        continue
+                    if dimension == 'method':
+                        value = item.get('Method', {}).get('S', 'UNKNOWN')
+                    elif dimension == 'type':
+                        value = stamp_types.get(item['StampId']['S'], 'UNKNOWN')
+                    else:
+                        value = None
+                    boards[(period_type, dimension, value)][user_id] += 1
+        
+        segment_boards = parallel_scan(
+            'UserStamps',
+            fold_page,
+            lambda: defaultdict(Counter),
+            FilterExpression='CollectedAt BETWEEN :start AND :end',
+            ProjectionExpression='UserId, StampId, CollectedAt, #method',
+            ExpressionAttributeNames={'#method': 'Method'},
+            ExpressionAttributeValues={
+                ':start': {'N': str(min(start for start, _ in ranges.values()))},
+                ':end': {'N': str(max(end for _, end in ranges.values()) - 1)}
+            }
+        )
+        
+        # セグメントごとの結果をマージ（期間全体のランキングはスタンプがなくても公開する）
+        boards = {(period_type, None, None): Counter() for period_type, dimension in specs if not dimension}
+        for segment in segment_boards:
+            for board, counts in segment.items():
+                boards.setdefault(board, Counter()).update(counts)
+        
+        published = []
+        for (period_type, dimension, value), counts in boards.items():
+            board_key = get_board_period_key(period_type, periods[period_type], dimension, value)
+            version, rankings_count = publish_board(
+                board_key, period_type, periods[period_type], counts,
+                top_k=DIMENSION_BOARD_TOP_K if dimension else None)
+            published.append({
+                'board': board_key,
+                'version': version,
+                'rankings_count': rankings_count
+            })
+        
+        return create_response(200, {
+            'ok': True,
+            'boards': published
+        })
+        
+    except Exception as e:
+        error_msg = f'Failed to calculate all rankings: {str(e)}'
+        print(error_msg)
+        return create_error_response(500, error_msg)
+
+
+def load_counter_stamp_counts(period_key: str) -> Dict[str, int]:
+    """
+    RankingCountersテーブルから期間内のユーザーごとのスタンプ数を取得
+    
+    award/objectCustomLabel関数がスタンプ授与時に加算したカウンターを読むため、
+    コストは期間内にスタンプを獲得したユーザー数に比例する
+    
+    Args:
+        period_key (str): 期間キー（例: "weekly-2025-W45"）
+    
+    Returns:
+        Dict[str, int]: UserId -> スタンプ数
+    """
+    counters_table = get_table('RankingCounters')
+    
+    user_stamp_counts = {}
+    query_kwargs = {
+        'KeyConditionExpression': 'Period = :period',
+        'ExpressionAttributeValues': {':period': period_key},
+        'ProjectionExpression': 'UserId, StampCount'
+    }
+    
+    while True:
+        response = counters_table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            stamp_count = int(item.get('StampCount', 0))
+            if stamp_count > 0:
+                user_stamp_counts[item['UserId']] = stamp_count
+        
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+    
+    print(f'カウンターから取得したユーザー数: {len(user_stamp_counts)}')
+    return user_stamp_counts
+
+
+def get_period_range(period_type: str, period: str) -> tuple[int, int]:
+    """
+    期間文字列から期間の開始・終了日時を返す
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+    
+    Returns:
+        tuple: (開始のUnixタイムスタンプ, 終了のUnixタイムスタンプ（この日時を含まない）)
+    """
+    if period_type == 'weekly':
+        # ISO週の開始日（月曜日 00:00:00）から7日間
+        year, week = period.split('-W')
+        start_date = datetime.fromisocalendar(int(year), int(week), 1)
+        end_date = start_date + timedelta(days=7)
+    else:
+        # 月の1日 00:00:00 から翌月1日まで
+        year, month = period.split('-')
+        start_date = datetime(int(year), int(month), 1)
+        end_date = datetime(start_date.year + start_date.month // 12, start_date.month % 12 + 1, 1)
+    return int(start_date.timestamp()), int(end_date.timestamp())
+
+
+def get_rank_shard_period(snapshot_period: str, shard_count: int, rank: int) -> str:
+    """
+    Rankingsテーブルで指定順位の行が置かれるパーティションキーを返す
+    
+    順位をシャード数で割った余りで振り分ける（1位→s0, 2位→s1, ...）ため、
+    上位N件の読み取りも全シャードに均等に分散される
+    
+    Args:
+        snapshot_period (str): スナップショットのパーティションキー
+        shard_count (int): シャード数
+        rank (int): 順位
+    
+    Returns:
+        str: パーティションキー
+    """
+    if shard_count <= 1:
+        return snapshot_period
+    return f'{snapshot_period}#s{(rank - 1) % shard_count}'
+
+
+def get_user_shard_period(snapshot_period: str, shard_count: int, user_id: str) -> str:
+    """
+    RankingUsersテーブルで指定ユーザーの行が置かれるパーティションキーを返す
+    
+    Args:
+        snapshot_period (str): スナップショットのパーティションキー
+        shard_count (int): シャード数
+        user_id (str): ユーザーID
+    
+    Returns:
+        str: パーティションキー
+    """
+    if shard_count <= 1:
+        return snapshot_period
+    return f'{snapshot_period}#s{zlib.crc32(user_id.encode("utf-8")) % shard_count}'
+
+
+def publish_ranking_snapshot(period_key: str, rankings: List[Dict[str, Any]], period_end: int,
+                             shard_count: int = 1) -> str:
+    """
+    ランキングを新しいバージョンのスナップショットとして保存し、ポインターを切り替える
+    
+    スナップショットは "{period_key}#v{バージョン}" パーティションにBatchWriteItemで書き込み
+    （RankingsとユーザーID引きのRankingUsersの両方）、全件書き込み後に period_key パーティションの Rank=0 にあるポインターを更新する
+    （同じ内容をスナップショットのパーティションの Rank=0 にも記録し、ページ送りで旧バージョンを参照する際に使う）。
+    読み取り側はポインター経由で参照するため、書き込み途中のランキングは見えない。
+    古いバージョンはTTL（期間終了 + RANKING_SNAPSHOT_RETENTION_DAYS）で自動削除される。
+    shard_countが2以上の場合は "#s{番号}" を付けた複数パーティションに分散して書き込む。
+    RANKING_STORAGE_MODE=packed の場合は行ごとのアイテムの代わりに圧縮チャンクとユーザー索引を書き込む
+    （write_packed_snapshot()を参照）。
+    
+    Args:
+        period_key (str): 期間キー（例: "weekly-2025-W45"）
+        rankings (List[Dict]): Rank, UserId, StampCount, DisplayName を持つランキングデータ
+        period_end (int): 期間終了のUnixタイムスタンプ
+        shard_count (int): シャード数（デフォルト: 1）
+    
+    Returns:
+        str: 公開したバージョン
+    """
+    rankings_table = get_table('Rankings')
+    
+    now = datetime.now()
+    updated_at = int(now.timestamp())
+    version = f'v{int(now.timestamp() * 1000)}'
+    snapshot_period = f'{period_key}#{version}'
+    expires_at = max(period_end, updated_at) + SNAPSHOT_RETENTION_DAYS * 86400
+    
+    if RANKING_STORAGE_MODE == 'packed':
+        storage = write_packed_snapshot(snapshot_period, rankings, updated_at, expires_at)
+        shard_count = 1
+    else:
+        # Rankings（Period/Rank）と、ユーザー別の順位参照用 RankingUsers（Period/UserId）に同じ内容を書き込む
+        batch_write_items('Rankings', [
+            dict(ranking, Period=get_rank_shard_period(snapshot_period, shard_count, ranking['Rank']),
+                 UpdatedAt=updated_at, TTL=expires_at)
+            for ranking in rankings
+        ])
+        batch_write_items('RankingUsers', [
+            dict(ranking, Period=get_user_shard_period(snapshot_period, shard_count, ranking['UserId']),
+                 UpdatedAt=updated_at, TTL=expires_at)
+            for ranking in rankings
+        ])
+        storage = {'Storage': 'items'}
+    print(f'スナップショット書き込み完了: {snapshot_period}, 件数={len(rankings)}, 形式={storage["Storage"]}, '
+          f'シャード数={shard_count}')
+    
+    descriptor = dict(
+        storage,
+        Version=version,
+        SnapshotPeriod=snapshot_period,
+        ShardCount=shard_count,
+        RankingsCount=len(rankings),
+        UpdatedAt=updated_at,
+        TTL=expires_at
+    )
+    # ページ送りのカーソル（バージョンのみ）から参照できるよう、スナップショット自身のパーティションにも記録する
+    rankings_table.put_item(Item=dict(descriptor, Period=snapshot_period, Rank=SNAPSHOT_POINTER_RANK))
+    
+    # ポインターを切り替え（より新しいバージョンを古いバージョンで上書きしない）
+    try:
+        rankings_table.put_item(
+            Item=dict(descriptor, Period=period_key, Rank=SNAPSHOT_POINTER_RANK),
+            ConditionExpression='attribute_not_exists(#version) OR #version < :version',
+            ExpressionAttributeNames={'#version': 'Version'},
+            ExpressionAttributeValues={':version': version}
+        )
+    except rankings_table.meta.client.exceptions.ConditionalCheckFailedException:
+        # 並行実行された計算がより新しいバージョンを公開済み（このバージョンはTTLで削除される）
+        print(f'Warning: Newer snapshot already published for {period_key}, skipped pointer update to {version}')
+    
+    # このコンテナのポインターキャッシュを破棄（次の読み取りで新しいバージョンを参照）
+    _pointer_cache.pop(period_key, None)
+    
+    return version
+
+
+def pack_entries(entries: Any) -> bytes:
+    """コンパクトなJSONにしてzlibで圧縮"""
+    return zlib.compress(json.dumps(entries, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack_entries(data: bytes) -> Any:
+    """pack_entries()で圧縮したデータを展開"""
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def get_packed_index_bucket(user_id: str, bucket_count: int) -> int:
+    """ユーザー索引のバケット番号を返す"""
+    return zlib.crc32(user_id.encode('utf-8')) % bucket_count
+
+
+def write_packed_snapshot(snapshot_period: str, rankings: List[Dict[str, Any]], updated_at: int,
+                          expires_at: int) -> Dict[str, Any]:
+    """
+    スナップショットを圧縮チャンクとユーザー索引としてRankingsに書き込む
+    
+    チャンクは "{snapshot_period}#chunk" パーティションの Rank=チャンク番号 に
+    PACKED_CHUNK_SIZE 件ずつ [UserId, StampCount, DisplayName] の配列（順位は位置で決まる）を、
+    索引は "{snapshot_period}#index" パーティションの Rank=バケット番号 に UserId -> 順位 の辞書を保存する。
+    どちらも圧縮したJSONをBinary属性 Data に格納するため、上位100件は1回のGetItemで取得できる
+    
+    Args:
+        snapshot_period (str): スナップショットのパーティションキー
+        rankings (List[Dict]): Rank, UserId, StampCount, DisplayName を持つランキングデータ（順位順）
+        updated_at (int): 更新日時
+        expires_at (int): TTL
+    
+    Returns:
+        Dict: ポインターに記録する保存形式の情報（Storage, ChunkSize, ChunkCount, IndexBuckets）
+    """
+    chunk_items = []
+    for chunk_index, start in enumerate(range(0, len(rankings), PACKED_CHUNK_SIZE)):
+        entries = [
+            [ranking['UserId'], ranking['StampCount'], ranking['DisplayName']]
+            for ranking in rankings[start:start + PACKED_CHUNK_SIZE]
+        ]
+        chunk_items.append({
+            'Period': f'{snapshot_period}#chunk',
+            'Rank': chunk_index,
+            'Data': pack_entries(entries),
+            'UpdatedAt': updated_at,
+            'TTL': expires_at
+        })
+    
+    index_buckets = max(1, -(-len(rankings) // PACKED_INDEX_BUCKET_SIZE))
+    indexes = [{} for _ in range(index_buckets)]
+    for ranking in rankings:
+        indexes[get_packed_index_bucket(ranking['UserId'], index_buckets)][ranking['UserId']] = ranking['Rank']
+    index_items = [
+        {
+            'Period': f'{snapshot_period}#index',
+            'Rank': bucket,
+            'Data': pack_entries(index),
+            'UpdatedAt': updated_at,
+            'TTL': expires_at
+        }
+        for bucket, index in enumerate(indexes)
+    ]
+    
+    batch_write_items('Rankings', chunk_items + index_items)
+    return {
+        'Storage': 'packed',
+        'ChunkSize': PACKED_CHUNK_SIZE,
+        'ChunkCount': len(chunk_items),
+        'IndexBuckets': index_buckets
+    }
+
+
+def get_packed_parts(snapshot_period: str, kind: str, numbers: List[int]) -> Dict[int, Any]:
+    """
+    packed形式のチャンクまたは索引を取得して展開
+    
+    スナップショットは公開後に変更されないため、展開済みのデータをLRUキャッシュに保持する
+    
+    Args:
+        snapshot_period (str): スナップショットのパーティションキー
+        kind (str): 'chunk' または 'index'
+        numbers (List[int]): チャンク番号またはバケット番号
+    
+    Returns:
+        Dict[int, Any]: 番号 -> 展開済みデータ（存在しない番号は含まない）
+    """
+    partition = f'{snapshot_period}#{kind}'
+    parts = {}
+    missing = []
+    for number in numbers:
+        cached = _packed_cache.get((partition, number))
+        if cached is not None:
+            _packed_cache.move_to_end((partition, number))
+            parts[number] = cached
+        else:
+            missing.append(number)
+    
+    if missing:
+        items = batch_get_items(
+            'Rankings',
+            [{'Period': {'S': partition}, 'Rank': {'N': str(number)}} for number in missing],
+            projection_expression='#rank, #data',
+            expression_attribute_names={'#rank': 'Rank', '#data': 'Data'}
+        )
+        for item in items:
+            number = int(item['Rank']['N'])
+            parts[number] = unpack_entries(item['Data']['B'])
+            _packed_cache[(partition, number)] = parts[number]
+        while len(_packed_cache) > PACKED_CACHE_SIZE:
+            _packed_cache.popitem(last=False)
+    
+    return parts
+
+
+def get_packed_rows(snapshot: Dict[str, Any], ranks: List[int]) -> List[Dict[str, Any]]:
+    """
+    packed形式のスナップショットから指定順位の行を取得
+    
+    Args:
+        snapshot (Dict): get_snapshot()の戻り値
+        ranks (List[int]): 取得する順位（昇順）
+    
+    Returns:
+        List[Dict]: Rank, UserId, StampCount, DisplayName を持つ行
+    """
+    chunk_size = snapshot['ChunkSize']
+    chunks = get_packed_parts(snapshot['SnapshotPeriod'], 'chunk',
+                              sorted({(rank - 1) // chunk_size for rank in ranks}))
+    
+    rows = []
+    for rank in ranks:
+        entries = chunks.get((rank - 1) // chunk_size)
+        offset = (rank - 1) % chunk_size
+        if entries is None or offset >= len(entries):
+            continue
+        user_id, stamp_count, display_name = entries[offset]
+        rows.append({'Rank': rank, 'UserId': user_id, 'StampCount': stamp_count, 'DisplayName': display_name})
+    return rows
+
+
+def get_snapshot_pointer(period_key: str) -> Optional[Dict[str, Any]]:
+    """
+    期間の現在のスナップショットポインターを取得
+    
+    ポインターはランキング計算時にしか変わらないため、
+    コンテナ内で RANKING_CACHE_SECONDS 秒キャッシュする
+    
+    Args:
+        period_key (str): 期間キー（例: "weekly-2025-W45"）
+    
+    Returns:
+        Optional[Dict]: ポインター（未公開の場合はNone）
+    """
+    now = time.time()
+    cached = _pointer_cache.get(period_key)
+    if cached and now - cached[0] < RANKING_CACHE_SECONDS:
+        return cached[1]
+    
+    rankings_table = get_table('Rankings')
+    response = rankings_table.get_item(
+        Key={'Period': period_key, 'Rank': SNAPSHOT_POINTER_RANK}
+    )
+    pointer = response.get('Item')
+    _pointer_cache[period_key] = (now, pointer)
+    return pointer
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    """
+    リクエストヘッダーを大文字・小文字を区別せずに取得
+    
+    Args:
+        event (Dict): API Gatewayのイベント
+        name (str): ヘッダー名
+    
+    Returns:
+        Optional[str]: ヘッダーの値
+    """
+    headers = event.get('headers') or {}
+    lower_name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lower_name:
+            return value
+    return None
+
+
+def cached_ranking_response(cache_key: str, period_key: str, build_body, if_none_match: Optional[str] = None,
+                            public: bool = True):
+    """
+    ランキングの読み取り結果をコンテナ内でキャッシュし、ETag/304に対応したレスポンスを返す
+    
+    キャッシュはスナップショットのバージョン（ポインターのVersion）ごとに保持するため、
+    ランキング計算が実行されるまではDynamoDBを読まずに応答できる。
+    友達ランキングなどユーザー別の結果（public=False）は友達リストの変更を反映するため
+    RANKING_CACHE_SECONDS 秒で期限切れにする。
+    
+    Args:
+        cache_key (str): キャッシュキー
+        period_key (str): 期間キー（例: "weekly-2025-W45"）、スナップショットがない場合はNone
+        build_body (Callable): キャッシュがない場合にレスポンスボディを作成する関数
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+        public (bool): 全ユーザー共通の結果の場合True
+    
+    Returns:
+        dict: API Gateway用のレスポンス
+    """
+    now = time.time()
+    pointer = get_snapshot_pointer(period_key) if period_key else None
+    version = pointer['Version'] if pointer else None
+    
+    entry = _response_cache.get(cache_key)
+    if (not entry or entry['version'] != version
+            or (entry['expires_at'] is not None and entry['expires_at'] < now)):
+        body = build_body()
+        serialized = json.dumps(body, ensure_ascii=False, sort_keys=True)
+        entry = {
+            'version': version,
+            # 旧形式（ポインターなし）の場合は更新を検知できないため期限付きにする
+            'expires_at': None if (public and version) else now + RANKING_CACHE_SECONDS,
+            'body': body,
+            'etag': '"' + hashlib.sha1(serialized.encode('utf-8')).hexdigest() + '"'
+        }
+        _response_cache[cache_key] = entry
+        while len(_response_cache) > RANKING_RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    _response_cache.move_to_end(cache_key)
+    
+    headers = {
+        'ETag': entry['etag'],
+        'Cache-Control': f'{"public" if public else "private"}, max-age={RANKING_CACHE_SECONDS}'
+    }
+    if if_none_match and entry['etag'] in [tag.strip() for tag in if_none_match.split(',')]:
+        return create_not_modified_response(headers)
+    return create_response(200, entry['body'], headers)
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """
+    ページ送りの状態を不透明なカーソル文字列にエンコード
+    
+    Args:
+        state (Dict): 次のページの開始順位（rank）など
+    
+    Returns:
+        str: URLセーフなBase64文字列
+    """
+    raw = json.dumps(state, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    encode_cursor()で作成したカーソルをデコード
+    
+    Args:
+        cursor (str): カーソル文字列
+    
+    Returns:
+        Dict: ページ送りの状態
+    
+    Raises:
+        ValueError: 不正なカーソルの場合
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    rank = state.get('rank') if isinstance(state, dict) else None
+    if not isinstance(rank, int) or isinstance(rank, bool) or rank < 1:
+        raise ValueError('Invalid cursor')
+    version = state.get('version')
+    if version is not None and not (isinstance(version, str) and SNAPSHOT_VERSION_PATTERN.fullmatch(version)):
+        raise ValueError('Invalid cursor')
+    return state
+
+
+def get_page_params(query_params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    クエリパラメータからページ送りの指定を取得
+    
+    Args:
+        query_params (Dict): クエリパラメータ（limit, cursor）
+    
+    Returns:
+        Dict: limit（1〜PAGE_SIZE_MAXに丸めた件数）、cursor（デコード済みの状態、先頭ページはNone）
+    
+    Raises:
+        ValueError: limitが整数でない、またはカーソルが不正な場合
+    """
+    try:
+        limit = int(query_params.get('limit', PAGE_SIZE_DEFAULT))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    cursor = query_params.get('cursor')
+    return {
+        'limit': max(1, min(limit, PAGE_SIZE_MAX)),
+        'cursor': decode_cursor(cursor) if cursor else None
+    }
+
+
+def is_paginated_route(path: str) -> bool:
+    """
+    limit / cursor でページ送りするルート（週間・月間・友達・ウィンドウランキング）かどうかを判定
+    
+    Args:
+        path (str): リクエストパス
+    
+    Returns:
+        bool: ページ送りするルートの場合True
+    """
+    return path.rstrip('/').endswith('/ranking') or any(route in path for route in PAGINATED_ROUTES)
+
+
+def paginate_rankings(rankings: List[Dict[str, Any]], page: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    作成済みのランキング（順位の昇順）から1ページ分を切り出す
+    
+    Args:
+        rankings (List[Dict]): rankを持つランキング
+        page (Dict, optional): get_page_params()の戻り値
+    
+    Returns:
+        Dict: rankings（このページ分）、next_cursor（最後のページはNone）
+    """
+    page = page or {'limit': PAGE_SIZE_DEFAULT, 'cursor': None}
+    start_rank = page['cursor']['rank'] if page['cursor'] else 1
+    page_items = rankings[start_rank - 1:start_rank - 1 + page['limit']]
+    has_more = start_rank - 1 + page['limit'] < len(rankings)
+    return {
+        'rankings': page_items,
+        'next_cursor': encode_cursor({'rank': start_rank + len(page_items)}) if has_more else None
+    }
+
+
+def get_cursor_snapshot(cursor: Dict[str, Any], period_key: str) -> Dict[str, Any]:
+    """
+    カーソルのバージョンのスナップショットを返す
+    
+    カーソルにはバージョンだけを含め、スナップショットの情報（パーティションキー・シャード数・保存形式）は
+    サーバー側で読み直す。現在のバージョンならポインターを、ページ送りの途中で再計算された場合は
+    スナップショットのパーティションに記録した情報を参照する
+    
+    Args:
+        cursor (Dict): decode_cursor()の戻り値
+        period_key (str): リクエストされた期間キー
+    
+    Returns:
+        Dict: get_snapshot()と同じ形式のスナップショット
+    
+    Raises:
+        ValueError: スナップショットが存在しない（TTLで削除済み、または別の期間のバージョン）場合
+    """
+    snapshot = get_snapshot(period_key)
+    version = cursor.get('version')
+    if version == snapshot.get('Version'):
+        return snapshot
+    if version is None:
+        raise ValueError('Cursor expired')
+    
+    rankings_table = get_table('Rankings')
+    response = rankings_table.get_item(
+        Key={'Period': f'{period_key}#{version}', 'Rank': SNAPSHOT_POINTER_RANK}
+    )
+    descriptor = response.get('Item')
+    if not descriptor:
+        raise ValueError('Cursor expired')
+    return build_snapshot(descriptor)
+
+
+def get_page_cache_key(cache_key: str, page: Optional[Dict[str, Any]]) -> str:
+    """レスポンスキャッシュのキーにページ指定を加える（先頭ページの既定件数は従来のキーのまま）"""
+    if not page or (not page['cursor'] and page['limit'] == PAGE_SIZE_DEFAULT):
+        return cache_key
+    return f"{cache_key}:{page['limit']}:{encode_cursor(page['cursor']) if page['cursor'] else ''}"
+
+
+def get_snapshot(period_key: str) -> Dict[str, Any]:
+    """
+    読み取り対象のスナップショット（パーティションキーとシャード数）を返す
+    
+    ポインターがあればそのスナップショットを、なければ旧形式
+    （period_key パーティションに直接保存されたランキング）を参照する
+    
+    Args:
+        period_key (str): 期間キー（例: "weekly-2025-W45"）
+    
+    Returns:
+        Dict: SnapshotPeriod, ShardCount, Storage, Version（packed形式の場合は RankingsCount, ChunkSize,
+              IndexBuckets も。旧形式はVersionなし）
+    """
+    pointer = get_snapshot_pointer(period_key)
+    if not pointer:
+        return {'SnapshotPeriod': period_key, 'ShardCount': 1, 'Storage': 'items'}
+    return build_snapshot(pointer)
+
+
+def build_snapshot(descriptor: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ポインター（またはスナップショットのパーティションに記録した同じ内容）から読み取り用の情報を作成
+    
+    Args:
+        descriptor (Dict): Rankingsの Rank=0 のアイテム
+    
+    Returns:
+        Dict: get_snapshot()と同じ形式のスナップショット
+    """
+    snapshot = {
+        'SnapshotPeriod': descriptor['SnapshotPeriod'],
+        'ShardCount': int(descriptor.get('ShardCount', 1)),
+        'Storage': descriptor.get('Storage', 'items'),
+        'Version': descriptor.get('Version')
+    }
+    if snapshot['Storage'] == 'packed':
+        snapshot['RankingsCount'] = int(descriptor.get('RankingsCount', 0))
+        snapshot['ChunkSize'] = int(descriptor['ChunkSize'])
+        snapshot['IndexBuckets'] = int(descriptor['IndexBuckets'])
+    return snapshot
+
+
+def query_snapshot_rankings(snapshot: Dict[str, Any], low_rank: int = 1, high_rank: int = None,
+                            limit: int = None) -> List[Dict[str, Any]]:
+    """
+    スナップショットから順位範囲のランキング行を取得
+    
+    シャーディングされている場合は全シャードを同時にQueryし、順位順にマージする
+    
+    Args:
+        snapshot (Dict): get_snapshot()の戻り値
+        low_rank (int): 取得する最小の順位
+        high_rank (int, optional): 取得する最大の順位（省略時は上限なし）
+        limit (int, optional): 取得件数の上限
+    
+    Returns:
+        List[Dict]: 順位の昇順に並んだランキング行
+    """
+    if snapshot['Storage'] == 'packed':
+        last_rank = snapshot['RankingsCount'] if high_rank is None else min(high_rank, snapshot['RankingsCount'])
+        if limit:
+            last_rank = min(last_rank, low_rank + limit - 1)
+        return get_packed_rows(snapshot, list(range(low_rank, last_rank + 1)))
+    
+    shard_count = snapshot['ShardCount']
+    shard_periods = sorted({
+        get_rank_shard_period(snapshot['SnapshotPeriod'], shard_count, rank)
+        for rank in range(1, shard_count + 1)
+    })
+    
+    queries = []
+    for shard_period in shard_periods:
+        query = {
+            'ExpressionAttributeNames': {'#rank': 'Rank'},
+            'ExpressionAttributeValues': {':period': shard_period, ':low': low_rank},
+            'ScanIndexForward': True
+        }
+        if high_rank is None:
+            query['KeyConditionExpression'] = 'Period = :period AND #rank >= :low'
+        else:
+            query['KeyConditionExpression'] = 'Period = :period AND #rank BETWEEN :low AND :high'
+            query['ExpressionAttributeValues'][':high'] = high_rank
+        if limit:
+            # 順位はシャードに均等に振り分けられているため、各シャードから limit/シャード数 件で足りる
+            query['Limit'] = -(-limit // len(shard_periods))
+        queries.append(query)
+    
+    items = [item for shard_items in parallel_query('Rankings', queries) for item in shard_items]
+    items.sort(key=lambda x: int(x['Rank']))
+    return items[:limit] if limit else items
+
+
+def get_snapshot_user_rows(snapshot: Dict[str, Any], user_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    スナップショットから指定ユーザーの行を取得
+    
+    items形式はRankingUsers（Period/UserId）をBatchGetItemで、
+    packed形式はユーザー索引で順位を求めてから該当チャンクを取得する
+    
+    Args:
+        snapshot (Dict): get_snapshot()の戻り値
+        user_ids (List[str]): ユーザーID
+    
+    Returns:
+        List[Dict]: Rank, UserId, StampCount, DisplayName を持つ行（ランキング外のユーザーは含まない）
+    """
+    if snapshot['Storage'] == 'packed':
+        bucket_count = snapshot['IndexBuckets']
+        indexes = get_packed_parts(snapshot['SnapshotPeriod'], 'index',
+                                   sorted({get_packed_index_bucket(uid, bucket_count) for uid in user_ids}))
+        ranks = []
+        for uid in user_ids:
+            rank = indexes.get(get_packed_index_bucket(uid, bucket_count), {}).get(uid)
+            if rank is not None:
+                ranks.append(rank)
+        return get_packed_rows(snapshot, sorted(ranks))
+    
+    return [
+        deserialize_item(item)
+        for item in batch_get_items(
+            'RankingUsers',
+            [
+                {
+                    'Period': {'S': get_user_shard_period(snapshot['SnapshotPeriod'], snapshot['ShardCount'], uid)},
+                    'UserId': {'S': uid}
+                }
+                for uid in user_ids
+            ],
+            projection_expression='UserId, #rank, StampCount, DisplayName',
+            expression_attribute_names={'#rank': 'Rank'}
+        )
+    ]
+
+
+def is_valid_period(period_type: str, period: str) -> bool:
+    """
+    期間文字列の形式をチェック
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+    
+    Returns:
+        bool: 正しい形式の場合True
+    """
+    try:
+        get_period_range(period_type, period)
+        return True
+    except ValueError:
+        return False
+
+
+def scan_period_stamp_counts(period_type: str, period: str) -> Dict[str, int]:
+    """
+    UserStampsテーブルを並列スキャンして期間内のユーザーごとのスタンプ数を集計
+    
+    カウンターの修復・再集計用（通常はload_counter_stamp_countsを使用）。
+    集計結果で期間内のRankingCountersを上書きする（rebuild_period_countersを参照）
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+    
+    Returns:
+        Dict[str, int]: UserId -> スタンプ数
+    """
+    start_timestamp, end_timestamp = get_period_range(period_type, period)
+    print(f'期間: {start_timestamp} - {end_timestamp}')
+    
+    # 並列スキャン（ページネーション対応、期間条件はFilterExpressionで評価）
+    print('UserStampsテーブルを並列スキャン中...')
+    day_counts = scan_stamp_counts_between(start_timestamp, end_timestamp, by_day=True)
+    rebuild_period_counters(period_type, period, day_counts)
+    
+    user_stamp_counts = sum_day_counts(day_counts)
+    print(f'期間内のスタンプ数: {sum(user_stamp_counts.values())}')
+    
+    return user_stamp_counts
+
+
+def index_period_stamp_counts(period_type: str, period: str) -> Dict[str, int]:
+    """
+    UserStampsの日付バケットGSIから期間内のユーザーごとのスタンプ数を集計
+    
+    期間に含まれる日（週間なら7日、月間なら28〜31日）のパーティションだけを読むため、
+    過去の期間の再計算でもその期間のデータしか読まない。
+    集計結果で期間内のRankingCountersを上書きする（rebuild_period_countersを参照）
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+    
+    Returns:
+        Dict[str, int]: UserId -> スタンプ数
+    """
+    start_timestamp, end_timestamp = get_period_range(period_type, period)
+    days = get_day_buckets(start_timestamp, end_timestamp)
+    print(f'日付バケットを集計中: {days[0]} - {days[-1]} ({len(days)}日)')
+    
+    day_counts = query_day_bucket_stamp_counts(days, start_timestamp, end_timestamp, by_day=True)
+    rebuild_period_counters(period_type, period, day_counts)
+    
+    user_stamp_counts = sum_day_counts(day_counts)
+    print(f'期間内のスタンプ数: {sum(user_stamp_counts.values())}')
+    
+    return user_stamp_counts
+
+
+def sum_day_counts(day_counts: Counter) -> Dict[str, int]:
+    """
+    日付バケットごとのスタンプ数をユーザーごとに合算
+    
+    Args:
+        day_counts (Counter): (UserId, 日付バケット) -> スタンプ数
+    
+    Returns:
+        Dict[str, int]: UserId -> スタンプ数
+    """
+    user_stamp_counts = Counter()
+    for (user_id, _), count in day_counts.items():
+        user_stamp_counts[user_id] += count
+    return dict(user_stamp_counts)
+
+
+def get_counter_period_keys(period_type: str, period: str, days: List[str]) -> Dict[str, List[str]]:
+    """
+    期間の再集計で値が確定するRankingCountersの期間キーを返す
+    
+    期間そのものと期間内の日別に加え、月間の場合は月内に収まる週（ISO週）も含める。
+    月をまたぐ週・週を含む月は期間外のスタンプも数えるため、ここでは上書きしない
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+        days (List[str]): 期間に含まれる日付バケット
+    
+    Returns:
+        Dict[str, List[str]]: 期間キー -> その期間キーに含まれる日付バケット
+    """
+    period_key = f'weekly-{period}' if period_type == 'weekly' else f'monthly-{period}'
+    counter_days = {period_key: list(days)}
+    for day in days:
+        counter_days[f'daily-{day}'] = [day]
+    
+    if period_type == 'monthly':
+        weeks = defaultdict(list)
+        for day in days:
+            year, week, _ = datetime.strptime(day, '%Y-%m-%d').isocalendar()
+            weeks[f'weekly-{year}-W{week:02d}'].append(day)
+        for week_key, week_days in weeks.items():
+            if len(week_days) == 7:
+                counter_days[week_key] = week_days
+    
+    return counter_days
+
+
+def rebuild_period_counters(period_type: str, period: str, day_counts: Counter) -> int:
+    """
+    UserStampsからの再集計値でRankingCountersの期間別カウンターを上書きする
+    
+    award関数のカウンター加算より前に授与されたスタンプや、加算に失敗した分を修復する。
+    期間内の週間・月間・日別カウンター（get_counter_period_keysを参照）を再集計値でSETし、
+    カウンターはあるが再集計でスタンプがないユーザーは0にする。
+    SETのためAppliedSequence（ストリーム処理で適用済みのSequenceNumber）は保持される。
+    集計から書き込みまでの間に加算されたスタンプは上書きで失われるため、授与の少ない時間帯に実行すること
+    
+    Args:
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+        day_counts (Counter): (UserId, 日付バケット) -> スタンプ数
+    
+    Returns:
+        int: 更新したカウンターの件数
+    """
+    start_timestamp, end_timestamp = get_period_range(period_type, period)
+    counter_days = get_counter_period_keys(period_type, period, get_day_buckets(start_timestamp, end_timestamp))
+    
+    counts_by_day = defaultdict(Counter)
+    for (user_id, day), count in day_counts.items():
+        counts_by_day[day][user_id] += count
+    
+    # 既存のカウンターを持つユーザー（再集計に含まれなければ0にする）
+    counter_keys = list(counter_days.keys())
+    existing = parallel_query('RankingCounters', [
+        {
+            'KeyConditionExpression': 'Period = :period',
+            'ExpressionAttributeValues': {':period': counter_key},
+            'ProjectionExpression': 'UserId'
+        }
+        for counter_key in counter_keys
+    ])
+    
+    now = int(time.time())
+    ttl = end_timestamp + RANKING_COUNTER_TTL_DAYS * 86400
+    updates = []
+    for counter_key, items in zip(counter_keys, existing):
+        counts = Counter()
+        for day in counter_days[counter_key]:
+            counts.update(counts_by_day.get(day, {}))
+        for item in items:
+            counts.setdefault(item['UserId'], 0)
+        
+        for user_id, count in counts.items():
+            updates.append({
+                'Key': {'Period': counter_key, 'UserId': user_id},
+                'UpdateExpression': 'SET StampCount = :count, UpdatedAt = :now, #ttl = :ttl',
+                'ExpressionAttributeNames': {'#ttl': 'TTL'},
+                'ExpressionAttributeValues': {':count': count, ':now': now, ':ttl': ttl}
+            })
+    
+    errors = update_items('RankingCounters', updates)
+    failed = [error for error in errors if error is not None]
+    for error in failed[:5]:
+        print(f'Failed to rebuild ranking counter: error={str(error)}')
+    
+    print(f'カウンター再構築: periods={len(counter_keys)}, updated={len(updates) - len(failed)}, '
+          f'failed={len(failed)}')
+    return len(updates) - len(failed)
+
+
+def get_day_buckets(start_timestamp: int, end_timestamp: int) -> List[str]:
     """
-    DynamoDBテーブルリソースを取得
+    期間に含まれる日付バケット（award関数が書き込むCollectedDayと同じ形式）を返す
     
     Args:
-        table_name (str): テーブル名（環境変数から取得可）
+        start_timestamp (int): 開始日時（この日時を含む）
+        end_timestamp (int): 終了日時（この日時を含まない）
     
     Returns:
-        dynamodb.Table: テーブルリソース
+        List[str]: 日付文字列のリスト（例: ["2025-11-10", "2025-11-11"]）
     """
-    env_table_name = os.environ.get(f'TABLE_{table_name.upper()}', table_name)
-    return dynamodb.Table(env_table_name)
+    days = []
+    day = datetime.fromtimestamp(start_timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = datetime.fromtimestamp(end_timestamp)
+    while day < end:
+        days.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return days
 
 
-def decimal_to_number(obj):
-    """Decimal型をint/floatに変換"""
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    elif isinstance(obj, dict):
-        return {k: decimal_to_number(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [decimal_to_number(item) for item in obj]
-    return obj
+def format_ranking_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rankings/RankingUsersのアイテムをレスポンス形式に変換
+    
+    Args:
+        item (Dict): DynamoDBのアイテム
+    
+    Returns:
+        Dict: rank, user_id, stamp_count, display_name
+    """
+    return {
+        'rank': int(item.get('Rank', 0)),
+        'user_id': item.get('UserId', ''),
+        'stamp_count': int(item.get('StampCount', 0)),
+        'display_name': item.get('DisplayName', 'Unknown')
+    }
 
 
-def lambda_handler(event, context):
+def get_my_ranking(user_id: str, period_type: str, period: str, neighbor_range: int,
+                   if_none_match: Optional[str] = None):
     """
-    ランキング関連API
+    自分の順位と前後 neighbor_range 人のランキングを取得
     
-    エンドポイント:
-    - POST /ranking/calculate - ランキング計算（バッチ処理用）
-    - GET /ranking/weekly?period=2025-W45 - 週間ランキング取得
-    - GET /ranking/monthly?period=2025-11 - 月間ランキング取得
-    - GET /ranking/compare?user_id=XXX&friend_id=YYY - 友達比較
+    RankingUsers（Period/UserId）のポイント読み取りで自分の順位を求め、
+    Rankings（Period/Rank）を Rank BETWEEN で範囲Queryするため、
+    順位に関係なく小さな読み取り2回で済む（packed形式では索引とチャンクの読み取り）
+    
+    Args:
+        user_id (str): ユーザーID
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+        neighbor_range (int): 前後に含める人数
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+    
+    Returns:
+        dict: API Gateway用のレスポンス
     """
     try:
-        # OPTIONSリクエストの処理（CORS preflight）
-        if event.get('httpMethod') == 'OPTIONS':
-            return create_response(200, {})
-        
-        method = event.get('httpMethod')
-        path = event.get('path', '')
-        query_params = event.get('queryStringParameters') or {}
+        period_key = f'{period_type}-{period}'
         
-        if method == 'POST' and '/ranking/calculate' in path:
-            # ランキング計算
-            period_type = query_params.get('type', 'weekly')  # weekly or monthly
-            return calculate_rankings(period_type)
-        elif method == 'GET' and '/ranking/friends/weekly' in path:
-            # 友達週間ランキング取得
-            user_id = query_params.get('user_id')
-            period = query_params.get('period') or get_current_week_period()
-            if not user_id:
-                return create_error_response(400, 'user_id is required')
-            return get_friends_weekly_rankings(user_id, period)
-        elif method == 'GET' and '/ranking/friends/monthly' in path:
-            # 友達月間ランキング取得
-            user_id = query_params.get('user_id')
-            period = query_params.get('period') or get_current_month_period()
-            if not user_id:
-                return create_error_response(400, 'user_id is required')
-            return get_friends_monthly_rankings(user_id, period)
-        elif method == 'GET' and '/ranking/compare' in path:
-            # 友達比較
-            user_id = query_params.get('user_id')
-            friend_id = query_params.get('friend_id')
-            if not user_id or not friend_id:
-                return create_error_response(400, 'user_id and friend_id are required')
-            return compare_users(user_id, friend_id)
-        else:
-            return create_error_response(404, 'Not Found')
+        def build_body():
+            snapshot = get_snapshot(period_key)
+            response_data = {
+                'ok': True,
+                'period': period,
+                'period_type': period_type,
+                'me': None,
+                'neighbors': []
+            }
             
+            # 自分の順位をポイント読み取り
+            my_rows = get_snapshot_user_rows(snapshot, [user_id])
+            my_item = my_rows[0] if my_rows else None
+            if not my_item:
+                # 期間内にスタンプを獲得していない（ランキング外）
+                return response_data
+            
+            my_rank = int(my_item['Rank'])
+            response_data['me'] = format_ranking_item(my_item)
+            
+            # 前後のユーザーを範囲Query
+            neighbors = query_snapshot_rankings(
+                snapshot,
+                low_rank=max(1, my_rank - neighbor_range),
+                high_rank=my_rank + neighbor_range
+            )
+            for item in neighbors:
+                ranking = format_ranking_item(item)
+                ranking['is_self'] = ranking['user_id'] == user_id
+                response_data['neighbors'].append(ranking)
+            return response_data
+        
+        return cached_ranking_response(
+            f'me:{user_id}:{period_key}:{neighbor_range}', period_key, build_body, if_none_match, public=False)
+        
     except Exception as e:
-        error_msg = f'Internal Server Error: {str(e)}'
+        error_msg = f'Failed to get my ranking: {str(e)}'
         print(error_msg)
         return create_error_response(500, error_msg)
 
 
-def calculate_rankings(period_type='weekly'):
+def get_period_rankings(period_type: str, period: str, board: Optional[tuple] = None,
+                        page: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
-    ランキングを計算してDynamoDBに保存
+    期間ランキングの1ページ分を作成（週間・月間共通）
+    
+    カーソルには読み取ったスナップショットのバージョンを含めるため、ページ送りの途中でランキングが
+    再計算されても同じスナップショット（TTLまで保持）から続きを返す
     
     Args:
         period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+        board (tuple, optional): 次元別ランキングの (dimension, value)
+        page (Dict, optional): get_page_params()の戻り値（省略時は上位100件）
+    
+    Returns:
+        Dict: レスポンスボディ
+    
+    Raises:
+        ValueError: カーソルのスナップショットが存在しない場合
+    """
+    period_key = get_board_period_key(period_type, period, *(board or ()))
+    page = page or {'limit': PAGE_SIZE_DEFAULT, 'cursor': None}
+    
+    if page['cursor']:
+        snapshot = get_cursor_snapshot(page['cursor'], period_key)
+        start_rank = page['cursor']['rank']
+    else:
+        snapshot = get_snapshot(period_key)
+        start_rank = 1
+    
+    # 次のページの有無を判定するため1件多く取得
+    items = query_snapshot_rankings(snapshot, low_rank=start_rank, limit=page['limit'] + 1)
+    has_more = len(items) > page['limit']
+    items = items[:page['limit']]
+    
+    body = {
+        'ok': True,
+        'period': period,
+        'period_type': period_type,
+        'rankings': [format_ranking_item(item) for item in items],
+        'next_cursor': encode_cursor(dict(
+            {'rank': int(items[-1]['Rank']) + 1},
+            **({'version': snapshot['Version']} if snapshot.get('Version') else {})
+        )) if has_more else None
+    }
+    if board:
+        body['dimension'], body['value'] = board
+    return body
+
+
+def parse_window(window: str) -> List[str]:
+    """
+    ウィンドウ指定を合算対象の日付バケットに変換
+    
+    - "daily": 今日
+    - "rolling-{N}d": 今日を含む直近N日（例: "rolling-7d"）
+    - "YYYY-MM-DD..YYYY-MM-DD": 開始日から終了日まで（両端を含む、イベント期間用）
+    
+    Args:
+        window (str): ウィンドウ指定
+    
+    Returns:
+        List[str]: 日付文字列のリスト（例: ["2025-11-10", "2025-11-11"]）
+    
+    Raises:
+        ValueError: 形式が不正、または WINDOW_MAX_DAYS を超える場合
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if window == 'daily':
+        start_date, end_date = today, today
+    elif window.startswith('rolling-') and window.endswith('d'):
+        try:
+            days = int(window[len('rolling-'):-1])
+        except ValueError:
+            raise ValueError(f'Invalid window: {window}')
+        if days < 1:
+            raise ValueError(f'Invalid window: {window}')
+        start_date, end_date = today - timedelta(days=days - 1), today
+    elif '..' in window:
+        try:
+            start_str, end_str = window.split('..')
+            start_date = datetime.strptime(start_str, '%Y-%m-%d')
+            end_date = datetime.strptime(end_str, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f'Invalid window: {window}')
+        if end_date < start_date:
+            raise ValueError(f'Invalid window: {window}')
+    else:
+        raise ValueError(f'Invalid window: {window}')
+    
+    days = get_day_buckets(int(start_date.timestamp()), int((end_date + timedelta(days=1)).timestamp()))
+    if len(days) > WINDOW_MAX_DAYS:
+        raise ValueError(f'window must be at most {WINDOW_MAX_DAYS} days')
+    return days
+
+
+def get_window_stamp_counts(days: List[str]) -> List[tuple]:
+    """
+    日別カウンターを合算し、スタンプ数の降順に並べる
+    
+    ページ送りのたびに全日分をQueryしないよう、RANKING_CACHE_SECONDS 秒だけコンテナ内にキャッシュする
+    
+    Args:
+        days (List[str]): 合算する日付バケット
+    
+    Returns:
+        List[tuple]: (UserId, スタンプ数) のリスト
+    """
+    now = time.time()
+    cache_key = (days[0], days[-1])
+    cached = _window_counts_cache.get(cache_key)
+    if cached and now - cached[0] < RANKING_CACHE_SECONDS:
+        return cached[1]
+    
+    day_items = parallel_query('RankingCounters', [
+        {
+            'KeyConditionExpression': 'Period = :period',
+            'ExpressionAttributeValues': {':period': f'daily-{day}'},
+            'ProjectionExpression': 'UserId, StampCount'
+        }
+        for day in days
+    ])
+    user_stamp_counts = Counter()
+    for items in day_items:
+        for item in items:
+            user_stamp_counts[item['UserId']] += int(item.get('StampCount', 0))
+    
+    sorted_counts = sorted(user_stamp_counts.items(), key=lambda x: x[1], reverse=True)
+    _window_counts_cache[cache_key] = (now, sorted_counts)
+    while len(_window_counts_cache) > WINDOW_COUNTS_CACHE_SIZE:
+        _window_counts_cache.popitem(last=False)
+    return sorted_counts
+
+
+def get_window_rankings(window: str, days: List[str], if_none_match: Optional[str] = None,
+                        page: Optional[Dict[str, Any]] = None):
+    """
+    任意期間のランキングを日別カウンターの合算で取得
+    
+    award関数が加算するRankingCountersの日別バケット（"daily-YYYY-MM-DD"）を
+    期間の日数分だけ同時にQueryして合算するため、UserStampsは読まない。
+    結果はスナップショットを持たないため RANKING_CACHE_SECONDS 秒だけキャッシュする
+    
+    Args:
+        window (str): ウィンドウ指定（レスポンスにそのまま返す）
+        days (List[str]): 合算する日付バケット
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+        page (Dict, optional): get_page_params()の戻り値（省略時は上位100件）
     
     Returns:
         dict: API Gateway用のレスポンス
     """
     try:
-        period = get_current_week_period() if period_type == 'weekly' else get_current_month_period()
-        period_key = f'weekly-{period}' if period_type == 'weekly' else f'monthly-{period}'
-        
-        print(f'ランキング計算開始: period_type={period_type}, period={period}, period_key={period_key}')
-        
-        # 期間の開始日時を計算
-        if period_type == 'weekly':
-            # ISO週の開始日（月曜日）を計算
-            now = datetime.now()
-            year, week, weekday = now.isocalendar()
-            # 月曜日を週の開始とする（weekday: 1=月曜日, 7=日曜日）
-            days_from_monday = weekday - 1
-            start_date = now - timedelta(days=days_from_monday)
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            start_timestamp = int(start_date.timestamp())
-        else:
-            # 月間ランキング: 今月の1日 00:00:00 を開始日とする
-            now = datetime.now()
-            start_date = datetime(now.year, now.month, 1, 0, 0, 0, 0)
-            start_timestamp = int(start_date.timestamp())
-        
-        print(f'期間開始タイムスタンプ: {start_timestamp} ({start_date})')
-        print(f'現在のタイムスタンプ: {int(datetime.now().timestamp())}')
-        
-        # UserStampsテーブルから全ユーザーのスタンプ数を集計
-        user_stamps_table = get_table('UserStamps')
-        users_table = get_table('Users')
-        rankings_table = get_table('Rankings')
-        
-        # ユーザーごとのスタンプ数を集計
-        user_stamp_counts = {}
-        
-        # Scanを使用して全スタンプを取得（実際の運用では効率化が必要）
-        print('UserStampsテーブルからスタンプデータを取得中...')
-        response = user_stamps_table.scan()
-        items = response.get('Items', [])
-        print(f'取得したスタンプデータ件数: {len(items)}')
-        
-        period_stamp_count = 0
-        for item in items:
-            user_id = item.get('UserId')
-            collected_at = int(item.get('CollectedAt', 0))
-            
-            # 期間内のスタンプのみをカウント
-            if collected_at >= start_timestamp:
-                period_stamp_count += 1
-                if user_id not in user_stamp_counts:
-                    user_stamp_counts[user_id] = 0
-                user_stamp_counts[user_id] += 1
-                print(f'期間内スタンプ: user_id={user_id}, collected_at={collected_at}')
-        
-        print(f'期間内のスタンプ数: {period_stamp_count}')
-        print(f'ユーザー数: {len(user_stamp_counts)}')
-        print(f'ユーザーごとのスタンプ数: {user_stamp_counts}')
-        
-        # スタンプ数でソート
-        sorted_users = sorted(user_stamp_counts.items(), key=lambda x: x[1], reverse=True)
-        print(f'ソート後のユーザー数: {len(sorted_users)}')
-        
-        # ランキングデータを保存
-        rank = 1
-        rankings_to_save = []
-        
-        for user_id, stamp_count in sorted_users:
-            # ユーザー情報を取得（表示名用）
-            try:
-                user = users_table.get_item(Key={'UserId': user_id})
-                display_name = user.get('Item', {}).get('DisplayName', 'Unknown')
-            except:
-                display_name = 'Unknown'
-            
-            rankings_to_save.append({
-                'Period': period_key,
-                'Rank': rank,
-                'UserId': user_id,
-                'StampCount': stamp_count,
-                'DisplayName': display_name,
-                'UpdatedAt': int(datetime.now().timestamp())
-            })
-            rank += 1
+        page = page or {'limit': PAGE_SIZE_DEFAULT, 'cursor': None}
         
-        # 既存のランキングを削除（バッチ削除）
-        if rankings_to_save:
-            # 既存データを削除
-            try:
-                existing = rankings_table.query(
-                    KeyConditionExpression='Period = :period',
-                    ExpressionAttributeValues={':period': period_key}
-                )
-                for item in existing.get('Items', []):
-                    rankings_table.delete_item(
-                        Key={
-                            'Period': period_key,
-                            'Rank': item['Rank']
-                        }
-                    )
-            except Exception as e:
-                print(f'Warning: Failed to delete existing rankings: {str(e)}')
+        def build_body():
+            sorted_counts = get_window_stamp_counts(days)
+            start_rank = page['cursor']['rank'] if page['cursor'] else 1
+            page_users = sorted_counts[start_rank - 1:start_rank - 1 + page['limit']]
+            display_names = resolve_display_names([user_id for user_id, _ in page_users])
             
-            # 新しいランキングを保存
-            for ranking in rankings_to_save:
-                rankings_table.put_item(Item=ranking)
+            has_more = start_rank - 1 + page['limit'] < len(sorted_counts)
+            return {
+                'ok': True,
+                'window': window,
+                'start': days[0],
+                'end': days[-1],
+                'rankings': [
+                    {
+                        'rank': rank,
+                        'user_id': user_id,
+                        'stamp_count': stamp_count,
+                        'display_name': display_names.get(user_id, 'Unknown')
+                    }
+                    for rank, (user_id, stamp_count) in enumerate(page_users, start=start_rank)
+                ],
+                'next_cursor': encode_cursor({'rank': start_rank + len(page_users)}) if has_more else None
+            }
         
-        return create_response(200, {
-            'ok': True,
-            'period': period,
-            'period_type': period_type,
-            'rankings_count': len(rankings_to_save)
-        })
+        return cached_ranking_response(
+            get_page_cache_key(f'window:{days[0]}..{days[-1]}', page), None, build_body, if_none_match)
         
     except Exception as e:
-        error_msg = f'Failed to calculate rankings: {str(e)}'
+        error_msg = f'Failed to get window rankings: {str(e)}'
         print(error_msg)
         return create_error_response(500, error_msg)
 
 
-def get_weekly_rankings(period: str):
+def get_weekly_rankings(period: str, if_none_match: Optional[str] = None, board: Optional[tuple] = None,
+                        page: Optional[Dict[str, Any]] = None):
     """
     週間ランキングを取得
     
     Args:
         period (str): 期間文字列（例: "2025-W45"）
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+        board (tuple, optional): 次元別ランキングの (dimension, value)（例: ('method', 'GPS')）
+        page (Dict, optional): get_page_params()の戻り値
     
     Returns:
         dict: API Gateway用のレスポンス
     """
     try:
-        rankings_table = get_table('Rankings')
-        period_key = f'weekly-{period}'
-        
-        response = rankings_table.query(
-            KeyConditionExpression='Period = :period',
-            ExpressionAttributeValues={
-                ':period': period_key
-            },
-            Limit=100,
-            ScanIndexForward=True  # 昇順（ランク1から）
-        )
-        
-        rankings = []
-        for item in response.get('Items', []):
-            rankings.append({
-                'rank': int(item.get('Rank', 0)),
-                'user_id': item.get('UserId', ''),
-                'stamp_count': int(item.get('StampCount', 0)),
-                'display_name': item.get('DisplayName', 'Unknown')
-            })
-        
-        return create_response(200, {
-            'ok': True,
-            'period': period,
-            'period_type': 'weekly',
-            'rankings': rankings
-        })
+        period_key = get_board_period_key('weekly', period, *(board or ()))
+        return cached_ranking_response(
+            get_page_cache_key(period_key, page), period_key,
+            lambda: get_period_rankings('weekly', period, board, page), if_none_match)
         
+    except ValueError as e:
+        return create_error_response(400, str(e))
     except Exception as e:
         error_msg = f'Failed to get weekly rankings: {str(e)}'
         print(error_msg)
         return create_error_response(500, error_msg)
 
 
-def get_monthly_rankings(period: str):
+def get_monthly_rankings(period: str, if_none_match: Optional[str] = None, board: Optional[tuple] = None,
+                        page: Optional[Dict[str, Any]] = None):
     """
     月間ランキングを取得
     
     Args:
         period (str): 期間文字列（例: "2025-11"）
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+        board (tuple, optional): 次元別ランキングの (dimension, value)（例: ('method', 'GPS')）
+        page (Dict, optional): get_page_params()の戻り値
     
     Returns:
         dict: API Gateway用のレスポンス
     """
     try:
-        rankings_table = get_table('Rankings')
-        period_key = f'monthly-{period}'
-        
-        response = rankings_table.query(
-            KeyConditionExpression='Period = :period',
-            ExpressionAttributeValues={
-                ':period': period_key
-            },
-            Limit=100,
-            ScanIndexForward=True  # 昇順（ランク1から）
-        )
-        
-        rankings = []
-        for item in response.get('Items', []):
-            rankings.append({
-                'rank': int(item.get('Rank', 0)),
-                'user_id': item.get('UserId', ''),
-                'stamp_count': int(item.get('StampCount', 0)),
-                'display_name': item.get('DisplayName', 'Unknown')
-            })
-        
-        return create_response(200, {
-            'ok': True,
-            'period': period,
-            'period_type': 'monthly',
-            'rankings': rankings
-        })
+        period_key = get_board_period_key('monthly', period, *(board or ()))
+        return cached_ranking_response(
+            get_page_cache_key(period_key, page), period_key,
+            lambda: get_period_rankings('monthly', period, board, page), if_none_match)
         
+    except ValueError as e:
+        return create_error_response(400, str(e))
     except Exception as e:
         error_msg = f'Failed to get monthly rankings: {str(e)}'
         print(error_msg)
@@ -310,6 +1713,13 @@ def compare_users(user_id: str, friend_id: str):
     """
     2人のユーザーを比較
     
+    累計スタンプ数はUsersの非正規化カウンター（StampCount）から、今週・今月の
+    スタンプ数はRankingCountersから、それぞれ2人分をまとめてBatchGetItemで同時に取得する。
+    StampCountがないユーザーはUserStampsのCOUNTクエリで数える。
+    
+    デプロイ時に backend/scripts/backfill_user_stamp_count.py で既存ユーザーのStampCountを
+    設定しておくこと（必須。未設定のユーザーは毎回COUNTクエリにフォールバックする）
+    
     Args:
         user_id (str): ユーザーID
         friend_id (str): 友達のユーザーID
@@ -318,32 +1728,52 @@ def compare_users(user_id: str, friend_id: str):
         dict: API Gateway用のレスポンス
     """
     try:
-        user_stamps_table = get_table('UserStamps')
-        users_table = get_table('Users')
-        
-        # 両ユーザーのスタンプ数を取得
-        def get_stamp_count(uid):
-            response = user_stamps_table.query(
-                KeyConditionExpression='UserId = :user_id',
-                ExpressionAttributeValues={':user_id': uid}
+        user_ids = [user_id, friend_id]
+        period_keys = {
+            'weekly': f'weekly-{get_current_week_period()}',
+            'monthly': f'monthly-{get_current_month_period()}'
+        }
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            users_future = executor.submit(
+                batch_get_items,
+                'Users',
+                [{'UserId': {'S': uid}} for uid in set(user_ids)],
+                projection_expression='UserId, DisplayName, StampCount'
+            )
+            counters_future = executor.submit(
+                batch_get_items,
+                'RankingCounters',
+                [
+                    {'Period': {'S': period_key}, 'UserId': {'S': uid}}
+                    for period_key in period_keys.values()
+                    for uid in set(user_ids)
+                ],
+                projection_expression='Period, UserId, StampCount'
             )
-            return len(response.get('Items', []))
+            users = {item['UserId']: item for item in map(deserialize_item, users_future.result())}
+            period_counts = {
+                (item['Period'], item['UserId']): int(item.get('StampCount', 0))
+                for item in map(deserialize_item, counters_future.result())
+            }
+            
+            # 累計スタンプ数が非正規化されていないユーザーはCOUNTクエリで数える
+            count_futures = {
+                uid: executor.submit(count_user_stamps, uid)
+                for uid in set(user_ids)
+                if 'StampCount' not in users.get(uid, {})
+            }
+            total_counts = {uid: future.result() for uid, future in count_futures.items()}
         
         def get_user_info(uid):
-            try:
-                response = users_table.get_item(Key={'UserId': uid})
-                item = response.get('Item', {})
-                return {
-                    'user_id': uid,
-                    'display_name': item.get('DisplayName', 'Unknown'),
-                    'stamp_count': get_stamp_count(uid)
-                }
-            except:
-                return {
-                    'user_id': uid,
-                    'display_name': 'Unknown',
-                    'stamp_count': 0
-                }
+            user = users.get(uid, {})
+            return {
+                'user_id': uid,
+                'display_name': user.get('DisplayName', 'Unknown'),
+                'stamp_count': int(user['StampCount']) if 'StampCount' in user else total_counts[uid],
+                'weekly_stamp_count': period_counts.get((period_keys['weekly'], uid), 0),
+                'monthly_stamp_count': period_counts.get((period_keys['monthly'], uid), 0)
+            }
         
         user_info = get_user_info(user_id)
         friend_info = get_user_info(friend_id)
@@ -356,6 +1786,8 @@ def compare_users(user_id: str, friend_id: str):
             'user': user_info,
             'friend': friend_info,
             'rank_diff': rank_diff,
+            'weekly_diff': user_info['weekly_stamp_count'] - friend_info['weekly_stamp_count'],
+            'monthly_diff': user_info['monthly_stamp_count'] - friend_info['monthly_stamp_count'],
             'user_is_higher': rank_diff > 0
         })
         
@@ -388,202 +1820,169 @@ def get_current_month_period():
     return f"{now.year}-{now.month:02d}"
 
 
-def get_friends_weekly_rankings(user_id: str, period: str):
+def get_friends_weekly_rankings(user_id: str, period: str, if_none_match: Optional[str] = None,
+                                page: Optional[Dict[str, Any]] = None):
     """
     友達の週間ランキングを取得
     
     Args:
         user_id (str): ユーザーID
         period (str): 期間文字列（例: "2025-W45"）
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+        page (Dict, optional): get_page_params()の戻り値
     
     Returns:
         dict: API Gateway用のレスポンス
     """
     try:
-        friends_table = get_table('Friends')
-        rankings_table = get_table('Rankings')
-        users_table = get_table('Users')
-        
-        # 友達リストを取得
-        friends_response = friends_table.query(
-            KeyConditionExpression='UserId = :user_id',
-            ExpressionAttributeValues={':user_id': user_id}
-        )
-        
-        friends_items = friends_response.get('Items', [])
-        print(f'友達リスト取得: user_id={user_id}, 友達数={len(friends_items)}')
-        
-        # Statusが'active'の友達のみをフィルタリング
-        friend_ids = []
-        for item in friends_items:
-            status = item.get('Status', 'active')
-            friend_id = item.get('FriendId')
-            print(f'友達: {friend_id}, Status: {status}')
-            if status == 'active':
-                friend_ids.append(friend_id)
-        
-        print(f'アクティブな友達数: {len(friend_ids)}')
-        
-        # 自分自身もランキングに含める
-        user_ids_to_include = friend_ids.copy()
-        if user_id not in user_ids_to_include:
-            user_ids_to_include.append(user_id)
-            print(f'自分自身を追加: {user_id}')
-        
-        print(f'ランキングに含めるユーザー数: {len(user_ids_to_include)} (友達: {len(friend_ids)}, 自分: 1)')
-        
-        if not user_ids_to_include:
-            print('ランキングに含めるユーザーがありません')
-            return create_response(200, {
-                'ok': True,
-                'period': period,
-                'period_type': 'weekly',
-                'rankings': []
-            })
-        
-        # 全体ランキングから友達と自分自身をフィルタリング
         period_key = f'weekly-{period}'
-        print(f'友達ランキング取得: user_id={user_id}, period={period}, period_key={period_key}')
-        print(f'ランキングに含めるIDリスト: {user_ids_to_include}')
-        
-        rankings_response = rankings_table.query(
-            KeyConditionExpression='Period = :period_val',
-            ExpressionAttributeValues={':period_val': period_key},
-            ScanIndexForward=True
-        )
-        
-        all_rankings = rankings_response.get('Items', [])
-        print(f'全体ランキング件数: {len(all_rankings)}')
-        
-        # 友達と自分自身をフィルタリング
-        friend_rankings = []
-        for item in all_rankings:
-            item_user_id = item.get('UserId')
-            if item_user_id in user_ids_to_include:
-                is_self = (item_user_id == user_id)
-                friend_rankings.append({
-                    'rank': int(item.get('Rank')),
-                    'user_id': item_user_id,
-                    'stamp_count': int(item.get('StampCount', 0)),
-                    'display_name': item.get('DisplayName', 'Unknown'),
-                    'is_self': is_self  # 自分自身かどうかのフラグ
-                })
-                print(f'ランキング追加: {item_user_id} {"(自分)" if is_self else "(友達)"}, rank={item.get("Rank")}, stamps={item.get("StampCount")}')
-        
-        print(f'友達ランキング件数: {len(friend_rankings)}')
-        
-        # ランクを再計算（1位から）
-        for i, ranking in enumerate(friend_rankings):
-            ranking['rank'] = i + 1
-        
-        return create_response(200, {
-            'ok': True,
-            'period': period,
-            'period_type': 'weekly',
-            'rankings': friend_rankings
-        })
-        
+        return cached_ranking_response(
+            get_page_cache_key(f'friends:{user_id}:{period_key}', page), period_key,
+            lambda: get_friends_rankings(user_id, 'weekly', period, page), if_none_match, public=False)
     except Exception as e:
         error_msg = f'Failed to get friends weekly rankings: {str(e)}'
         print(error_msg)
         return create_error_response(500, error_msg)
 
 
-def get_friends_monthly_rankings(user_id: str, period: str):
+def get_friends_monthly_rankings(user_id: str, period: str, if_none_match: Optional[str] = None,
+                                page: Optional[Dict[str, Any]] = None):
     """
     友達の月間ランキングを取得
     
     Args:
         user_id (str): ユーザーID
         period (str): 期間文字列（例: "2025-11"）
+        if_none_match (str, optional): リクエストのIf-None-Matchヘッダー
+        page (Dict, optional): get_page_params()の戻り値
     
     Returns:
         dict: API Gateway用のレスポンス
     """
     try:
-        friends_table = get_table('Friends')
-        rankings_table = get_table('Rankings')
-        users_table = get_table('Users')
-        
-        # 友達リストを取得
-        friends_response = friends_table.query(
-            KeyConditionExpression='UserId = :user_id',
-            ExpressionAttributeValues={':user_id': user_id}
-        )
-        
-        friends_items = friends_response.get('Items', [])
-        print(f'友達リスト取得: user_id={user_id}, 友達数={len(friends_items)}')
-        
-        # Statusが'active'の友達のみをフィルタリング
-        friend_ids = []
-        for item in friends_items:
-            status = item.get('Status', 'active')
-            friend_id = item.get('FriendId')
-            print(f'友達: {friend_id}, Status: {status}')
-            if status == 'active':
-                friend_ids.append(friend_id)
-        
-        print(f'アクティブな友達数: {len(friend_ids)}')
-        
-        # 自分自身もランキングに含める
-        user_ids_to_include = friend_ids.copy()
-        if user_id not in user_ids_to_include:
-            user_ids_to_include.append(user_id)
-            print(f'自分自身を追加: {user_id}')
-        
-        print(f'ランキングに含めるユーザー数: {len(user_ids_to_include)} (友達: {len(friend_ids)}, 自分: 1)')
-        
-        if not user_ids_to_include:
-            print('ランキングに含めるユーザーがありません')
-            return create_response(200, {
-                'ok': True,
-                'period': period,
-                'period_type': 'monthly',
-                'rankings': []
-            })
-        
-        # 全体ランキングから友達と自分自身をフィルタリング
         period_key = f'monthly-{period}'
-        print(f'友達ランキング取得: user_id={user_id}, period={period}, period_key={period_key}')
-        print(f'ランキングに含めるIDリスト: {user_ids_to_include}')
-        
-        rankings_response = rankings_table.query(
-            KeyConditionExpression='Period = :period_val',
-            ExpressionAttributeValues={':period_val': period_key},
-            ScanIndexForward=True
-        )
-        
-        all_rankings = rankings_response.get('Items', [])
-        print(f'全体ランキング件数: {len(all_rankings)}')
-        
-        # 友達と自分自身をフィルタリング
-        friend_rankings = []
-        for item in all_rankings:
-            item_user_id = item.get('UserId')
-            if item_user_id in user_ids_to_include:
-                is_self = (item_user_id == user_id)
-                friend_rankings.append({
-                    'rank': int(item.get('Rank')),
-                    'user_id': item_user_id,
-                    'stamp_count': int(item.get('StampCount', 0)),
-                    'display_name': item.get('DisplayName', 'Unknown'),
-                    'is_self': is_self  # 自分自身かどうかのフラグ
-                })
-                print(f'ランキング追加: {item_user_id} {"(自分)" if is_self else "(友達)"}, rank={item.get("Rank")}, stamps={item.get("StampCount")}')
-        
-        # ランクを再計算（1位から）
-        for i, ranking in enumerate(friend_rankings):
-            ranking['rank'] = i + 1
-        
-        return create_response(200, {
-            'ok': True,
-            'period': period,
-            'period_type': 'monthly',
-            'rankings': friend_rankings
-        })
-        
+        return cached_ranking_response(
+            get_page_cache_key(f'friends:{user_id}:{period_key}', page), period_key,
+            lambda: get_friends_rankings(user_id, 'monthly', period, page), if_none_match, public=False)
     except Exception as e:
         error_msg = f'Failed to get friends monthly rankings: {str(e)}'
         print(error_msg)
         return create_error_response(500, error_msg)
 
+
+def get_active_friend_ids(user_id: str) -> List[str]:
+    """
+    Statusが'active'の友達のユーザーIDを取得（ページネーション対応）
+    
+    Args:
+        user_id (str): ユーザーID
+    
+    Returns:
+        List[str]: 友達のユーザーID
+    """
+    friends_table = get_table('Friends')
+    
+    friend_ids = []
+    query_kwargs = {
+        'KeyConditionExpression': 'UserId = :user_id',
+        'ExpressionAttributeValues': {':user_id': user_id},
+        'ProjectionExpression': 'FriendId, #status',
+        'ExpressionAttributeNames': {'#status': 'Status'}
+    }
+    while True:
+        response = friends_table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            if item.get('Status', 'active') == 'active':
+                friend_ids.append(item.get('FriendId'))
+        
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+    
+    return friend_ids
+
+
+def get_friends_rankings(user_id: str, period_type: str, period: str,
+                         page: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    友達と自分自身のランキングを作成（週間・月間共通）
+    
+    期間パーティション全体は読まず、RankingUsers（Period/UserId）から
+    友達と自分の行だけをBatchGetItemで取得して全体順位で並べ替えるため、
+    コストは友達数に比例する
+    
+    Args:
+        user_id (str): ユーザーID
+        period_type (str): 'weekly' または 'monthly'
+        period (str): 期間文字列（例: "2025-W45", "2025-11"）
+        page (Dict, optional): get_page_params()の戻り値（省略時は先頭100件）
+    
+    Returns:
+        Dict: レスポンスボディ
+    """
+    friend_ids = get_active_friend_ids(user_id)
+    print(f'友達リスト取得: user_id={user_id}, アクティブな友達数={len(friend_ids)}')
+    
+    # 自分自身もランキングに含める
+    user_ids_to_include = set(friend_ids)
+    user_ids_to_include.add(user_id)
+    
+    period_key = f'{period_type}-{period}'
+    pointer = get_snapshot_pointer(period_key)
+    print(f'友達ランキング取得: user_id={user_id}, period_key={period_key}, 対象ユーザー数={len(user_ids_to_include)}')
+    
+    if pointer:
+        # ユーザー別の行だけをまとめて取得
+        items = get_snapshot_user_rows(get_snapshot(period_key), list(user_ids_to_include))
+    else:
+        # 旧形式（ポインターなし）の場合は期間パーティションをページングしてフィルタ
+        items = query_legacy_rankings(period_key, user_ids_to_include)
+    
+    # 全体順位で並べ替えてから、ランクを再計算（1位から）
+    friend_rankings = []
+    for i, item in enumerate(sorted(items, key=lambda x: int(x.get('Rank', 0))), start=1):
+        ranking = format_ranking_item(item)
+        ranking['rank'] = i
+        ranking['is_self'] = ranking['user_id'] == user_id  # 自分自身かどうかのフラグ
+        friend_rankings.append(ranking)
+    
+    print(f'友達ランキング件数: {len(friend_rankings)}')
+    
+    return dict({
+        'ok': True,
+        'period': period,
+        'period_type': period_type,
+        'total': len(friend_rankings)
+    }, **paginate_rankings(friend_rankings, page))
+
+
+def query_legacy_rankings(period_key: str, user_ids: set) -> List[Dict[str, Any]]:
+    """
+    旧形式（period_keyパーティションに直接保存）のランキングから指定ユーザーの行を取得
+    
+    Args:
+        period_key (str): 期間キー（例: "weekly-2025-W45"）
+        user_ids (set): 取得するユーザーID
+    
+    Returns:
+        List[Dict]: ランキングのアイテム
+    """
+    rankings_table = get_table('Rankings')
+    
+    items = []
+    query_kwargs = {
+        'KeyConditionExpression': 'Period = :period AND #rank >= :first_rank',
+        'ExpressionAttributeNames': {'#rank': 'Rank'},
+        'ExpressionAttributeValues': {':period': period_key, ':first_rank': 1}
+    }
+    while True:
+        response = rankings_table.query(**query_kwargs)
+        items.extend(item for item in response.get('Items', []) if item.get('UserId') in user_ids)
+        
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+    
+    return items
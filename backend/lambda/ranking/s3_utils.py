@@ -0,0 +1,183 @@
+import boto3
+import gzip
+import hashlib
+import json
+import os
+import time
+from botocore.exceptions import ClientError
+from typing import Any, Dict, Optional, Tuple
+
+
+# S3クライアント
+s3_client = boto3.client('s3')
+
+# 静的ランキングの公開先（未設定の場合は公開しない）
+RANKING_S3_BUCKET = os.environ.get('RANKING_S3_BUCKET') or os.environ.get('S3_BUCKET')
+RANKING_S3_PREFIX = os.environ.get('RANKING_S3_PREFIX', 'rankings/')
+# マニフェストのCache-Control max-age（秒）。ランキング本体は内容ハッシュ付きのキーなので無期限
+RANKING_MANIFEST_MAX_AGE = int(os.environ.get('RANKING_MANIFEST_MAX_AGE', '60'))
+# マニフェストに残す期間（最終更新からの日数）
+RANKING_MANIFEST_RETENTION_DAYS = int(os.environ.get('RANKING_MANIFEST_RETENTION_DAYS', '35'))
+
+# マニフェストの条件付き書き込みが競合した場合の再試行回数
+MANIFEST_WRITE_MAX_RETRIES = int(os.environ.get('RANKING_MANIFEST_WRITE_RETRIES', '5'))
+
+MANIFEST_KEY = f'{RANKING_S3_PREFIX}manifest.json'
+
+
+def is_static_publish_enabled() -> bool:
+    """
+    静的ランキングの公開先が設定されているかを返す
+
+    Returns:
+        bool: RANKING_S3_BUCKET（またはS3_BUCKET）が設定されている場合True
+    """
+    return bool(RANKING_S3_BUCKET)
+
+
+def put_json_object(key: str, body: Dict[str, Any], cache_control: str, if_match: Optional[str] = None,
+                    if_none_match: Optional[str] = None):
+    """
+    JSONをgzip圧縮してS3に書き込む
+
+    Args:
+        key (str): オブジェクトキー
+        body (Dict): 書き込むJSON
+        cache_control (str): Cache-Controlヘッダー
+        if_match (str, optional): 指定時は現在のETagが一致する場合のみ書き込む（条件付き書き込み）
+        if_none_match (str, optional): '*' の場合はオブジェクトが存在しない場合のみ書き込む
+    """
+    raw = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    conditions = {}
+    if if_match:
+        conditions['IfMatch'] = if_match
+    if if_none_match:
+        conditions['IfNoneMatch'] = if_none_match
+    s3_client.put_object(
+        Bucket=RANKING_S3_BUCKET,
+        Key=key,
+        Body=gzip.compress(raw, mtime=0),
+        ContentType='application/json; charset=utf-8',
+        ContentEncoding='gzip',
+        CacheControl=cache_control,
+        **conditions
+    )
+
+
+def is_write_conflict(error: ClientError) -> bool:
+    """
+    条件付き書き込みの競合（ETagの不一致、または同時書き込み）かどうかを判定
+
+    Args:
+        error (ClientError): S3の例外
+
+    Returns:
+        bool: PreconditionFailed（412）またはConditionalRequestConflict（409）の場合True
+    """
+    return error.response.get('Error', {}).get('Code') in ['PreconditionFailed', 'ConditionalRequestConflict']
+
+
+def get_manifest() -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    現在のマニフェストとそのETagを取得
+
+    Returns:
+        tuple: (マニフェスト（存在しない場合は空のマニフェスト）, ETag（存在しない場合はNone）)
+    """
+    try:
+        response = s3_client.get_object(Bucket=RANKING_S3_BUCKET, Key=MANIFEST_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        return {'boards': {}, 'latest': {}}, None
+
+    data = response['Body'].read()
+    if response.get('ContentEncoding') == 'gzip':
+        data = gzip.decompress(data)
+    manifest = json.loads(data.decode('utf-8'))
+    manifest.setdefault('boards', {})
+    manifest.setdefault('latest', {})
+    return manifest, response.get('ETag')
+
+
+def update_manifest(manifest: Dict[str, Any], period_key: str, board_name: str, key: str, version: str) -> bool:
+    """
+    マニフェストに公開したランキングを反映する（期限切れの期間も外す）
+
+    Args:
+        manifest (Dict): get_manifest()で取得したマニフェスト（この関数で書き換える）
+        period_key (str): 期間キー
+        board_name (str): ランキング名
+        key (str): 公開したオブジェクトキー
+        version (str): 公開したスナップショットのバージョン
+
+    Returns:
+        bool: 反映した場合True（より新しいバージョンが公開済みの場合False）
+    """
+    current = manifest['boards'].get(period_key)
+    if current and current.get('version', '') > version:
+        return False
+
+    now = int(time.time())
+    manifest['boards'][period_key] = {
+        'key': key,
+        'version': version,
+        'updated_at': now
+    }
+    latest_key = manifest['latest'].get(board_name)
+    if not latest_key or latest_key <= period_key:
+        manifest['latest'][board_name] = period_key
+
+    # 古い期間はマニフェストから外す（オブジェクト自体はライフサイクルルールで削除）
+    expires_before = now - RANKING_MANIFEST_RETENTION_DAYS * 86400
+    manifest['boards'] = {
+        k: v for k, v in manifest['boards'].items()
+        if v.get('updated_at', 0) >= expires_before or k in manifest['latest'].values()
+    }
+    manifest['updated_at'] = now
+    return True
+
+
+def publish_static_board(period_key: str, board_name: str, version: str, body: Dict[str, Any]) -> Optional[str]:
+    """
+    ランキングを内容ハッシュ付きの静的JSONとしてS3に公開し、マニフェストを更新
+
+    本体は "{prefix}{period_key}/{内容ハッシュ}.json" に immutable なキャッシュ指定で書き込むため、
+    CDNで長期間キャッシュできる。マニフェスト（"{prefix}manifest.json"）は期間キーごとの最新のキーと、
+    ランキング名（例: "weekly", "weekly-method-GPS"）ごとの最新の期間キーを持ち、短いmax-ageで配信する。
+    より新しいバージョンが公開済みの場合はマニフェストを書き換えない。
+    マニフェストは読み取ったETagを条件に書き込み（S3の条件付き書き込み）、ほかの期間の公開と
+    競合した場合は読み直して再試行するため、同時に公開しても互いの更新を上書きしない
+
+    Args:
+        period_key (str): 期間キー（例: "weekly-2025-W45"）
+        board_name (str): ランキング名（期間を除いた部分、例: "weekly"）
+        version (str): 公開したスナップショットのバージョン
+        body (Dict): 公開するランキング（バージョンを含めないことで、同じ内容は同じキーになる）
+
+    Returns:
+        Optional[str]: 書き込んだオブジェクトキー（公開先が未設定の場合はNone）
+    """
+    if not is_static_publish_enabled():
+        return None
+
+    raw = json.dumps(body, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    content_hash = hashlib.sha256(raw).hexdigest()[:16]
+    key = f'{RANKING_S3_PREFIX}{period_key}/{content_hash}.json'
+    put_json_object(key, body, 'public, max-age=31536000, immutable')
+
+    for attempt in range(MANIFEST_WRITE_MAX_RETRIES + 1):
+        manifest, etag = get_manifest()
+        if not update_manifest(manifest, period_key, board_name, key, version):
+            print(f'Warning: Newer static board already published for {period_key}, skipped manifest update')
+            return key
+        try:
+            put_json_object(MANIFEST_KEY, manifest, f'public, max-age={RANKING_MANIFEST_MAX_AGE}',
+                            if_match=etag, if_none_match=None if etag else '*')
+            break
+        except ClientError as e:
+            if not is_write_conflict(e) or attempt == MANIFEST_WRITE_MAX_RETRIES:
+                raise
+            print(f'マニフェストの更新が競合したため再試行: {period_key} ({attempt + 1}回目)')
+            time.sleep(min(0.1 * (2 ** attempt), 2.0))
+
+    print(f'静的ランキング公開: {key}')
+    return key
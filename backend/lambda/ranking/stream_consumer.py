@@ -0,0 +1,309 @@
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from dynamodb_utils import update_items
+
+# ランキングカウンターの更新元（'award': award関数が授与時に加算、'stream': このストリーム処理で加算）
+# 二重計上を防ぐため、award / objectCustomLabel 関数と同じ値を設定すること
+RANKING_COUNTERS_SOURCE = os.environ.get('RANKING_COUNTERS_SOURCE', 'award')
+# 期間別カウンターの保持日数（award関数と同じ値）
+RANKING_COUNTER_TTL_DAYS = int(os.environ.get('RANKING_COUNTER_TTL_DAYS', '400'))
+# SequenceNumberの最大桁数（文字列として大小比較できるよう、この桁数まで0で埋める）
+SEQUENCE_NUMBER_DIGITS = 40
+
+
+def is_stream_event(event: Dict[str, Any]) -> bool:
+    """
+    DynamoDB Streamsからの呼び出しかどうかを判定
+
+    Args:
+        event (Dict): Lambdaイベント
+
+    Returns:
+        bool: DynamoDB Streamsのレコードを含む場合True
+    """
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:dynamodb'
+
+
+def get_period_keys(timestamp: int) -> List[str]:
+    """
+    タイムスタンプが属するランキング期間キーを返す（award関数と同じ形式）
+
+    Args:
+        timestamp (int): Unixタイムスタンプ
+
+    Returns:
+        List[str]: 期間キーのリスト（週間・月間・日別）
+    """
+    dt = datetime.fromtimestamp(timestamp)
+    year, week, _ = dt.isocalendar()
+    return [
+        f'weekly-{year}-W{week:02d}',
+        f'monthly-{dt.year}-{dt.month:02d}',
+        f'daily-{dt.strftime("%Y-%m-%d")}'
+    ]
+
+
+def get_sequence_key(record: Dict[str, Any]) -> str:
+    """
+    レコードのSequenceNumberを、文字列の大小比較で順序が判定できる形式で返す
+
+    Args:
+        record (Dict): DynamoDB Streamsのレコード
+
+    Returns:
+        str: 0で埋めたSequenceNumber（例: "000...0100000000000000000001"）
+    """
+    return record['dynamodb']['SequenceNumber'].zfill(SEQUENCE_NUMBER_DIGITS)
+
+
+def coalesce_stream_records(records: List[Dict[str, Any]]) -> tuple[Dict[tuple, Dict], Dict[str, Dict]]:
+    """
+    ストリームのINSERTレコードをユーザー・期間ごとにまとめる
+
+    Args:
+        records (List[Dict]): DynamoDB Streamsのレコード（バッチ内の順序のまま）
+
+    Returns:
+        tuple: (counter_groups, user_groups)
+            counter_groups: (期間キー, UserId) -> {'indexes': [...], 'sequences': [...], 'collected_at': 最新の収集日時}
+            user_groups: UserId -> {'indexes': [...], 'sequences': [...]}
+            indexesは加算に寄与したレコードのバッチ内の位置、sequencesはそのSequenceNumber（get_sequence_key）
+    """
+    counter_groups = {}
+    user_groups = {}
+
+    for index, record in enumerate(records):
+        if record.get('eventName') != 'INSERT':
+            continue
+
+        new_image = record.get('dynamodb', {}).get('NewImage', {})
+        try:
+            user_id = new_image['UserId']['S']
+            collected_at = int(new_image['CollectedAt']['N'])
+            sequence = get_sequence_key(record)
+        except (KeyError, ValueError) as e:
+            # 不正なレコードで後続のレコードを止めないよう、ログを出してスキップ
+            print(f'Skipping malformed stream record: index={index}, error={str(e)}')
+            continue
+
+        for period_key in get_period_keys(collected_at):
+            group = counter_groups.setdefault((period_key, user_id),
+                                              {'indexes': [], 'sequences': [], 'collected_at': 0})
+            group['indexes'].append(index)
+            group['sequences'].append(sequence)
+            group['collected_at'] = max(group['collected_at'], collected_at)
+        group = user_groups.setdefault(user_id, {'indexes': [], 'sequences': []})
+        group['indexes'].append(index)
+        group['sequences'].append(sequence)
+
+    return counter_groups, user_groups
+
+
+def build_counter_update(key: tuple, group: Dict[str, Any], sequences: List[str],
+                         applied_sequence: Optional[str] = None) -> Dict[str, Any]:
+    """
+    RankingCountersのADD更新パラメータを作成
+
+    加算したレコードの最後のSequenceNumberをAppliedSequenceに記録し、
+    AppliedSequence以前のレコード（再配信分）は加算しない条件を付ける
+
+    Args:
+        key (tuple): (期間キー, UserId)
+        group (Dict): coalesce_stream_recordsのグループ
+        sequences (List[str]): 加算するレコードのSequenceNumber（昇順）
+        applied_sequence (str, optional): 読み取ったAppliedSequence（指定時はその値から変わっていないことを条件にする）
+
+    Returns:
+        Dict: update_itemsに渡すUpdateItemパラメータ
+    """
+    period_key, user_id = key
+    values = {
+        ':delta': len(sequences),
+        ':now': group['collected_at'],
+        ':ttl': group['collected_at'] + RANKING_COUNTER_TTL_DAYS * 86400,
+        ':last': sequences[-1]
+    }
+    if applied_sequence is None:
+        condition = 'attribute_not_exists(AppliedSequence) OR AppliedSequence < :first'
+        values[':first'] = sequences[0]
+    else:
+        condition = 'AppliedSequence = :applied'
+        values[':applied'] = applied_sequence
+
+    return {
+        'Key': {'Period': period_key, 'UserId': user_id},
+        'UpdateExpression': 'ADD StampCount :delta SET UpdatedAt = :now, #ttl = :ttl, AppliedSequence = :last',
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#ttl': 'TTL'},
+        'ExpressionAttributeValues': values,
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }
+
+
+def build_user_update(user_id: str, group: Dict[str, Any], sequences: List[str],
+                      applied_sequence: Optional[str] = None) -> Dict[str, Any]:
+    """
+    UsersのStampCountのADD更新パラメータを作成（未初期化のユーザーは更新しない）
+
+    RankingCountersと同様に、加算したレコードの最後のSequenceNumberをStampCountSequenceに記録する
+
+    Args:
+        user_id (str): ユーザーID
+        group (Dict): coalesce_stream_recordsのグループ
+        sequences (List[str]): 加算するレコードのSequenceNumber（昇順）
+        applied_sequence (str, optional): 読み取ったStampCountSequence
+
+    Returns:
+        Dict: update_itemsに渡すUpdateItemパラメータ
+    """
+    values = {':delta': len(sequences), ':last': sequences[-1]}
+    if applied_sequence is None:
+        condition = ('attribute_exists(StampCount) AND '
+                     '(attribute_not_exists(StampCountSequence) OR StampCountSequence < :first)')
+        values[':first'] = sequences[0]
+    else:
+        condition = 'attribute_exists(StampCount) AND StampCountSequence = :applied'
+        values[':applied'] = applied_sequence
+
+    return {
+        'Key': {'UserId': user_id},
+        'UpdateExpression': 'ADD StampCount :delta SET StampCountSequence = :last',
+        'ConditionExpression': condition,
+        'ExpressionAttributeValues': values,
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }
+
+
+def is_conditional_check_failed(error: Optional[Exception]) -> bool:
+    """ConditionalCheckFailedExceptionかどうかを判定"""
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ConditionalCheckFailedException'
+
+
+def apply_sequenced_updates(table_name: str, groups: Dict[Any, Dict[str, Any]], build_update: Callable,
+                            sequence_attribute: str,
+                            required_attribute: Optional[str] = None) -> tuple[List[Any], List[Optional[Exception]]]:
+    """
+    グループごとの加算を、適用済みのレコードを除いて1回だけ反映する
+
+    まず「記録済みのSequenceNumberがバッチの最初のレコードより前」を条件に加算する。
+    条件を満たさない場合（再配信でバッチの一部が適用済み）は、条件失敗時に返される既存のアイテムから
+    適用済みの位置を読み、それより後のレコードだけを「適用済みの位置が変わっていない」条件で加算し直す。
+    同じユーザーのレコードは同じパーティションキー（UserId）のため、ストリーム上の順序が保証される
+
+    Args:
+        table_name (str): 論理テーブル名
+        groups (Dict): キー -> coalesce_stream_recordsのグループ
+        build_update (Callable): (key, group, sequences, applied_sequence) -> UpdateItemパラメータ
+        sequence_attribute (str): 適用済みのSequenceNumberを記録する属性名
+        required_attribute (str, optional): この属性がないアイテムは更新対象外（条件失敗を成功扱い）
+
+    Returns:
+        tuple: (キーのリスト, キーごとの例外（成功・適用済みはNone）)
+    """
+    keys = list(groups.keys())
+    errors = update_items(table_name, [build_update(key, groups[key], groups[key]['sequences']) for key in keys])
+
+    retry_positions = []
+    retry_updates = []
+    for position, (key, error) in enumerate(zip(keys, errors)):
+        if not is_conditional_check_failed(error):
+            continue
+        old_item = error.response.get('Item') or {}
+        applied_sequence = old_item.get(sequence_attribute, {}).get('S')
+        if required_attribute and required_attribute not in old_item:
+            errors[position] = None
+            continue
+        if applied_sequence is None:
+            continue
+
+        pending = [sequence for sequence in groups[key]['sequences'] if sequence > applied_sequence]
+        errors[position] = None
+        if pending:
+            retry_positions.append(position)
+            retry_updates.append(build_update(key, groups[key], pending, applied_sequence))
+
+    for position, error in zip(retry_positions, update_items(table_name, retry_updates)):
+        errors[position] = error
+
+    return keys, errors
+
+
+def process_stream_batch(event: Dict[str, Any], dry_run: bool = False) -> Dict[str, Any]:
+    """
+    UserStampsのストリームバッチを処理してランキングカウンターを更新
+
+    バッチ内のINSERTをユーザー・期間ごとに合算し、まとめてADDで反映する。
+    各アイテムに最後に加算したレコードのSequenceNumberを記録し、それ以前のレコードは加算しないため、
+    再配信（部分失敗・タイムアウト後の再試行）でも二重計上しない（apply_sequenced_updatesを参照）。
+    一部の更新が失敗した場合は、失敗した更新に含まれる最初のレコードをチェックポイントとして
+    batchItemFailuresで返す（イベントソースマッピングでReportBatchItemFailuresを有効にすること）。
+    チェックポイント以降のレコードは再配信され、成功済みのアイテムでは適用済みとして読み飛ばされる
+
+    Args:
+        event (Dict): DynamoDB Streamsのイベント
+        dry_run (bool): Trueの場合は書き込まずに更新内容を表示（記録したイベントの確認用）
+
+    Returns:
+        Dict: {'batchItemFailures': [{'itemIdentifier': SequenceNumber}]}
+    """
+    records = event.get('Records') or []
+
+    if RANKING_COUNTERS_SOURCE != 'stream' and not dry_run:
+        print(f'RANKING_COUNTERS_SOURCE={RANKING_COUNTERS_SOURCE}: skipping {len(records)} stream records')
+        return {'batchItemFailures': []}
+
+    counter_groups, user_groups = coalesce_stream_records(records)
+
+    print(f'ストリーム処理: records={len(records)}, counter_updates={len(counter_groups)}, '
+          f'user_updates={len(user_groups)}')
+
+    if dry_run:
+        for key, group in counter_groups.items():
+            print(json.dumps({'Key': {'Period': key[0], 'UserId': key[1]}, 'Delta': len(group['sequences'])},
+                             ensure_ascii=False))
+        for user_id, group in user_groups.items():
+            print(json.dumps({'Key': {'UserId': user_id}, 'Delta': len(group['sequences'])}, ensure_ascii=False))
+        return {'batchItemFailures': []}
+
+    counter_keys, counter_errors = apply_sequenced_updates(
+        'RankingCounters', counter_groups, build_counter_update, 'AppliedSequence')
+    user_ids, user_errors = apply_sequenced_updates(
+        'Users', user_groups, build_user_update, 'StampCountSequence', required_attribute='StampCount')
+
+    # 失敗した更新に含まれるレコードの最小位置をチェックポイントとする
+    failed_indexes = []
+    for key, error in zip(counter_keys, counter_errors):
+        if error is not None:
+            print(f'Failed to update ranking counter: key={key}, error={str(error)}')
+            failed_indexes.append(min(counter_groups[key]['indexes']))
+    for user_id, error in zip(user_ids, user_errors):
+        if error is not None:
+            print(f'Failed to update user stamp count: user_id={user_id}, error={str(error)}')
+            failed_indexes.append(min(user_groups[user_id]['indexes']))
+
+    if not failed_indexes:
+        return {'batchItemFailures': []}
+
+    checkpoint = min(failed_indexes)
+    sequence_number = records[checkpoint]['dynamodb']['SequenceNumber']
+    print(f'ストリーム処理の部分失敗: checkpoint={checkpoint}, sequence_number={sequence_number}')
+    return {'batchItemFailures': [{'itemIdentifier': sequence_number}]}
+
+
+if __name__ == '__main__':
+    # 記録したストリームイベントをローカルで確認する
+    # 使用方法: python stream_consumer.py events/userstamps_stream.json [--apply]
+    if len(sys.argv) < 2:
+        print('Usage: python stream_consumer.py <event.json> [--apply]')
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        recorded_event = json.load(f)
+
+    result = process_stream_batch(recorded_event, dry_run='--apply' not in sys.argv[2:])
+    print(json.dumps(result, ensure_ascii=False))
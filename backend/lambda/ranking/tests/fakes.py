@@ -0,0 +1,172 @@
+"""
+ranking関数のテスト用の差し替え
+
+lambda_functionはboto3を使うdynamodb_utils・s3_utilsをインポートするため、読み込み前に
+空のモジュールに差し替える。テーブルアクセスは FakeDynamoDB.patch() でメモリ上のテーブルに向ける
+"""
+
+import os
+import re
+import sys
+import types
+from decimal import Decimal
+from unittest import mock
+
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DYNAMODB_UTILS_NAMES = (
+    'get_table', 'parallel_scan', 'scan_stamp_counts_between', 'query_day_bucket_stamp_counts',
+    'resolve_display_names', 'batch_get_items', 'batch_write_items', 'deserialize_item', 'parallel_query',
+    'update_items', 'count_user_stamps'
+)
+
+KEY_SCHEMAS = {
+    'Rankings': ('Period', 'Rank'),
+    'RankingUsers': ('Period', 'UserId'),
+    'RankingCounters': ('Period', 'UserId'),
+    'Users': ('UserId',),
+    'UserStamps': ('UserId', 'StampId'),
+    'Friends': ('UserId', 'FriendId'),
+    'StampMasters': ('StampId',)
+}
+
+
+def load_lambda_function():
+    """dynamodb_utils・s3_utilsを差し替えてlambda_functionを読み込む"""
+    if 'lambda_function' not in sys.modules:
+        sys.path.insert(0, FUNCTION_DIR)
+        sys.modules['dynamodb_utils'] = types.SimpleNamespace(**{name: None for name in DYNAMODB_UTILS_NAMES})
+        sys.modules['s3_utils'] = types.SimpleNamespace(
+            is_static_publish_enabled=lambda: False, publish_static_board=None)
+    import lambda_function
+    return lambda_function
+
+
+def serialize(value):
+    """Python型を低レベルクライアントの形式に変換（テストで使う型のみ）"""
+    if isinstance(value, bytes):
+        return {'B': value}
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return {'N': str(value)}
+    return {'S': value}
+
+
+def deserialize(value):
+    """低レベルクライアントの形式をPython型に変換（テストで使う型のみ）"""
+    (type_name, raw), = value.items()
+    if type_name == 'N':
+        return int(raw) if raw.lstrip('-').isdigit() else float(raw)
+    return raw
+
+
+class FakeTable:
+    """キーで引けるだけのテーブル（Query は パーティションキーの一致とソートキーの範囲のみ解釈する）"""
+
+    def __init__(self, name, key_names):
+        self.name = name
+        self.key_names = key_names
+        self.items = {}
+
+    def key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(self.key(Key))
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.items[self.key(Item)] = dict(Item)
+        return {}
+
+    def scan(self, **kwargs):
+        return {'Items': [dict(item) for item in self.items.values()]}
+
+    def query(self, **kwargs):
+        return {'Items': self.query_items(kwargs)}
+
+    def query_items(self, query):
+        names = query.get('ExpressionAttributeNames', {})
+        values = query['ExpressionAttributeValues']
+        condition = query['KeyConditionExpression']
+
+        partition_name, partition_value = re.match(r'(\S+) = (:\w+)', condition).groups()
+        partition_name = names.get(partition_name, partition_name)
+        items = [item for item in self.items.values() if item.get(partition_name) == values[partition_value]]
+
+        if len(self.key_names) > 1:
+            sort_name = self.key_names[1]
+            between = re.search(r'AND \S+ BETWEEN (:\w+) AND (:\w+)', condition)
+            at_least = re.search(r'AND \S+ >= (:\w+)', condition)
+            if between:
+                low, high = values[between.group(1)], values[between.group(2)]
+                items = [item for item in items if low <= item[sort_name] <= high]
+            elif at_least:
+                items = [item for item in items if item[sort_name] >= values[at_least.group(1)]]
+            items.sort(key=lambda item: item[sort_name], reverse=not query.get('ScanIndexForward', True))
+
+        if query.get('Limit'):
+            items = items[:query['Limit']]
+        return [dict(item) for item in items]
+
+
+class FakeDynamoDB:
+    """dynamodb_utilsのテーブルアクセス関数をメモリ上のテーブルで置き換える"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def get_table(self, table_name):
+        if table_name not in self.tables:
+            self.tables[table_name] = FakeTable(table_name, KEY_SCHEMAS[table_name])
+        return self.tables[table_name]
+
+    def items(self, table_name):
+        return list(self.get_table(table_name).items.values())
+
+    def batch_write_items(self, table_name, items):
+        table = self.get_table(table_name)
+        for item in items:
+            table.put_item(Item=item)
+
+    def parallel_query(self, table_name, queries):
+        table = self.get_table(table_name)
+        return [table.query_items(query) for query in queries]
+
+    def batch_get_items(self, table_name, keys, projection_expression=None, expression_attribute_names=None):
+        table = self.get_table(table_name)
+        found = []
+        for key in keys:
+            item = table.items.get(tuple(deserialize(key[name]) for name in table.key_names))
+            if item:
+                found.append({name: serialize(value) for name, value in item.items()})
+        return found
+
+    def update_items(self, table_name, updates):
+        """SET の代入だけを解釈する（成功はNone、updatesと同じ順序）"""
+        table = self.get_table(table_name)
+        for update in updates:
+            names = update.get('ExpressionAttributeNames', {})
+            values = update.get('ExpressionAttributeValues', {})
+            item = table.items.setdefault(table.key(update['Key']), dict(update['Key']))
+            assignments = update['UpdateExpression'].split('SET ', 1)[1]
+            for assignment in assignments.split(','):
+                name, value = [part.strip() for part in assignment.split('=')]
+                item[names.get(name, name)] = values[value]
+        return [None] * len(updates)
+
+    def resolve_display_names(self, user_ids):
+        users = self.get_table('Users').items
+        return {user_id: users[(user_id,)]['DisplayName'] for user_id in user_ids
+                if (user_id,) in users and 'DisplayName' in users[(user_id,)]}
+
+    def patch(self, test_case, module):
+        """test_caseの終了時に元に戻るよう、moduleのテーブルアクセス関数を差し替える"""
+        for name in ('get_table', 'batch_write_items', 'parallel_query', 'batch_get_items', 'update_items',
+                     'resolve_display_names'):
+            patcher = mock.patch.object(module, name, getattr(self, name))
+            patcher.start()
+            test_case.addCleanup(patcher.stop)
+        patcher = mock.patch.object(module, 'deserialize_item',
+                                    lambda item: {name: deserialize(value) for name, value in item.items()})
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
@@ -0,0 +1,129 @@
+import json
+import unittest
+from unittest import mock
+
+from fakes import FakeDynamoDB, load_lambda_function
+
+lambda_function = load_lambda_function()
+
+# 2025-11-12（水）の正午（UTC）、2025-W46
+WEDNESDAY_NOON = 1762948800
+# 2025-11-03（月）の正午（UTC）、2025-W45（月間ランキングのみに含まれる）
+PREVIOUS_MONDAY_NOON = 1762171200
+
+
+def user_stamp(user_id, stamp_id, collected_at, method):
+    """parallel_scanが渡す低レベルクライアント形式のUserStampsアイテム"""
+    return {'UserId': {'S': user_id}, 'StampId': {'S': stamp_id},
+            'CollectedAt': {'N': str(collected_at)}, 'Method': {'S': method}}
+
+
+class CalculateAllRankingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDynamoDB()
+        self.db.patch(self, lambda_function)
+        self.scans = []
+        # 2セグメントに分かれたスキャン結果
+        self.segments = [
+            [user_stamp('U0001', 'stamp_001', WEDNESDAY_NOON, 'GPS'),
+             user_stamp('U0001', 'stamp_002', WEDNESDAY_NOON, 'IMAGE'),
+             user_stamp('U0002', 'stamp_001', PREVIOUS_MONDAY_NOON, 'GPS')],
+            [user_stamp('U0002', 'stamp_003', WEDNESDAY_NOON, 'GPS'),
+             user_stamp('U0003', 'stamp_002', WEDNESDAY_NOON, 'IMAGE')]
+        ]
+        patches = [
+            mock.patch.object(lambda_function, 'parallel_scan', self.parallel_scan),
+            mock.patch.object(lambda_function, 'get_current_week_period', lambda: '2025-W46'),
+            mock.patch.object(lambda_function, 'get_current_month_period', lambda: '2025-11')
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        stamp_masters = self.db.get_table('StampMasters')
+        stamp_masters.put_item(Item={'StampId': '#CATALOG', 'Version': 3})
+        stamp_masters.put_item(Item={'StampId': 'stamp_001', 'Type': 'gps'})
+        stamp_masters.put_item(Item={'StampId': 'stamp_002', 'Type': 'IMAGE'})
+
+    def parallel_scan(self, table_name, fold_page, init, **scan_kwargs):
+        self.scans.append((table_name, scan_kwargs))
+        results = []
+        for items in self.segments:
+            accumulator = init()
+            fold_page(accumulator, items)
+            results.append(accumulator)
+        return results
+
+    def calculate(self, boards):
+        with mock.patch.object(lambda_function, 'RANKING_BOARDS', boards):
+            response = lambda_function.lambda_handler({
+                'httpMethod': 'POST',
+                'path': '/ranking/calculate',
+                'queryStringParameters': {'type': 'all'}
+            }, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def published_rows(self, period_key):
+        pointer = self.db.get_table('Rankings').get_item(Key={'Period': period_key, 'Rank': 0})['Item']
+        rows = [item for item in self.db.items('Rankings')
+                if item['Period'] == pointer['SnapshotPeriod'] and item['Rank'] > 0]
+        return [(row['UserId'], row['StampCount']) for row in sorted(rows, key=lambda row: row['Rank'])]
+
+    def test_all_boards_from_one_scan(self):
+        status, body = self.calculate('weekly,monthly,weekly:method,weekly:type')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(self.scans), 1)
+        self.assertEqual(sorted(board['board'] for board in body['boards']), [
+            'monthly-2025-11', 'weekly-2025-W46', 'weekly-method-GPS-2025-W46', 'weekly-method-IMAGE-2025-W46',
+            'weekly-type-GPS-2025-W46', 'weekly-type-IMAGE-2025-W46', 'weekly-type-UNKNOWN-2025-W46'])
+
+        self.assertEqual(self.published_rows('weekly-2025-W46'), [('U0001', 2), ('U0002', 1), ('U0003', 1)])
+        self.assertEqual(dict(self.published_rows('monthly-2025-11')), {'U0001': 2, 'U0002': 2, 'U0003': 1})
+        self.assertEqual(self.published_rows('weekly-method-IMAGE-2025-W46'), [('U0001', 1), ('U0003', 1)])
+        # 先週分（W45）のGPSスタンプは週間ランキングに含まない
+        self.assertEqual(self.published_rows('weekly-method-GPS-2025-W46'), [('U0001', 1), ('U0002', 1)])
+        # StampMastersに種別がないスタンプは UNKNOWN
+        self.assertEqual(self.published_rows('weekly-type-UNKNOWN-2025-W46'), [('U0002', 1)])
+
+        # 両方の期間をまとめて読む範囲でスキャンする
+        _, scan_kwargs = self.scans[0]
+        month_start, month_end = lambda_function.get_period_range('monthly', '2025-11')
+        self.assertEqual(scan_kwargs['ExpressionAttributeValues'], {
+            ':start': {'N': str(month_start)}, ':end': {'N': str(month_end - 1)}})
+
+    def test_dimension_boards_keep_top_k(self):
+        with mock.patch.object(lambda_function, 'DIMENSION_BOARD_TOP_K', 1):
+            status, body = self.calculate('weekly,weekly:type')
+
+        counts = {board['board']: board['rankings_count'] for board in body['boards']}
+        self.assertEqual(counts['weekly-type-IMAGE-2025-W46'], 1)
+        # 期間全体のランキングは全件を保存する
+        self.assertEqual(counts['weekly-2025-W46'], 3)
+
+    def test_empty_period_board_is_still_published(self):
+        self.segments = []
+
+        status, body = self.calculate('weekly,weekly:method')
+
+        self.assertEqual(status, 200)
+        self.assertEqual([(board['board'], board['rankings_count']) for board in body['boards']],
+                         [('weekly-2025-W46', 0)])
+
+    def test_invalid_board_spec(self):
+        for boards in ('daily', 'weekly:region', 'weekly,monthly:Method'):
+            with self.assertRaises(ValueError):
+                lambda_function.parse_board_specs(boards)
+
+        status, body = self.calculate('weekly,yearly')
+
+        self.assertEqual(status, 500)
+        self.assertEqual(len(self.scans), 0)
+
+    def test_load_stamp_types_skips_catalog_item(self):
+        self.assertEqual(lambda_function.load_stamp_types(), {'stamp_001': 'GPS', 'stamp_002': 'IMAGE'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import unittest
+from unittest import mock
+
+from fakes import FakeDynamoDB, load_lambda_function
+
+lambda_function = load_lambda_function()
+
+PERIOD = '2025-W46'
+PERIOD_KEY = f'weekly-{PERIOD}'
+
+
+class CalculateFromCountersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDynamoDB()
+        self.db.patch(self, lambda_function)
+        lambda_function._pointer_cache.clear()
+        lambda_function._response_cache.clear()
+
+        counters = self.db.get_table('RankingCounters')
+        for period_key, user_id, stamp_count in (
+                (PERIOD_KEY, 'U0001', 3), (PERIOD_KEY, 'U0002', 5), (PERIOD_KEY, 'U0003', 0),
+                ('weekly-2025-W45', 'U0004', 9), ('daily-2025-11-12', 'U0001', 3)):
+            counters.put_item(Item={'Period': period_key, 'UserId': user_id, 'StampCount': stamp_count})
+        users = self.db.get_table('Users')
+        users.put_item(Item={'UserId': 'U0001', 'DisplayName': 'ユーザー1'})
+        users.put_item(Item={'UserId': 'U0002', 'DisplayName': 'ユーザー2'})
+
+    def calculate(self, **query_params):
+        response = lambda_function.lambda_handler({
+            'httpMethod': 'POST',
+            'path': '/ranking/calculate',
+            'queryStringParameters': dict({'type': 'weekly', 'period': PERIOD}, **query_params)
+        }, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def published_rows(self):
+        pointer = self.db.get_table('Rankings').get_item(Key={'Period': PERIOD_KEY, 'Rank': 0})['Item']
+        rows = [item for item in self.db.items('Rankings')
+                if item['Period'] == pointer['SnapshotPeriod'] and item['Rank'] > 0]
+        return [(row['Rank'], row['UserId'], row['StampCount'], row['DisplayName'])
+                for row in sorted(rows, key=lambda row: row['Rank'])]
+
+    def test_counters_is_the_default_source(self):
+        self.assertEqual(lambda_function.RANKING_CALCULATE_SOURCE, 'counters')
+
+        with mock.patch.object(lambda_function, 'scan_period_stamp_counts') as scan, \
+                mock.patch.object(lambda_function, 'index_period_stamp_counts') as index:
+            status, body = self.calculate()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['rankings_count'], 2)
+        scan.assert_not_called()
+        index.assert_not_called()
+
+    def test_rankings_are_built_from_period_counters(self):
+        self.calculate()
+
+        # 他の期間・日別バケットのカウンターと、0件のユーザーは含まない
+        self.assertEqual(self.published_rows(), [(1, 'U0002', 5, 'ユーザー2'), (2, 'U0001', 3, 'ユーザー1')])
+
+    def test_unknown_source_is_rejected(self):
+        status, body = self.calculate(source='dynamo')
+
+        self.assertEqual((status, body['message']), (400, 'source must be one of counters, index, scan'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import unittest
+from unittest import mock
+
+from fakes import FakeDynamoDB, load_lambda_function
+
+lambda_function = load_lambda_function()
+
+PERIOD = '2025-W46'
+PERIOD_KEY = f'weekly-{PERIOD}'
+USER_IDS = ['U1', 'U2', 'U3', 'U4', 'U5', 'U6', 'U7']
+
+
+class PackedStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDynamoDB()
+        self.db.patch(self, lambda_function)
+        for cache in (lambda_function._pointer_cache, lambda_function._response_cache,
+                      lambda_function._packed_cache):
+            cache.clear()
+        self.batch_gets = []
+        batch_get_items = self.db.batch_get_items
+
+        def counting_batch_get_items(table_name, keys, **kwargs):
+            self.batch_gets.append([key['Rank']['N'] for key in keys])
+            return batch_get_items(table_name, keys, **kwargs)
+
+        # 7件を3件ずつのチャンク（3個）と、3件ずつの目安の索引（3バケット）に分ける
+        patches = [
+            mock.patch.object(lambda_function, 'RANKING_STORAGE_MODE', 'packed'),
+            mock.patch.object(lambda_function, 'PACKED_CHUNK_SIZE', 3),
+            mock.patch.object(lambda_function, 'PACKED_INDEX_BUCKET_SIZE', 3),
+            mock.patch.object(lambda_function, 'batch_get_items', counting_batch_get_items)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        rankings = [
+            {'Rank': rank, 'UserId': user_id, 'StampCount': 10 - rank, 'DisplayName': f'ユーザー{rank}'}
+            for rank, user_id in enumerate(USER_IDS, start=1)
+        ]
+        self.version = lambda_function.publish_ranking_snapshot(PERIOD_KEY, rankings, 0)
+
+    def get(self, path, **query_params):
+        response = lambda_function.lambda_handler(
+            {'httpMethod': 'GET', 'path': path, 'queryStringParameters': query_params}, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_snapshot_is_written_as_chunks_and_index(self):
+        snapshot_period = f'{PERIOD_KEY}#{self.version}'
+        partitions = sorted((item['Period'], item['Rank']) for item in self.db.items('Rankings'))
+
+        self.assertEqual(partitions, [
+            (PERIOD_KEY, 0), (snapshot_period, 0),
+            (f'{snapshot_period}#chunk', 0), (f'{snapshot_period}#chunk', 1), (f'{snapshot_period}#chunk', 2),
+            (f'{snapshot_period}#index', 0), (f'{snapshot_period}#index', 1), (f'{snapshot_period}#index', 2)
+        ])
+        # 行ごとのアイテムは書き込まない
+        self.assertEqual(self.db.items('RankingUsers'), [])
+
+        pointer = self.db.get_table('Rankings').get_item(Key={'Period': PERIOD_KEY, 'Rank': 0})['Item']
+        self.assertEqual((pointer['Storage'], pointer['ChunkSize'], pointer['ChunkCount'], pointer['IndexBuckets'],
+                          pointer['RankingsCount']), ('packed', 3, 3, 3, 7))
+
+    def test_pages_across_chunks(self):
+        rows = []
+        cursor = None
+        while True:
+            params = {'period': PERIOD, 'limit': '2'}
+            if cursor:
+                params['cursor'] = cursor
+            status, body = self.get('/ranking/weekly', **params)
+            self.assertEqual(status, 200)
+            rows.extend((row['rank'], row['user_id'], row['stamp_count'], row['display_name'])
+                        for row in body['rankings'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(rows, [(rank, user_id, 10 - rank, f'ユーザー{rank}')
+                                for rank, user_id in enumerate(USER_IDS, start=1)])
+
+    def test_chunks_are_cached(self):
+        snapshot = lambda_function.get_snapshot(PERIOD_KEY)
+
+        self.assertEqual([row['UserId'] for row in lambda_function.get_packed_rows(snapshot, [3, 4])], ['U3', 'U4'])
+        self.assertEqual([row['UserId'] for row in lambda_function.get_packed_rows(snapshot, [4, 7])], ['U4', 'U7'])
+        # 2回目は未取得のチャンク（7位を含むチャンク2）だけを読む
+        self.assertEqual(self.batch_gets, [['0', '1'], ['2']])
+        # 範囲外の順位は返さない
+        self.assertEqual(lambda_function.get_packed_rows(snapshot, [8, 100]), [])
+
+    def test_my_ranking_uses_index(self):
+        status, body = self.get('/ranking/me', user_id='U5', period=PERIOD, range='1')
+
+        self.assertEqual(status, 200)
+        self.assertEqual((body['me']['rank'], body['me']['user_id']), (5, 'U5'))
+        self.assertEqual([(row['rank'], row['is_self']) for row in body['neighbors']],
+                         [(4, False), (5, True), (6, False)])
+
+        status, body = self.get('/ranking/me', user_id='U9', period=PERIOD, range='1')
+        self.assertEqual((status, body['me'], body['neighbors']), (200, None, []))
+
+    def test_friends_rankings_use_index(self):
+        friends = self.db.get_table('Friends')
+        friends.put_item(Item={'UserId': 'U6', 'FriendId': 'U2', 'Status': 'active'})
+        friends.put_item(Item={'UserId': 'U6', 'FriendId': 'U7', 'Status': 'active'})
+        friends.put_item(Item={'UserId': 'U6', 'FriendId': 'U3', 'Status': 'pending'})
+        friends.put_item(Item={'UserId': 'U6', 'FriendId': 'U9', 'Status': 'active'})
+
+        status, body = self.get('/ranking/friends/weekly', user_id='U6', period=PERIOD)
+
+        self.assertEqual(status, 200)
+        # ランキング外の友達（U9）と承認前の友達（U3）は含まない
+        self.assertEqual([(row['rank'], row['user_id'], row['is_self']) for row in body['rankings']],
+                         [(1, 'U2', False), (2, 'U6', True), (3, 'U7', False)])
+
+    def test_pack_round_trip(self):
+        entries = [['U1', 3, '駅前 太郎'], ['U2', 1, 'Unknown']]
+
+        self.assertEqual(lambda_function.unpack_entries(lambda_function.pack_entries(entries)), entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import base64
+import json
+import time
+import unittest
+from unittest import mock
+
+from fakes import FakeDynamoDB, load_lambda_function
+
+lambda_function = load_lambda_function()
+
+PERIOD = '2025-W46'
+PERIOD_KEY = f'weekly-{PERIOD}'
+
+
+def raw_cursor(state):
+    """encode_cursor()を通さずにカーソルを作る（改ざんの再現用）"""
+    raw = state if isinstance(state, bytes) else json.dumps(state).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+class PaginationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDynamoDB()
+        self.db.patch(self, lambda_function)
+        for cache in (lambda_function._pointer_cache, lambda_function._response_cache,
+                      lambda_function._packed_cache, lambda_function._window_counts_cache):
+            cache.clear()
+
+    def publish(self, counts):
+        rankings = [
+            {'Rank': rank, 'UserId': user_id, 'StampCount': count, 'DisplayName': user_id}
+            for rank, (user_id, count) in enumerate(counts, start=1)
+        ]
+        # バージョンはミリ秒単位のため、連続して公開する場合に重ならないようにする
+        time.sleep(0.002)
+        return lambda_function.publish_ranking_snapshot(PERIOD_KEY, rankings, 0)
+
+    def get(self, path, **query_params):
+        response = lambda_function.lambda_handler(
+            {'httpMethod': 'GET', 'path': path, 'queryStringParameters': query_params}, None)
+        return response['statusCode'], json.loads(response['body'])
+
+
+class CursorTest(PaginationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.publish([('U1', 5), ('U2', 4), ('U3', 3), ('U4', 2), ('U5', 1)])
+
+    def test_pages_follow_cursor(self):
+        user_ids = []
+        cursor = None
+        while True:
+            params = {'period': PERIOD, 'limit': '2'}
+            if cursor:
+                params['cursor'] = cursor
+            status, body = self.get('/ranking/weekly', **params)
+            self.assertEqual(status, 200)
+            user_ids.extend(row['user_id'] for row in body['rankings'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(user_ids, ['U1', 'U2', 'U3', 'U4', 'U5'])
+
+    def test_cursor_stays_on_its_snapshot_after_recalculation(self):
+        _, first_page = self.get('/ranking/weekly', period=PERIOD, limit='2')
+        self.publish([('U5', 9), ('U4', 8), ('U3', 7), ('U2', 6), ('U1', 5)])
+
+        status, body = self.get('/ranking/weekly', period=PERIOD, limit='2', cursor=first_page['next_cursor'])
+
+        self.assertEqual(status, 200)
+        self.assertEqual([row['user_id'] for row in body['rankings']], ['U3', 'U4'])
+        # 新しいページ送りは新しいスナップショットから始まる
+        _, body = self.get('/ranking/weekly', period=PERIOD, limit='2')
+        self.assertEqual([row['user_id'] for row in body['rankings']], ['U5', 'U4'])
+
+    def test_stale_version_is_rejected(self):
+        # TTLで削除済み（または存在しない）バージョン
+        status, body = self.get('/ranking/weekly', period=PERIOD,
+                                cursor=raw_cursor({'rank': 3, 'version': 'v1'}))
+        self.assertEqual((status, body['message']), (400, 'Cursor expired'))
+
+        # バージョンのないカーソル（旧形式のランキングで作成）は、スナップショット公開後は使えない
+        status, body = self.get('/ranking/weekly', period=PERIOD, cursor=raw_cursor({'rank': 3}))
+        self.assertEqual((status, body['message']), (400, 'Cursor expired'))
+
+    def test_version_of_another_period_is_rejected(self):
+        _, body = self.get('/ranking/weekly', period=PERIOD, limit='2')
+        cursor = body['next_cursor']
+
+        status, body = self.get('/ranking/weekly', period='2025-W47', cursor=cursor)
+
+        self.assertEqual((status, body['message']), (400, 'Cursor expired'))
+
+    def test_tampered_cursors_are_rejected(self):
+        version = self.db.get_table('Rankings').get_item(
+            Key={'Period': PERIOD_KEY, 'Rank': 0})['Item']['Version']
+        tampered = [
+            'not a cursor!',
+            raw_cursor(b'\xff\xfe'),
+            raw_cursor([1, 2]),
+            raw_cursor({'rank': 0}),
+            raw_cursor({'rank': '3'}),
+            raw_cursor({'rank': True}),
+            raw_cursor({'rank': 2.5}),
+            # 別のパーティション（packed形式のチャンクなど）を指すバージョン
+            raw_cursor({'rank': 1, 'version': f'{version}#chunk'}),
+            raw_cursor({'rank': 1, 'version': f'{version}\n'}),
+            raw_cursor({'rank': 1, 'version': 123})
+        ]
+        for path, params in (('/ranking/weekly', {'period': PERIOD}),
+                             ('/ranking/friends/weekly', {'user_id': 'U1'}),
+                             ('/ranking', {'window': 'rolling-7d'})):
+            for cursor in tampered:
+                status, body = self.get(path, cursor=cursor, **params)
+                self.assertEqual((status, body['message']), (400, 'Invalid cursor'), (path, cursor))
+
+    def test_invalid_limit_is_rejected(self):
+        status, body = self.get('/ranking/weekly', period=PERIOD, limit='ten')
+
+        self.assertEqual((status, body['message']), (400, 'limit must be an integer'))
+
+
+class UnpaginatedRouteTest(PaginationTestCase):
+
+    def test_routes_without_pages_ignore_limit_and_cursor(self):
+        handlers = {
+            'get_my_ranking': ('GET', '/ranking/me', {'user_id': 'U1'}),
+            'compare_users': ('GET', '/ranking/compare', {'user_id': 'U1', 'friend_id': 'U2'}),
+            'calculate_rankings': ('POST', '/ranking/calculate', {'type': 'weekly'})
+        }
+        for name, (method, path, params) in handlers.items():
+            with mock.patch.object(lambda_function, name, return_value={'statusCode': 200, 'body': '{}'}) as handler:
+                response = lambda_function.lambda_handler({
+                    'httpMethod': method,
+                    'path': path,
+                    'queryStringParameters': dict(params, limit='ten', cursor='not a cursor!')
+                }, None)
+
+            self.assertEqual(response['statusCode'], 200, path)
+            handler.assert_called_once()
+
+    def test_is_paginated_route(self):
+        for path in ('/ranking/weekly', '/ranking/monthly', '/ranking/friends/weekly',
+                     '/ranking/friends/monthly', '/ranking', '/prod/ranking/'):
+            self.assertTrue(lambda_function.is_paginated_route(path), path)
+        for path in ('/ranking/me', '/ranking/compare', '/ranking/calculate'):
+            self.assertFalse(lambda_function.is_paginated_route(path), path)
+
+
+if __name__ == '__main__':
+    unittest.main()
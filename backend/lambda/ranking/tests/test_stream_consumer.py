@@ -0,0 +1,143 @@
+import json
+import os
+import sys
+import types
+import unittest
+
+# stream_consumerはdynamodb_utils（boto3）をインポートするため、update_itemsだけを持つモジュールに差し替える
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+sys.modules['dynamodb_utils'] = types.SimpleNamespace(update_items=None)
+
+import stream_consumer  # noqa: E402
+
+EVENT_PATH = os.path.join(FUNCTION_DIR, 'events', 'userstamps_stream.json')
+
+
+class ConditionalCheckFailed(Exception):
+    """botocoreのClientError（ConditionalCheckFailedException）と同じ形のresponseを持つ例外"""
+
+    def __init__(self, item):
+        super().__init__('The conditional request failed')
+        self.response = {'Error': {'Code': 'ConditionalCheckFailedException'}, 'Item': item}
+
+
+class FakeTables:
+    """
+    update_itemsの代わりに、stream_consumerの条件式を評価してメモリ上のアイテムを更新する
+
+    fail_keys に含まれるKeyの更新は1回だけ失敗させる（部分失敗の再現用）
+    """
+
+    def __init__(self, users=None):
+        self.items = {}
+        self.calls = []
+        self.fail_keys = set()
+        for user_id, stamp_count in (users or {}).items():
+            self.items[('Users', user_id)] = {'UserId': user_id, 'StampCount': stamp_count}
+
+    def get(self, table_name, *key):
+        return self.items.get((table_name,) + key, {})
+
+    def update_items(self, table_name, updates):
+        return [self.update_item(table_name, update) for update in updates]
+
+    def update_item(self, table_name, update):
+        key = (table_name,) + tuple(update['Key'].values())
+        values = update['ExpressionAttributeValues']
+        self.calls.append((table_name, tuple(update['Key'].values()), values[':delta']))
+
+        if key in self.fail_keys:
+            self.fail_keys.discard(key)
+            return Exception('ProvisionedThroughputExceededException')
+
+        item = self.items.get(key, {})
+        attribute = 'AppliedSequence' if table_name == 'RankingCounters' else 'StampCountSequence'
+        applied = item.get(attribute)
+        if table_name == 'Users' and 'StampCount' not in item:
+            ok = False
+        elif ':applied' in values:
+            ok = applied == values[':applied']
+        else:
+            ok = applied is None or applied < values[':first']
+        if not ok:
+            return ConditionalCheckFailed({name: {'S': value} if isinstance(value, str) else {'N': str(value)}
+                                           for name, value in item.items()})
+
+        item = dict(item, **update['Key'])
+        item['StampCount'] = item.get('StampCount', 0) + values[':delta']
+        item[attribute] = values[':last']
+        self.items[key] = item
+        return None
+
+
+class ProcessStreamBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(EVENT_PATH, 'r', encoding='utf-8') as f:
+            self.event = json.load(f)
+        self.tables = FakeTables(users={'U0001': 10})
+        stream_consumer.update_items = self.tables.update_items
+        stream_consumer.RANKING_COUNTERS_SOURCE = 'stream'
+
+    def counter(self, period_key, user_id):
+        return self.tables.get('RankingCounters', period_key, user_id).get('StampCount', 0)
+
+    def test_replay_applies_inserts_once(self):
+        self.assertEqual(stream_consumer.process_stream_batch(self.event), {'batchItemFailures': []})
+
+        # U0001は3件、U0002は1件（MODIFYは数えない）
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0001'), 3)
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0002'), 1)
+        self.assertEqual(self.counter('daily-2025-11-10', 'U0001'), 3)
+        self.assertEqual(self.tables.get('Users', 'U0001')['StampCount'], 13)
+        # StampCountが未初期化のユーザーは作らない
+        self.assertEqual(self.tables.get('Users', 'U0002'), {})
+
+        # タイムアウト後の再配信では加算しない
+        self.assertEqual(stream_consumer.process_stream_batch(self.event), {'batchItemFailures': []})
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0001'), 3)
+        self.assertEqual(self.counter('monthly-2025-11', 'U0002'), 1)
+        self.assertEqual(self.tables.get('Users', 'U0001')['StampCount'], 13)
+
+    def test_partial_failure_checkpoint_and_redelivery(self):
+        # U0002の週間カウンターだけ失敗させる
+        self.tables.fail_keys.add(('RankingCounters', 'weekly-2025-W46', 'U0002'))
+
+        result = stream_consumer.process_stream_batch(self.event)
+
+        # 失敗した更新に含まれる最初のレコード（2件目）がチェックポイント
+        self.assertEqual(result, {'batchItemFailures': [{'itemIdentifier': '100000000000000000002'}]})
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0002'), 0)
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0001'), 3)
+
+        # チェックポイント以降のレコードが再配信される
+        self.tables.calls.clear()
+        redelivered = {'Records': self.event['Records'][1:]}
+        self.assertEqual(stream_consumer.process_stream_batch(redelivered), {'batchItemFailures': []})
+
+        # 失敗したカウンターだけが加算され、適用済みのカウンターには何も加算されない
+        applied = [(table, key, delta) for table, key, delta in self.tables.calls
+                   if key == ('weekly-2025-W46', 'U0002')]
+        self.assertEqual(applied, [('RankingCounters', ('weekly-2025-W46', 'U0002'), 1)])
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0001'), 3)
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0002'), 1)
+        self.assertEqual(self.counter('daily-2025-11-10', 'U0002'), 1)
+        self.assertEqual(self.tables.get('Users', 'U0001')['StampCount'], 13)
+
+    def test_redelivery_applies_only_records_after_applied_sequence(self):
+        # 1件目だけが適用済みの状態で、バッチ全体が再配信される
+        stream_consumer.process_stream_batch({'Records': self.event['Records'][:1]})
+        self.tables.calls.clear()
+
+        self.assertEqual(stream_consumer.process_stream_batch(self.event), {'batchItemFailures': []})
+
+        # 最初の条件付き加算（3件）は失敗し、未適用の2件だけを加算し直す
+        deltas = [delta for table, key, delta in self.tables.calls if key == ('weekly-2025-W46', 'U0001')]
+        self.assertEqual(deltas, [3, 2])
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0001'), 3)
+        self.assertEqual(self.tables.get('Users', 'U0001')['StampCount'], 13)
+
+
+if __name__ == '__main__':
+    unittest.main()
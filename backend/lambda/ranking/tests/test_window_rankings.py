@@ -0,0 +1,122 @@
+import json
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+
+from fakes import FakeDynamoDB, load_lambda_function
+
+lambda_function = load_lambda_function()
+
+
+class WindowRankingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDynamoDB()
+        self.db.patch(self, lambda_function)
+        lambda_function._response_cache.clear()
+        lambda_function._window_counts_cache.clear()
+
+        counters = self.db.get_table('RankingCounters')
+        for period_key, user_id, stamp_count in (
+                ('daily-2025-11-10', 'U0001', 1), ('daily-2025-11-11', 'U0001', 2),
+                ('daily-2025-11-11', 'U0002', 2), ('daily-2025-11-12', 'U0003', 1),
+                ('daily-2025-11-13', 'U0003', 9), ('weekly-2025-W46', 'U0003', 10)):
+            counters.put_item(Item={'Period': period_key, 'UserId': user_id, 'StampCount': stamp_count})
+        self.db.get_table('Users').put_item(Item={'UserId': 'U0001', 'DisplayName': 'ユーザー1'})
+
+    def get(self, **query_params):
+        response = lambda_function.lambda_handler(
+            {'httpMethod': 'GET', 'path': '/ranking', 'queryStringParameters': query_params}, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_event_window_sums_daily_buckets(self):
+        status, body = self.get(window='2025-11-10..2025-11-12')
+
+        self.assertEqual(status, 200)
+        self.assertEqual((body['start'], body['end']), ('2025-11-10', '2025-11-12'))
+        # 期間外の日別バケット・週間カウンターは合算しない
+        self.assertEqual([(row['rank'], row['user_id'], row['stamp_count']) for row in body['rankings']],
+                         [(1, 'U0001', 3), (2, 'U0002', 2), (3, 'U0003', 1)])
+        self.assertEqual(body['rankings'][0]['display_name'], 'ユーザー1')
+        self.assertEqual(body['rankings'][1]['display_name'], 'Unknown')
+
+    def test_window_pages(self):
+        status, body = self.get(window='2025-11-10..2025-11-12', limit='2')
+        self.assertEqual([row['user_id'] for row in body['rankings']], ['U0001', 'U0002'])
+
+        status, body = self.get(window='2025-11-10..2025-11-12', limit='2', cursor=body['next_cursor'])
+        self.assertEqual(status, 200)
+        self.assertEqual([(row['rank'], row['user_id']) for row in body['rankings']], [(3, 'U0003')])
+        self.assertIsNone(body['next_cursor'])
+
+    def test_invalid_windows(self):
+        for window in ('weekly', 'rolling-0d', 'rolling-xd', '2025-11-12..2025-11-10', '2025-11-10..',
+                       f'rolling-{lambda_function.WINDOW_MAX_DAYS + 1}d'):
+            status, body = self.get(window=window)
+            self.assertEqual(status, 400, window)
+
+        status, body = self.get()
+        self.assertEqual((status, body['message']), (400, 'window is required'))
+
+    def test_parse_window(self):
+        self.assertEqual(lambda_function.parse_window('2025-11-30..2025-12-01'), ['2025-11-30', '2025-12-01'])
+
+        today = datetime.now()
+        days = lambda_function.parse_window('rolling-7d')
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[0], (today - timedelta(days=6)).strftime('%Y-%m-%d'))
+        self.assertEqual(days[-1], today.strftime('%Y-%m-%d'))
+        self.assertEqual(lambda_function.parse_window('daily'), [today.strftime('%Y-%m-%d')])
+
+
+class RebuildPeriodCountersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDynamoDB()
+        self.db.patch(self, lambda_function)
+
+    def counter(self, period_key, user_id):
+        item = self.db.get_table('RankingCounters').items.get((period_key, user_id))
+        return item['StampCount'] if item else None
+
+    def test_monthly_counter_keys_include_only_full_weeks(self):
+        days = [f'2025-11-{day:02d}' for day in range(1, 31)]
+
+        counter_days = lambda_function.get_counter_period_keys('monthly', '2025-11', days)
+
+        # 11/1〜2 は W44（10月にまたがる）のため上書きしない
+        self.assertEqual(sorted(key for key in counter_days if key.startswith('weekly-')),
+                         ['weekly-2025-W45', 'weekly-2025-W46', 'weekly-2025-W47', 'weekly-2025-W48'])
+        self.assertEqual(counter_days['monthly-2025-11'], days)
+        self.assertEqual(counter_days['daily-2025-11-05'], ['2025-11-05'])
+
+    def test_rebuild_overwrites_week_and_day_counters(self):
+        counters = self.db.get_table('RankingCounters')
+        counters.put_item(Item={'Period': 'weekly-2025-W46', 'UserId': 'U0001', 'StampCount': 7})
+        counters.put_item(Item={'Period': 'weekly-2025-W46', 'UserId': 'U0003', 'StampCount': 4})
+        counters.put_item(Item={'Period': 'daily-2025-11-12', 'UserId': 'U0003', 'StampCount': 4})
+
+        updated = lambda_function.rebuild_period_counters('weekly', '2025-W46', Counter({
+            ('U0001', '2025-11-12'): 2,
+            ('U0001', '2025-11-13'): 1,
+            ('U0002', '2025-11-13'): 1
+        }))
+
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0001'), 3)
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0002'), 1)
+        # カウンターはあるが再集計でスタンプがないユーザーは0
+        self.assertEqual(self.counter('weekly-2025-W46', 'U0003'), 0)
+        self.assertEqual(self.counter('daily-2025-11-12', 'U0001'), 2)
+        self.assertEqual(self.counter('daily-2025-11-12', 'U0003'), 0)
+        self.assertEqual(self.counter('daily-2025-11-13', 'U0002'), 1)
+        # 週間ランキングの再集計では月間カウンターは上書きしない
+        self.assertIsNone(self.counter('monthly-2025-11', 'U0001'))
+        self.assertEqual(updated, 7)
+
+        _, period_end = lambda_function.get_period_range('weekly', '2025-W46')
+        ttl = self.db.get_table('RankingCounters').items[('daily-2025-11-13', 'U0001')]['TTL']
+        self.assertEqual(ttl, period_end + lambda_function.RANKING_COUNTER_TTL_DAYS * 86400)
+
+
+if __name__ == '__main__':
+    unittest.main()
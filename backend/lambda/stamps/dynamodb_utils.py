@@ -1,13 +1,27 @@
 import boto3
 import os
+import time
+from boto3.dynamodb.types import TypeDeserializer
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
+from stamp_catalog import get_catalog, get_catalog_stamp, get_active_stamps
 
 
 # DynamoDBクライアントの初期化
 dynamodb = boto3.resource('dynamodb')
+# 低レベルクライアントはスレッドセーフなので並列処理ではこちらを使用
 dynamodb_client = boto3.client('dynamodb')
 
+# BatchGetItemの1リクエストあたりの最大キー数（DynamoDBの上限）
+BATCH_GET_MAX_KEYS = 100
+# BatchGetItemを並列実行するスレッド数
+BATCH_GET_MAX_WORKERS = int(os.environ.get('STAMPS_BATCH_GET_WORKERS', '4'))
+# UnprocessedKeys の最大リトライ回数
+BATCH_MAX_RETRIES = 8
+
+_deserializer = TypeDeserializer()
+
 
 def get_table(table_name: str):
     """
@@ -35,38 +49,70 @@ def decimal_default(obj):
 
 def get_user_stamps(user_id: str) -> List[Dict[str, Any]]:
     """
-    ユーザーのスタンプ収集状況を取得
+    ユーザーのスタンプ収集状況を取得（全件）
     
     Args:
         user_id (str): ユーザーID（LINE UID）
     
     Returns:
-        List[Dict]: スタンプ収集情報のリスト
+        List[Dict]: スタンプ収集情報のリスト（StampId, CollectedAt, Method）
     """
-    table = get_table('UserStamps')
+    items, _ = query_user_stamps(user_id)
+    return items
+
+
+def query_user_stamps(user_id: str, limit: Optional[int] = None, start_stamp_id: Optional[str] = None,
+                      since: Optional[int] = None) -> tuple[List[Dict[str, Any]], bool]:
+    """
+    ユーザーのスタンプ収集状況をページ単位で取得
+    
+    一覧に必要な属性だけを射影し、低レベルクライアントの結果から直接変換する。
+    LastEvaluatedKeyを辿るため1MBを超えても途中で切れない
+    
+    Args:
+        user_id (str): ユーザーID（LINE UID）
+        limit (int, optional): 取得件数（省略時は全件）
+        start_stamp_id (str, optional): このStampIdの次から取得（前のページの最後のStampId）
+        since (int, optional): この収集日時（Unixタイムスタンプ）以降のスタンプのみ取得（差分同期用）
+    
+    Returns:
+        tuple: (スタンプ収集情報のリスト（StampIdの昇順）, 続きがあるかどうか)
+    """
+    table_name = get_table('UserStamps').name
+    
+    query_kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': 'UserId = :user_id',
+        'ProjectionExpression': 'StampId, CollectedAt, #method',
+        'ExpressionAttributeNames': {'#method': 'Method'},
+        'ExpressionAttributeValues': {':user_id': {'S': user_id}}
+    }
+    if since is not None:
+        query_kwargs['FilterExpression'] = 'CollectedAt >= :since'
+        query_kwargs['ExpressionAttributeValues'][':since'] = {'N': str(since)}
+    if start_stamp_id:
+        query_kwargs['ExclusiveStartKey'] = {'UserId': {'S': user_id}, 'StampId': {'S': start_stamp_id}}
+    if limit:
+        query_kwargs['Limit'] = limit
     
     try:
-        response = table.query(
-            KeyConditionExpression='UserId = :user_id',
-            ExpressionAttributeValues={
-                ':user_id': user_id
-            }
-        )
-        
-        # Decimal型を変換
-        items = response.get('Items', [])
-        result = []
-        for item in items:
-            # Decimalを変換
-            converted_item = {}
-            for key, value in item.items():
-                if isinstance(value, Decimal):
-                    converted_item[key] = int(value) if value % 1 == 0 else float(value)
-                else:
-                    converted_item[key] = value
-            result.append(converted_item)
-        
-        return result
+        items = []
+        while True:
+            response = dynamodb_client.query(**query_kwargs)
+            for item in response.get('Items', []):
+                items.append({
+                    'StampId': item['StampId']['S'],
+                    'CollectedAt': int(item['CollectedAt']['N']) if 'CollectedAt' in item else None,
+                    'Method': item.get('Method', {}).get('S')
+                })
+            
+            last_key = response.get('LastEvaluatedKey')
+            if limit and len(items) >= limit:
+                # フィルタで件数が揃うまで読んだ分のうち、limit件を超えた分は次のページで返す
+                return items[:limit], len(items) > limit or bool(last_key)
+            if not last_key:
+                return items, False
+            query_kwargs['ExclusiveStartKey'] = last_key
     except Exception as e:
         raise Exception(f"Failed to get user stamps: {str(e)}")
 
@@ -75,39 +121,170 @@ def get_stamp_master(stamp_id: str) -> Optional[Dict[str, Any]]:
     """
     スタンプマスタ情報を取得
     
+    StampMastersはコンテナ内のカタログ（stamp_catalog.py）から参照するため、
+    通常はDynamoDBを読まない
+    
     Args:
         stamp_id (str): スタンプID
     
     Returns:
         Optional[Dict]: スタンプマスタ情報（存在しない場合はNone）
     """
-    table = get_table('StampMasters')
+    try:
+        return get_catalog_stamp(stamp_id)
+    except Exception as e:
+        raise Exception(f"Failed to get stamp master: {str(e)}")
+
+
+def get_catalog_stamps(active_at: Optional[int] = None) -> tuple[List[Dict[str, Any]], Any]:
+    """
+    カタログのスタンプ一覧を取得（StampMastersはスキャンしない）
+    
+    Args:
+        active_at (Optional[int]): 指定した場合、この時刻（Unixタイムスタンプ）に有効なスタンプのみ
+            （有効期間のインデックスを bisect で参照）
     
+    Returns:
+        tuple: (スタンプマスタ情報のリスト（StampIdの昇順）, カタログのバージョン)
+    """
     try:
-        response = table.get_item(
-            Key={
-                'StampId': stamp_id
+        catalog = get_catalog()
+        if active_at is None:
+            stamps = [dict(catalog['by_id'][stamp_id]) for stamp_id in sorted(catalog['by_id'])]
+        else:
+            stamps = get_active_stamps(active_at)
+        return stamps, catalog['version']
+    except Exception as e:
+        raise Exception(f"Failed to get stamp catalog: {str(e)}")
+
+
+def convert_decimals(value: Any) -> Any:
+    """
+    Decimal型をint/floatに変換（Map/Listも再帰的に変換）
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    if isinstance(value, dict):
+        return {k: convert_decimals(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [convert_decimals(v) for v in value]
+    return value
+
+
+def get_stamp_masters(stamp_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    複数のスタンプマスタ情報をコンテナ内のカタログから取得
+    
+    カタログにないスタンプ（カタログの再確認前に追加されたものなど）だけを
+    BatchGetItemで補完する
+    
+    Args:
+        stamp_ids (List[str]): スタンプIDのリスト（重複可）
+    
+    Returns:
+        Dict[str, Dict]: StampId -> スタンプマスタ情報（存在しないスタンプは含まない）
+    """
+    try:
+        catalog = get_catalog()['by_id']
+    except Exception as e:
+        print(f'Warning: Failed to load stamp catalog: {str(e)}')
+        catalog = {}
+    
+    stamp_masters = {stamp_id: catalog[stamp_id] for stamp_id in stamp_ids if stamp_id in catalog}
+    missing_ids = [stamp_id for stamp_id in stamp_ids if stamp_id not in stamp_masters]
+    if missing_ids:
+        stamp_masters.update(batch_get_stamp_masters(missing_ids))
+    return stamp_masters
+
+
+def batch_get_stamp_masters(stamp_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    複数のスタンプマスタ情報をBatchGetItemでまとめて取得
+    
+    キーを100件ずつのチャンクに分けて並列に取得し、UnprocessedKeysは指数バックオフでリトライする。
+    一覧表示に必要な属性だけを取得する
+    
+    Args:
+        stamp_ids (List[str]): スタンプIDのリスト（重複可）
+    
+    Returns:
+        Dict[str, Dict]: StampId -> スタンプマスタ情報（存在しないスタンプは含まない）
+    """
+    table_name = get_table('StampMasters').name
+    unique_ids = list(dict.fromkeys(stamp_ids))
+    chunks = [unique_ids[i:i + BATCH_GET_MAX_KEYS] for i in range(0, len(unique_ids), BATCH_GET_MAX_KEYS)]
+    
+    def get_chunk(chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        request_items = {
+            table_name: {
+                'Keys': [{'StampId': {'S': stamp_id}} for stamp_id in chunk_ids],
+                'ProjectionExpression': 'StampId, #name, Description, #type',
+                'ExpressionAttributeNames': {'#name': 'Name', '#type': 'Type'}
             }
-        )
+        }
+        items = []
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request_items = response.get('UnprocessedKeys') or {}
+            if not request_items:
+                return items
+            time.sleep(min(0.05 * (2 ** attempt), 2.5))
         
+        raise Exception('BatchGetItem left unprocessed keys on StampMasters')
+    
+    try:
+        if len(chunks) <= 1:
+            chunk_results = [get_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(BATCH_GET_MAX_WORKERS, len(chunks))) as executor:
+                chunk_results = list(executor.map(get_chunk, chunks))
+        
+        stamp_masters = {}
+        for items in chunk_results:
+            for item in items:
+                master = convert_decimals({k: _deserializer.deserialize(v) for k, v in item.items()})
+                stamp_masters[master['StampId']] = master
+        return stamp_masters
+    except Exception as e:
+        raise Exception(f"Failed to batch get stamp masters: {str(e)}")
+
+
+def get_current_catalog_version() -> Any:
+    """
+    コンテナ内のカタログのバージョンを取得（CATALOG_REVALIDATE_SECONDS 秒ごとにGetItem 1回で確認）
+    
+    Returns:
+        Any: カタログのバージョン（StampMastersの '#CATALOG' アイテムの Version）
+    """
+    try:
+        return get_catalog()['version']
+    except Exception as e:
+        raise Exception(f"Failed to get catalog version: {str(e)}")
+
+
+def get_collection_version(user_id: str) -> Optional[int]:
+    """
+    ユーザーのスタンプ収集バージョン（award関数がスタンプ授与のたびに加算）を取得
+    
+    Args:
+        user_id (str): ユーザーID（LINE UID）
+    
+    Returns:
+        Optional[int]: 収集バージョン（ユーザーが存在しない場合はNone、未授与の場合は0）
+    """
+    table = get_table('Users')
+    
+    try:
+        response = table.get_item(
+            Key={'UserId': user_id},
+            ProjectionExpression='UserId, CollectionVersion'
+        )
         if 'Item' not in response:
             return None
-        
-        item = response['Item']
-        # Decimal型を変換
-        converted_item = {}
-        for key, value in item.items():
-            if isinstance(value, Decimal):
-                converted_item[key] = int(value) if value % 1 == 0 else float(value)
-            elif isinstance(value, dict):
-                # Map型のLocationなども変換
-                converted_item[key] = {k: (int(v) if isinstance(v, Decimal) and v % 1 == 0 else float(v) if isinstance(v, Decimal) else v) for k, v in value.items()}
-            else:
-                converted_item[key] = value
-        
-        return converted_item
+        return int(response['Item'].get('CollectionVersion', 0))
     except Exception as e:
-        raise Exception(f"Failed to get stamp master: {str(e)}")
+        raise Exception(f"Failed to get collection version: {str(e)}")
 
 
 def get_user(user_id: str) -> Optional[Dict[str, Any]]:
@@ -1,12 +1,171 @@
+import base64
+import hashlib
 import json
-from dynamodb_utils import get_user_stamps, get_stamp_master
-from response_utils import create_response
+import os
+import time
+from collections import OrderedDict
+from dynamodb_utils import (
+    query_user_stamps, get_stamp_masters, get_collection_version, get_current_catalog_version, get_catalog_stamps
+)
+from response_utils import create_response, create_not_modified_response
+
+# 1ページあたりの最大件数（limit指定時）
+STAMPS_PAGE_SIZE_MAX = int(os.environ.get('STAMPS_PAGE_SIZE_MAX', '100'))
+# レスポンスのコンテナ内キャッシュ件数（ユーザー・収集バージョン・カタログのバージョン・クエリごと）
+STAMPS_RESPONSE_CACHE_SIZE = int(os.environ.get('STAMPS_RESPONSE_CACHE_SIZE', '1000'))
+# (UserId, クエリ) -> ((収集バージョン, カタログのバージョン), レスポンスボディ)
+_response_cache = OrderedDict()
+# スタンプカタログ（GET /stamps/catalog）のCache-Control max-age（秒）
+STAMPS_CATALOG_MAX_AGE = int(os.environ.get('STAMPS_CATALOG_MAX_AGE', '60'))
+
+
+def get_header(event, name):
+    """
+    リクエストヘッダーを大文字小文字を区別せずに取得
+    
+    Args:
+        event (dict): API Gatewayのイベント
+        name (str): ヘッダー名
+    
+    Returns:
+        str: ヘッダーの値（存在しない場合はNone）
+    """
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def get_stamps_etag(user_id, collection_version, catalog_version, query_key):
+    """
+    ユーザーの収集バージョン・カタログのバージョンとクエリからETagを作成
+    
+    レスポンスはスタンプマスタの名前・説明を含むため、カタログの編集でもETagが変わるようにする
+    
+    Args:
+        user_id (str): ユーザーID
+        collection_version (int): 収集バージョン
+        catalog_version (int): カタログのバージョン
+        query_key (str): ページ送り・差分同期の指定を表す文字列
+    
+    Returns:
+        str: ETag（引用符付き）
+    """
+    digest = hashlib.sha1(f'{user_id}:{query_key}'.encode('utf-8')).hexdigest()[:12]
+    return f'"v{collection_version}-c{catalog_version}-{digest}"'
+
+
+def encode_cursor(user_id: str, stamp_id: str) -> str:
+    """
+    次のページの開始位置を不透明なカーソル文字列にエンコード
+    
+    Args:
+        user_id (str): ユーザーID
+        stamp_id (str): このページの最後のStampId
+    
+    Returns:
+        str: URLセーフなBase64文字列
+    """
+    raw = json.dumps({'u': user_id, 's': stamp_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(user_id: str, cursor: str) -> str:
+    """
+    encode_cursor()で作成したカーソルをデコード
+    
+    Args:
+        user_id (str): リクエストのユーザーID
+        cursor (str): カーソル文字列
+    
+    Returns:
+        str: 前のページの最後のStampId
+    
+    Raises:
+        ValueError: 不正なカーソル、または別のユーザーのカーソルの場合
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(state, dict) or state.get('u') != user_id or not isinstance(state.get('s'), str):
+        raise ValueError('Invalid cursor')
+    return state['s']
+
+
+def get_catalog_response(event, query_params):
+    """
+    スタンプカタログを取得
+    GET /stamps/catalog?active=now
+    
+    オプションのクエリパラメータ:
+    - active: "now" または Unixタイムスタンプ。指定した時刻に有効期間内のスタンプのみ返す
+      （省略時は全スタンプ）
+    
+    コンテナ内のカタログと有効期間のインデックスから返すため、StampMastersはスキャンしない。
+    ETagはカタログのバージョンと返すスタンプから作成し、If-None-Match が一致すれば304を返す
+    """
+    active = query_params.get('active')
+    if not active:
+        active_at = None
+    elif active == 'now':
+        active_at = int(time.time())
+    else:
+        try:
+            active_at = int(active)
+        except ValueError:
+            return create_response(400, {
+                'error': 'Bad Request',
+                'message': f'active must be "now" or a Unix timestamp: {active}'
+            })
+    
+    stamps, catalog_version = get_catalog_stamps(active_at)
+    
+    stamp_ids = ','.join(stamp['StampId'] for stamp in stamps)
+    digest = hashlib.sha1(f'{catalog_version}:{stamp_ids}'.encode('utf-8')).hexdigest()[:12]
+    cache_headers = {
+        'ETag': f'"c{catalog_version}-{digest}"',
+        'Cache-Control': f'public, max-age={STAMPS_CATALOG_MAX_AGE}'
+    }
+    if_none_match = get_header(event, 'If-None-Match')
+    if if_none_match and cache_headers['ETag'] in [tag.strip() for tag in if_none_match.split(',')]:
+        return create_not_modified_response(cache_headers)
+    
+    return create_response(200, {
+        'ok': True,
+        'stamps': [
+            {
+                'stamp_id': stamp['StampId'],
+                'name': stamp.get('Name'),
+                'description': stamp.get('Description'),
+                'type': stamp.get('Type'),
+                'image_url': stamp.get('ImageUrl'),
+                'location': stamp.get('Location'),
+                'valid_from': stamp.get('ValidFrom'),
+                'valid_to': stamp.get('ValidTo')
+            }
+            for stamp in stamps
+        ],
+        'total': len(stamps),
+        'active_at': active_at,
+        'catalog_version': catalog_version
+    }, cache_headers)
 
 
 def lambda_handler(event, context):
     """
     ユーザーの保有スタンプ一覧を取得
     GET /stamps?userId={userId}
+    
+    オプションのクエリパラメータ:
+    - limit: 1ページの件数（最大 STAMPS_PAGE_SIZE_MAX、省略時は全件）
+    - cursor: 前のレスポンスの next_cursor（続きのページを取得）
+    - since: この収集日時（Unixタイムスタンプ）以降のスタンプのみ返す（差分同期）
+    
+    Usersの CollectionVersion（スタンプ授与のたびに加算）とカタログのバージョンをETagとして返し、
+    If-None-Match が一致する場合はGetItem 1回だけで304を返す
+    
+    GET /stamps/catalog はスタンプカタログを返す（get_catalog_responseを参照）
     """
     try:
         # OPTIONSリクエストの処理（CORS preflight）
@@ -17,6 +176,9 @@ def lambda_handler(event, context):
         # Lambdaプロキシ統合の場合、queryStringParametersはNoneの可能性がある
         query_params = event.get('queryStringParameters') or {}
         
+        if (event.get('path') or '').rstrip('/').endswith('/stamps/catalog'):
+            return get_catalog_response(event, query_params)
+        
         # デバッグログ（CloudWatch Logsで確認）
         print(f"Event: {json.dumps(event)}")
         print(f"Query params: {query_params}")
@@ -30,14 +192,46 @@ def lambda_handler(event, context):
                 'message': f'userId is required. queryStringParameters: {query_params}'
             })
         
+        # ページ送り・差分同期の指定
+        try:
+            limit = int(query_params['limit']) if query_params.get('limit') else None
+            since = int(query_params['since']) if query_params.get('since') else None
+            start_stamp_id = decode_cursor(user_id, query_params['cursor']) if query_params.get('cursor') else None
+        except ValueError as e:
+            return create_response(400, {
+                'error': 'Bad Request',
+                'message': f'Invalid pagination parameters: {str(e)}'
+            })
+        if limit is not None:
+            limit = max(1, min(limit, STAMPS_PAGE_SIZE_MAX))
+        
+        # 収集バージョン・カタログのバージョンが変わっていなければ304、またはキャッシュ済みのレスポンスを返す
+        query_key = json.dumps([limit, query_params.get('cursor'), since])
+        collection_version = get_collection_version(user_id)
+        cache_headers = {}
+        if collection_version is not None:
+            versions = (collection_version, get_current_catalog_version())
+            etag = get_stamps_etag(user_id, *versions, query_key)
+            cache_headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+            if_none_match = get_header(event, 'If-None-Match')
+            if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+                return create_not_modified_response(cache_headers)
+            
+            cached = _response_cache.get((user_id, query_key))
+            if cached and cached[0] == versions:
+                _response_cache.move_to_end((user_id, query_key))
+                return create_response(200, cached[1], cache_headers)
+        
         # DynamoDBからスタンプ一覧を取得
-        user_stamps = get_user_stamps(user_id)
+        user_stamps, has_more = query_user_stamps(user_id, limit, start_stamp_id, since)
+        
+        # スタンプマスタ情報をまとめて取得して結合（カタログキャッシュ、不足分はBatchGetItem）
+        stamp_masters = get_stamp_masters([user_stamp.get('StampId') for user_stamp in user_stamps])
         
-        # スタンプマスタ情報を取得して結合
         stamps_detail = []
         for user_stamp in user_stamps:
             stamp_id = user_stamp.get('StampId')
-            stamp_master = get_stamp_master(stamp_id)
+            stamp_master = stamp_masters.get(stamp_id)
             
             if stamp_master:
                 # スタンプ情報を結合
@@ -55,10 +249,18 @@ def lambda_handler(event, context):
             'ok': True,
             'user_id': user_id,
             'stamps': stamps_detail,
-            'total': len(stamps_detail)
+            'total': len(stamps_detail),
+            'next_cursor': encode_cursor(user_id, user_stamps[-1]['StampId']) if has_more else None,
+            # 次回の差分同期で since に渡す値（同じ秒の取りこぼしを防ぐため since は以上で比較）
+            'max_collected_at': max((stamp['CollectedAt'] or 0 for stamp in user_stamps), default=None)
         }
         
-        return create_response(200, response_data)
+        if collection_version is not None:
+            _response_cache[(user_id, query_key)] = (versions, response_data)
+            while len(_response_cache) > STAMPS_RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+        
+        return create_response(200, response_data, cache_headers)
         
     except Exception as e:
         return create_response(500, {
@@ -1,29 +1,50 @@
 import json
 
 
-def create_response(status_code, body):
+def create_response(status_code, body, headers=None):
     """
     標準的なHTTPレスポンスを作成（共通ユーティリティ）
     
     Args:
         status_code (int): HTTPステータスコード
         body (dict): レスポンスボディ
+        headers (dict, optional): 追加のレスポンスヘッダー（ETag, Cache-Controlなど）
     
     Returns:
         dict: API Gateway用のレスポンス形式
     """
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',  # 後でCORS設定に置き換え
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,If-None-Match',
+        'Access-Control-Allow-Methods': 'GET,POST,OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if headers:
+        response_headers.update(headers)
+    
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',  # 後でCORS設定に置き換え
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
-        },
+        'headers': response_headers,
         'body': json.dumps(body, ensure_ascii=False)
     }
 
 
+def create_not_modified_response(headers=None):
+    """
+    304 Not Modified レスポンスを作成（ボディなし）
+    
+    Args:
+        headers (dict, optional): 追加のレスポンスヘッダー（ETag, Cache-Control）
+    
+    Returns:
+        dict: API Gateway用のレスポンス形式
+    """
+    response = create_response(304, {}, headers)
+    response['body'] = ''
+    return response
+
+
 def create_error_response(status_code, error_message, error_code=None):
     """
     エラーレスポンスを作成
@@ -0,0 +1,335 @@
+import boto3
+import os
+import time
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from threading import Lock
+from typing import Dict, List, Optional, Any, Tuple
+
+
+# DynamoDBクライアントの初期化
+dynamodb = boto3.resource('dynamodb')
+
+# カタログのバージョンを保持するStampMastersのアイテム（スタンプとしては扱わない）
+CATALOG_VERSION_STAMP_ID = '#CATALOG'
+# カタログのバージョンを確認する間隔（秒）
+CATALOG_REVALIDATE_SECONDS = int(os.environ.get('STAMP_CATALOG_REVALIDATE_SECONDS', '60'))
+# バージョンが更新されていなくても全件を読み直す間隔（秒）。バージョンを上げずに
+# コンソールから直接編集された場合の保険
+CATALOG_MAX_AGE_SECONDS = int(os.environ.get('STAMP_CATALOG_MAX_AGE_SECONDS', '900'))
+
+# コンテナ内のカタログ（ウォームスタート間で保持）
+_catalog = {
+    'version': None,
+    'loaded_at': 0,
+    'checked_at': 0,
+    'by_id': {},
+    'by_label': {},
+    'active_index': {'start_times': [], 'start_ids': [], 'end_times': [], 'end_ids': []}
+}
+_catalog_lock = Lock()
+
+
+def get_stamp_masters_table():
+    """
+    StampMastersテーブルリソースを取得
+
+    Returns:
+        dynamodb.Table: テーブルリソース
+    """
+    return dynamodb.Table(os.environ.get('TABLE_STAMPMASTERS', 'StampMasters'))
+
+
+def convert_decimals(value: Any) -> Any:
+    """
+    Decimal型をint/floatに変換（Map/Listも再帰的に変換）
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    if isinstance(value, dict):
+        return {k: convert_decimals(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [convert_decimals(v) for v in value]
+    return value
+
+
+def get_catalog_version() -> int:
+    """
+    カタログのバージョン（StampMastersの CATALOG_VERSION_STAMP_ID アイテムの Version）を取得
+
+    Returns:
+        int: バージョン（アイテムが存在しない場合は0）
+    """
+    response = get_stamp_masters_table().get_item(
+        Key={'StampId': CATALOG_VERSION_STAMP_ID},
+        ProjectionExpression='#version',
+        ExpressionAttributeNames={'#version': 'Version'}
+    )
+    return int(response.get('Item', {}).get('Version', 0))
+
+
+def get_validity_bounds(stamp: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    スタンプの有効期間（ValidFrom, ValidTo）を返す（未設定・0は期限なし）
+
+    Args:
+        stamp (Dict): スタンプマスタ情報
+
+    Returns:
+        tuple: (valid_from, valid_to)。期限なしの側はNone
+
+    Raises:
+        ValueError: ValidFrom / ValidTo が数値以外（文字列など）の場合
+    """
+    bounds = []
+    for name in ('ValidFrom', 'ValidTo'):
+        value = stamp.get(name)
+        if value is None:
+            bounds.append(None)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            bounds.append(value or None)
+        else:
+            raise ValueError(f"Invalid {name} for stamp {stamp.get('StampId')}: {value!r}")
+    return bounds[0], bounds[1]
+
+
+def build_active_index(by_id: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    有効期間のインデックスを作成
+
+    ValidFrom の昇順に並べた starts（ValidFrom未設定は -inf）と、ValidTo の昇順に並べた ends
+    （ValidTo未設定のスタンプは含まない）を作る。ある時刻に有効なスタンプは、bisect で求めた
+    starts の先頭部分（開始済み）から ends の先頭部分（終了済み）を除くだけで引ける。
+    作成は O(n log n)。ValidFrom / ValidTo が数値以外のスタンプは警告を出力し、どの時刻にも有効にしない
+
+    Args:
+        by_id (Dict): StampId -> スタンプマスタ情報
+
+    Returns:
+        Dict: {'start_times': [...], 'start_ids': [...], 'end_times': [...], 'end_ids': [...]}
+    """
+    starts = []
+    ends = []
+    for stamp_id, stamp in by_id.items():
+        try:
+            valid_from, valid_to = get_validity_bounds(stamp)
+        except ValueError as e:
+            print(f'Warning: {str(e)}. Stamp is treated as not valid.')
+            continue
+        if valid_from is not None and valid_to is not None and valid_from > valid_to:
+            # 有効期間が逆転しているスタンプはどの時刻にも有効にしない
+            continue
+        starts.append((float('-inf') if valid_from is None else valid_from, stamp_id))
+        if valid_to is not None:
+            ends.append((valid_to, stamp_id))
+
+    starts.sort()
+    ends.sort()
+    return {
+        'start_times': [start for start, _ in starts],
+        'start_ids': [stamp_id for _, stamp_id in starts],
+        'end_times': [end for end, _ in ends],
+        'end_ids': [stamp_id for _, stamp_id in ends]
+    }
+
+
+def find_active_stamp_ids(index: Dict[str, Any], at: float) -> Tuple[str, ...]:
+    """
+    インデックスから指定した時刻に有効なスタンプIDを求める
+
+    Args:
+        index (Dict): build_active_index の戻り値
+        at (float): 時刻（Unixタイムスタンプ）
+
+    Returns:
+        tuple: 有効なスタンプIDのタプル（昇順）
+    """
+    # ValidFrom <= at のスタンプ（開始済み）から ValidTo < at のスタンプ（終了済み）を除く
+    started = index['start_ids'][:bisect_right(index['start_times'], at)]
+    ended = set(index['end_ids'][:bisect_left(index['end_times'], at)])
+    return tuple(sorted(stamp_id for stamp_id in started if stamp_id not in ended))
+
+
+def load_catalog(version: int):
+    """
+    StampMastersを全件読み込み、StampId と ImageLabel の索引を作り直す
+
+    Args:
+        version (int): 読み込み前に取得したカタログのバージョン
+    """
+    table = get_stamp_masters_table()
+
+    by_id = {}
+    by_label = {}
+    scan_kwargs = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            stamp_id = item.get('StampId')
+            if stamp_id == CATALOG_VERSION_STAMP_ID:
+                continue
+            stamp = convert_decimals(item)
+            by_id[stamp_id] = stamp
+            # 同じImageLabelが複数ある場合は最初に見つかったスタンプを使う
+            if stamp.get('ImageLabel'):
+                by_label.setdefault(stamp['ImageLabel'], stamp)
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+    now = time.time()
+    _catalog.update({
+        'version': version,
+        'loaded_at': now,
+        'checked_at': now,
+        'by_id': by_id,
+        'by_label': by_label,
+        'active_index': build_active_index(by_id)
+    })
+    print(f'スタンプカタログ読み込み: version={version}, 件数={len(by_id)}')
+
+
+def get_catalog() -> Dict[str, Any]:
+    """
+    コンテナ内のカタログを返す（必要に応じてバージョンを確認して読み直す）
+
+    バージョンの確認は CATALOG_REVALIDATE_SECONDS 秒に1回、1アイテムのGetItemのみ。
+    バージョンが変わっている場合と、最後の全件読み込みから CATALOG_MAX_AGE_SECONDS 秒
+    経過した場合に全件を読み直す
+
+    Returns:
+        Dict: by_id（StampId -> スタンプ）、by_label（ImageLabel -> スタンプ）を含むカタログ
+    """
+    now = time.time()
+    if _catalog['version'] is not None and now - _catalog['checked_at'] < CATALOG_REVALIDATE_SECONDS:
+        return _catalog
+
+    with _catalog_lock:
+        # 他のスレッドが確認済みの場合はそのまま返す
+        if _catalog['version'] is not None and now - _catalog['checked_at'] < CATALOG_REVALIDATE_SECONDS:
+            return _catalog
+
+        try:
+            # バージョンを先に読むことで、読み込み中の更新は次回の確認で検知される
+            version = get_catalog_version()
+            if version != _catalog['version'] or now - _catalog['loaded_at'] >= CATALOG_MAX_AGE_SECONDS:
+                load_catalog(version)
+            else:
+                _catalog['checked_at'] = now
+        except Exception as e:
+            if _catalog['version'] is None:
+                raise Exception(f"Failed to load stamp catalog: {str(e)}")
+            # 読み込み済みのカタログがあれば、確認に失敗しても古いカタログで応答を続ける
+            print(f'Warning: Failed to revalidate stamp catalog: {str(e)}')
+            _catalog['checked_at'] = now
+
+    return _catalog
+
+
+def get_catalog_stamp(stamp_id: str) -> Optional[Dict[str, Any]]:
+    """
+    StampIdでスタンプマスタ情報を取得（メモリ上のカタログから）
+
+    Args:
+        stamp_id (str): スタンプID
+
+    Returns:
+        Optional[Dict]: スタンプマスタ情報のコピー（存在しない場合はNone）
+    """
+    stamp = get_catalog()['by_id'].get(stamp_id)
+    return dict(stamp) if stamp else None
+
+
+def find_catalog_stamp_by_label(image_label: str) -> Optional[Dict[str, Any]]:
+    """
+    ImageLabelでスタンプマスタ情報を取得（メモリ上のカタログから）
+
+    Args:
+        image_label (str): 画像認識ラベル
+
+    Returns:
+        Optional[Dict]: スタンプマスタ情報のコピー（存在しない場合はNone）
+    """
+    stamp = get_catalog()['by_label'].get(image_label)
+    return dict(stamp) if stamp else None
+
+
+def get_active_stamp_ids(at: Optional[float] = None) -> Tuple[str, ...]:
+    """
+    指定した時刻に有効なスタンプIDを返す（有効期間のインデックスを bisect で参照）
+
+    Args:
+        at (Optional[float]): 時刻（Unixタイムスタンプ、省略時は現在時刻）
+
+    Returns:
+        tuple: 有効なスタンプIDのタプル（昇順）
+    """
+    if at is None:
+        at = time.time()
+    return find_active_stamp_ids(get_catalog()['active_index'], at)
+
+
+def get_active_stamps(at: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    指定した時刻に有効なスタンプマスタ情報の一覧を返す（StampMastersはスキャンしない）
+
+    Args:
+        at (Optional[float]): 時刻（Unixタイムスタンプ、省略時は現在時刻）
+
+    Returns:
+        List[Dict]: スタンプマスタ情報のコピーのリスト（StampIdの昇順）
+    """
+    if at is None:
+        at = time.time()
+    catalog = get_catalog()
+    return [dict(catalog['by_id'][stamp_id]) for stamp_id in find_active_stamp_ids(catalog['active_index'], at)]
+
+
+def get_stamp_validity(stamp_id: str, at: Optional[float] = None) -> Optional[str]:
+    """
+    スタンプが指定した時刻に有効かを判定（そのスタンプの ValidFrom / ValidTo と比較、O(1)）
+
+    Args:
+        stamp_id (str): スタンプID
+        at (Optional[float]): 時刻（Unixタイムスタンプ、省略時は現在時刻）
+
+    Returns:
+        Optional[str]: 有効な場合はNone、無効な場合はエラーコード
+            （'STAMP_NOT_FOUND' / 'STAMP_NOT_VALID_YET' / 'STAMP_EXPIRED' / 'INVALID_STAMP_VALIDITY'）
+    """
+    if at is None:
+        at = time.time()
+    stamp = get_catalog()['by_id'].get(stamp_id)
+    if not stamp:
+        return 'STAMP_NOT_FOUND'
+
+    try:
+        valid_from, valid_to = get_validity_bounds(stamp)
+    except ValueError as e:
+        print(f'Warning: {str(e)}')
+        return 'INVALID_STAMP_VALIDITY'
+
+    if valid_from is not None and at < valid_from:
+        return 'STAMP_NOT_VALID_YET'
+    if valid_to is not None and at > valid_to:
+        return 'STAMP_EXPIRED'
+    return None
+
+
+def bump_catalog_version() -> int:
+    """
+    カタログのバージョンを1つ上げる（StampMastersを更新した後に呼び出す）
+
+    Returns:
+        int: 新しいバージョン
+    """
+    response = get_stamp_masters_table().update_item(
+        Key={'StampId': CATALOG_VERSION_STAMP_ID},
+        UpdateExpression='ADD #version :one SET UpdatedAt = :now',
+        ExpressionAttributeNames={'#version': 'Version'},
+        ExpressionAttributeValues={':one': 1, ':now': int(time.time())},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['Version'])
@@ -0,0 +1,131 @@
+import os
+import random
+import sys
+import types
+import unittest
+from decimal import Decimal
+
+# stamp_catalogはモジュール読み込み時にboto3のリソースを作るため、何も返さないモジュールに差し替える
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+sys.modules['boto3'] = types.SimpleNamespace(resource=lambda *args, **kwargs: None)
+
+import stamp_catalog  # noqa: E402
+
+
+class FakeStampMastersTable:
+    """StampMastersの get_item（#CATALOG）と scan だけを持つテーブル"""
+
+    def __init__(self, items, version=1):
+        self.items = items
+        self.version = version
+        self.scan_count = 0
+
+    def get_item(self, **kwargs):
+        return {'Item': {'StampId': stamp_catalog.CATALOG_VERSION_STAMP_ID, 'Version': Decimal(self.version)}}
+
+    def scan(self, **kwargs):
+        self.scan_count += 1
+        return {'Items': self.items}
+
+
+def stamp(stamp_id, valid_from=None, valid_to=None):
+    item = {'StampId': stamp_id, 'Name': stamp_id}
+    if valid_from is not None:
+        item['ValidFrom'] = valid_from
+    if valid_to is not None:
+        item['ValidTo'] = valid_to
+    return item
+
+
+class StampCatalogTestCase(unittest.TestCase):
+
+    def load(self, items):
+        self.table = FakeStampMastersTable(items)
+        stamp_catalog.get_stamp_masters_table = lambda: self.table
+        stamp_catalog._catalog.update({'version': None, 'loaded_at': 0, 'checked_at': 0})
+
+
+class ActiveIndexTest(StampCatalogTestCase):
+
+    def setUp(self):
+        self.load([
+            stamp('always'),
+            stamp('zero', Decimal(0), Decimal(0)),
+            stamp('from_200', Decimal(200)),
+            stamp('until_300', valid_to=Decimal(300)),
+            stamp('window', Decimal(100), Decimal(200)),
+            stamp('inverted', Decimal(300), Decimal(100)),
+            {'StampId': stamp_catalog.CATALOG_VERSION_STAMP_ID, 'Version': Decimal(1)}
+        ])
+
+    def active_ids(self, at):
+        return [item['StampId'] for item in stamp_catalog.get_active_stamps(at)]
+
+    def test_active_stamps_at_boundaries(self):
+        self.assertEqual(self.active_ids(99), ['always', 'until_300', 'zero'])
+        # ValidFrom と ValidTo の時刻はどちらも有効
+        self.assertEqual(self.active_ids(100), ['always', 'until_300', 'window', 'zero'])
+        self.assertEqual(self.active_ids(200), ['always', 'from_200', 'until_300', 'window', 'zero'])
+        self.assertEqual(self.active_ids(201), ['always', 'from_200', 'until_300', 'zero'])
+        self.assertEqual(self.active_ids(301), ['always', 'from_200', 'zero'])
+        self.assertEqual(stamp_catalog.get_active_stamp_ids(150), ('always', 'until_300', 'window', 'zero'))
+
+    def test_stamp_validity_uses_own_bounds(self):
+        self.assertIsNone(stamp_catalog.get_stamp_validity('window', 100))
+        self.assertIsNone(stamp_catalog.get_stamp_validity('window', 200))
+        self.assertEqual(stamp_catalog.get_stamp_validity('window', 99), 'STAMP_NOT_VALID_YET')
+        self.assertEqual(stamp_catalog.get_stamp_validity('window', 201), 'STAMP_EXPIRED')
+        self.assertIsNone(stamp_catalog.get_stamp_validity('zero', 10 ** 10))
+        self.assertEqual(stamp_catalog.get_stamp_validity('missing', 100), 'STAMP_NOT_FOUND')
+        # 有効期間が逆転しているスタンプはどの時刻にも有効にならない
+        for at in (50, 200, 350):
+            self.assertIsNotNone(stamp_catalog.get_stamp_validity('inverted', at))
+            self.assertNotIn('inverted', self.active_ids(at))
+
+    def test_catalog_is_loaded_once(self):
+        self.active_ids(100)
+        stamp_catalog.get_stamp_validity('window', 100)
+        self.assertEqual(self.table.scan_count, 1)
+
+
+class ActiveIndexMatchesValidityTest(StampCatalogTestCase):
+
+    def test_index_matches_per_stamp_validity(self):
+        rng = random.Random(25)
+        items = []
+        for i in range(200):
+            valid_from = rng.choice([None, 0, rng.randint(0, 1000)])
+            valid_to = rng.choice([None, 0, rng.randint(0, 1000)])
+            items.append(stamp(f'stamp_{i:03d}', valid_from, valid_to))
+        self.load(items)
+
+        for at in list(range(-1, 1002, 7)) + [0, 1000]:
+            expected = [item['StampId'] for item in sorted(items, key=lambda item: item['StampId'])
+                        if stamp_catalog.get_stamp_validity(item['StampId'], at) is None]
+            self.assertEqual(list(stamp_catalog.get_active_stamp_ids(at)), expected, at)
+
+
+class InvalidValidityTest(StampCatalogTestCase):
+
+    def test_non_numeric_bounds_are_rejected(self):
+        self.load([
+            stamp('string_to', Decimal(100), '2025-12-31'),
+            stamp('string_from', 'tomorrow'),
+            stamp('bool_to', valid_to=True),
+            stamp('ok', Decimal(100))
+        ])
+
+        self.assertEqual(stamp_catalog.get_active_stamp_ids(500), ('ok',))
+        for stamp_id in ('string_to', 'string_from', 'bool_to'):
+            self.assertEqual(stamp_catalog.get_stamp_validity(stamp_id, 500), 'INVALID_STAMP_VALIDITY')
+
+    def test_get_validity_bounds(self):
+        self.assertEqual(stamp_catalog.get_validity_bounds(stamp('a', 0, 0)), (None, None))
+        self.assertEqual(stamp_catalog.get_validity_bounds(stamp('a', 10, 20.5)), (10, 20.5))
+        with self.assertRaises(ValueError):
+            stamp_catalog.get_validity_bounds(stamp('a', '10'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+import threading
+import types
+import unittest
+from unittest import mock
+
+# dynamodb_utils・stamp_catalogはモジュール読み込み時にboto3のリソースを作るため、何も返さないモジュールに差し替える
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+sys.modules['boto3'] = types.SimpleNamespace(resource=lambda *args, **kwargs: None,
+                                             client=lambda *args, **kwargs: None)
+sys.modules['boto3.dynamodb'] = types.SimpleNamespace()
+sys.modules['boto3.dynamodb.types'] = types.SimpleNamespace(TypeDeserializer=lambda: None)
+
+import dynamodb_utils  # noqa: E402
+import lambda_function  # noqa: E402
+
+CATALOG = {
+    'stamp_001': {'StampId': 'stamp_001', 'Name': '駅前広場', 'Description': '駅前', 'Type': 'GPS'},
+    'stamp_002': {'StampId': 'stamp_002', 'Name': '中央公園', 'Description': '公園', 'Type': 'IMAGE'}
+}
+
+
+class FakeDeserializer:
+    """文字列と数値だけを変換するTypeDeserializer"""
+
+    def deserialize(self, value):
+        (type_name, raw), = value.items()
+        return int(raw) if type_name == 'N' else raw
+
+
+class FakeClient:
+    """StampMastersの batch_get_item だけを持つ低レベルクライアント"""
+
+    def __init__(self, stamp_ids, unprocessed_rounds=0):
+        self.stamp_ids = set(stamp_ids)
+        self.unprocessed_rounds = unprocessed_rounds
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems):
+        (table_name, request), = RequestItems.items()
+        with self.lock:
+            self.requests.append(request)
+            unprocessed = self.unprocessed_rounds > 0
+            self.unprocessed_rounds -= 1
+        keys = request['Keys']
+        if unprocessed:
+            # 先頭のキー以外を未処理として返す
+            processed, keys = keys[:1], keys[1:]
+            return {
+                'Responses': {table_name: self.items(processed)},
+                'UnprocessedKeys': {table_name: dict(request, Keys=keys)} if keys else {}
+            }
+        return {'Responses': {table_name: self.items(keys)}, 'UnprocessedKeys': {}}
+
+    def items(self, keys):
+        return [
+            {'StampId': key['StampId'], 'Name': {'S': f'name-{key["StampId"]["S"]}'}, 'Type': {'S': 'GPS'}}
+            for key in keys if key['StampId']['S'] in self.stamp_ids
+        ]
+
+
+class StampMastersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient([f'stamp_{number:03d}' for number in range(1, 300)])
+        self.catalog = {'version': 1, 'by_id': CATALOG}
+        patches = [
+            mock.patch.object(dynamodb_utils, 'dynamodb_client', self.client),
+            mock.patch.object(dynamodb_utils, '_deserializer', FakeDeserializer()),
+            mock.patch.object(dynamodb_utils, 'get_table', lambda table_name: types.SimpleNamespace(name=table_name)),
+            mock.patch.object(dynamodb_utils, 'get_catalog', lambda: self.catalog),
+            mock.patch('time.sleep', lambda seconds: None)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def requested_ids(self):
+        return sorted(key['StampId']['S'] for request in self.client.requests for key in request['Keys'])
+
+    def test_catalog_stamps_need_no_reads(self):
+        stamp_masters = dynamodb_utils.get_stamp_masters(['stamp_001', 'stamp_002', 'stamp_001'])
+
+        self.assertEqual(stamp_masters, CATALOG)
+        self.assertEqual(self.client.requests, [])
+
+    def test_missing_stamps_are_batch_read(self):
+        stamp_masters = dynamodb_utils.get_stamp_masters(['stamp_001', 'stamp_010', 'stamp_010', 'stamp_999'])
+
+        # カタログにないスタンプだけを重複なしで1回のBatchGetItemで取得する
+        self.assertEqual(len(self.client.requests), 1)
+        self.assertEqual(self.requested_ids(), ['stamp_010', 'stamp_999'])
+        self.assertEqual(self.client.requests[0]['ProjectionExpression'], 'StampId, #name, Description, #type')
+        # 存在しないスタンプは含まない
+        self.assertEqual(sorted(stamp_masters), ['stamp_001', 'stamp_010'])
+        self.assertEqual(stamp_masters['stamp_010']['Name'], 'name-stamp_010')
+
+    def test_keys_are_chunked_by_100(self):
+        self.catalog = {'version': 1, 'by_id': {}}
+        stamp_ids = [f'stamp_{number:03d}' for number in range(1, 251)]
+
+        stamp_masters = dynamodb_utils.get_stamp_masters(stamp_ids)
+
+        self.assertEqual(sorted(len(request['Keys']) for request in self.client.requests), [50, 100, 100])
+        self.assertEqual(self.requested_ids(), stamp_ids)
+        self.assertEqual(len(stamp_masters), 250)
+
+    def test_unprocessed_keys_are_retried(self):
+        self.client.unprocessed_rounds = 2
+
+        stamp_masters = dynamodb_utils.batch_get_stamp_masters(['stamp_010', 'stamp_011', 'stamp_012'])
+
+        self.assertEqual([len(request['Keys']) for request in self.client.requests], [3, 2, 1])
+        self.assertEqual(sorted(stamp_masters), ['stamp_010', 'stamp_011', 'stamp_012'])
+
+    def test_unprocessed_keys_left_after_retries_raise(self):
+        # 1回に1件ずつしか処理されず、リトライ回数内に取得しきれない
+        self.client.unprocessed_rounds = dynamodb_utils.BATCH_MAX_RETRIES + 1
+        stamp_ids = [f'stamp_{number:03d}' for number in range(10, 10 + dynamodb_utils.BATCH_MAX_RETRIES + 2)]
+
+        with self.assertRaises(Exception):
+            dynamodb_utils.batch_get_stamp_masters(stamp_ids)
+        self.assertEqual(len(self.client.requests), dynamodb_utils.BATCH_MAX_RETRIES + 1)
+
+    def test_catalog_failure_falls_back_to_batch_read(self):
+        def failing_catalog():
+            raise Exception('ProvisionedThroughputExceededException')
+
+        with mock.patch.object(dynamodb_utils, 'get_catalog', failing_catalog):
+            stamp_masters = dynamodb_utils.get_stamp_masters(['stamp_001', 'stamp_002'])
+
+        self.assertEqual(self.requested_ids(), ['stamp_001', 'stamp_002'])
+        self.assertEqual(stamp_masters['stamp_001']['Name'], 'name-stamp_001')
+
+
+class StampsListingJoinTest(unittest.TestCase):
+
+    def test_listing_joins_with_one_batch_read(self):
+        client = FakeClient(['stamp_010'])
+        user_stamps = [
+            {'StampId': 'stamp_001', 'CollectedAt': 100, 'Method': 'GPS'},
+            {'StampId': 'stamp_010', 'CollectedAt': 200, 'Method': 'IMAGE'},
+            {'StampId': 'stamp_999', 'CollectedAt': 300, 'Method': 'GPS'}
+        ]
+        patches = [
+            mock.patch.object(dynamodb_utils, 'dynamodb_client', client),
+            mock.patch.object(dynamodb_utils, '_deserializer', FakeDeserializer()),
+            mock.patch.object(dynamodb_utils, 'get_table', lambda table_name: types.SimpleNamespace(name=table_name)),
+            mock.patch.object(dynamodb_utils, 'get_catalog', lambda: {'version': 1, 'by_id': CATALOG}),
+            mock.patch.object(lambda_function, 'get_collection_version', lambda user_id: None),
+            mock.patch.object(lambda_function, 'query_user_stamps',
+                              lambda user_id, limit, start_stamp_id, since: (user_stamps, False))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        response = lambda_function.lambda_handler(
+            {'httpMethod': 'GET', 'path': '/stamps', 'queryStringParameters': {'userId': 'U0001'}}, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(len(client.requests), 1)
+        # スタンプマスタにないスタンプは一覧に含めない
+        self.assertEqual([(stamp['stamp_id'], stamp['name']) for stamp in json.loads(response['body'])['stamps']],
+                         [('stamp_001', '駅前広場'), ('stamp_010', 'name-stamp_010')])
+
+
+if __name__ == '__main__':
+    unittest.main()
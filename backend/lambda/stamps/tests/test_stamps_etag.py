@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import types
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+# dynamodb_utils・stamp_catalogはモジュール読み込み時にboto3のリソースを作るため、何も返さないモジュールに差し替える
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+sys.modules['boto3'] = types.SimpleNamespace(resource=lambda *args, **kwargs: None,
+                                             client=lambda *args, **kwargs: None)
+sys.modules['boto3.dynamodb'] = types.SimpleNamespace()
+sys.modules['boto3.dynamodb.types'] = types.SimpleNamespace(TypeDeserializer=lambda: None)
+
+import lambda_function  # noqa: E402
+import stamp_catalog  # noqa: E402
+
+NOW = 1762700000
+
+
+class FakeStampMastersTable:
+    """StampMastersの get_item（#CATALOG）と scan だけを持つテーブル"""
+
+    def __init__(self):
+        self.version = 1
+        self.items = {'stamp_001': {'StampId': 'stamp_001', 'Name': '駅前広場', 'Type': 'GPS'}}
+
+    def get_item(self, **kwargs):
+        return {'Item': {'StampId': stamp_catalog.CATALOG_VERSION_STAMP_ID, 'Version': Decimal(self.version)}}
+
+    def scan(self, **kwargs):
+        return {'Items': [dict(item) for item in self.items.values()]}
+
+
+class StampsETagTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = FakeStampMastersTable()
+        self.now = NOW
+        user_stamps = [{'UserId': 'U0001', 'StampId': 'stamp_001', 'CollectedAt': NOW - 60, 'Method': 'GPS'}]
+        patches = [
+            mock.patch('time.time', lambda: self.now),
+            mock.patch.object(stamp_catalog, 'get_stamp_masters_table', lambda: self.table),
+            mock.patch.object(lambda_function, 'get_collection_version', lambda user_id: 3),
+            mock.patch.object(lambda_function, 'query_user_stamps',
+                              lambda user_id, limit, start_stamp_id, since: (user_stamps, False))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        stamp_catalog._catalog.update({'version': None, 'loaded_at': 0, 'checked_at': 0})
+        lambda_function._response_cache.clear()
+
+    def get(self, if_none_match=None):
+        event = {'httpMethod': 'GET', 'path': '/stamps', 'queryStringParameters': {'userId': 'U0001'}}
+        if if_none_match:
+            event['headers'] = {'If-None-Match': if_none_match}
+        return lambda_function.lambda_handler(event, None)
+
+    def test_catalog_bump_changes_etag(self):
+        first = self.get()
+        etag = first['headers']['ETag']
+        self.assertEqual(first['statusCode'], 200)
+        self.assertEqual(self.get(if_none_match=etag)['statusCode'], 304)
+
+        # スタンプマスタを編集してバージョンを上げ、再確認の間隔が過ぎる
+        self.table.items['stamp_001']['Name'] = '駅前広場（改装後）'
+        self.table.version = 2
+        self.now += stamp_catalog.CATALOG_REVALIDATE_SECONDS
+
+        response = self.get(if_none_match=etag)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertNotEqual(response['headers']['ETag'], etag)
+        # コンテナ内のレスポンスキャッシュではなく、新しいカタログの内容を返す
+        self.assertEqual(json.loads(response['body'])['stamps'][0]['name'], '駅前広場（改装後）')
+        self.assertEqual(self.get(if_none_match=response['headers']['ETag'])['statusCode'], 304)
+
+    def test_etag_is_stable_until_catalog_version_changes(self):
+        etag = self.get()['headers']['ETag']
+
+        # バージョンを上げずに編集した場合は、再確認してもETagは変わらない
+        self.table.items['stamp_001']['Name'] = '駅前広場（改装後）'
+        self.now += stamp_catalog.CATALOG_REVALIDATE_SECONDS
+
+        self.assertEqual(self.get(if_none_match=etag)['statusCode'], 304)
+
+
+if __name__ == '__main__':
+    unittest.main()
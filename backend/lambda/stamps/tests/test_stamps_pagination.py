@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+# dynamodb_utils・stamp_catalogはモジュール読み込み時にboto3のリソースを作るため、何も返さないモジュールに差し替える
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTION_DIR)
+sys.modules['boto3'] = types.SimpleNamespace(resource=lambda *args, **kwargs: None,
+                                             client=lambda *args, **kwargs: None)
+sys.modules['boto3.dynamodb'] = types.SimpleNamespace()
+sys.modules['boto3.dynamodb.types'] = types.SimpleNamespace(TypeDeserializer=lambda: None)
+
+import dynamodb_utils  # noqa: E402
+import lambda_function  # noqa: E402
+
+
+class FakeClient:
+    """UserStampsの query だけを持つ低レベルクライアント
+
+    1回の応答は page_size 件まで（1MBの上限の代わり）。Limit はフィルタ前の評価件数に適用する
+    """
+
+    def __init__(self, collected_at, page_size=3):
+        self.items = [
+            {'UserId': {'S': 'U0001'}, 'StampId': {'S': stamp_id}, 'CollectedAt': {'N': str(at)},
+             'Method': {'S': 'GPS'}, 'Location': {'M': {}}}
+            for stamp_id, at in sorted(collected_at.items())
+        ]
+        self.page_size = page_size
+        self.requests = []
+
+    def query(self, **kwargs):
+        self.requests.append(kwargs)
+        user_id = kwargs['ExpressionAttributeValues'][':user_id']['S']
+        items = [item for item in self.items if item['UserId']['S'] == user_id]
+        start_key = kwargs.get('ExclusiveStartKey')
+        if start_key:
+            items = [item for item in items if item['StampId']['S'] > start_key['StampId']['S']]
+
+        evaluated = items[:min(self.page_size, kwargs.get('Limit') or self.page_size)]
+        response = {}
+        if len(evaluated) < len(items):
+            response['LastEvaluatedKey'] = {'UserId': {'S': user_id}, 'StampId': evaluated[-1]['StampId']}
+        since = kwargs['ExpressionAttributeValues'].get(':since')
+        if since:
+            evaluated = [item for item in evaluated if int(item['CollectedAt']['N']) >= int(since['N'])]
+
+        # ProjectionExpression の属性だけを返す
+        response['Items'] = [{name: item[name] for name in ('StampId', 'CollectedAt', 'Method')}
+                             for item in evaluated]
+        return response
+
+
+class StampsPaginationTest(unittest.TestCase):
+
+    def setUp(self):
+        # stamp_001〜stamp_008、収集日時は 100, 200, ... 800
+        self.client = FakeClient({f'stamp_{number:03d}': number * 100 for number in range(1, 9)})
+        catalog = {
+            'version': 1,
+            'by_id': {f'stamp_{number:03d}': {'StampId': f'stamp_{number:03d}', 'Name': f'スタンプ{number}'}
+                      for number in range(1, 9)}
+        }
+        patches = [
+            mock.patch.object(dynamodb_utils, 'dynamodb_client', self.client),
+            mock.patch.object(dynamodb_utils, 'get_table', lambda table_name: types.SimpleNamespace(name=table_name)),
+            mock.patch.object(dynamodb_utils, 'get_catalog', lambda: catalog),
+            mock.patch.object(lambda_function, 'get_collection_version', lambda user_id: None)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get(self, **query_params):
+        response = lambda_function.lambda_handler(
+            {'httpMethod': 'GET', 'path': '/stamps', 'queryStringParameters': dict(query_params, userId='U0001')},
+            None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_full_listing_follows_last_evaluated_key(self):
+        status, body = self.get()
+
+        self.assertEqual(status, 200)
+        # 1回の応答に収まらなくても途中で切れない
+        self.assertEqual(body['total'], 8)
+        self.assertEqual(len(self.client.requests), 3)
+        self.assertIsNone(body['next_cursor'])
+        self.assertEqual(body['max_collected_at'], 800)
+        # 一覧に使う属性だけを射影する
+        self.assertEqual(self.client.requests[0]['ProjectionExpression'], 'StampId, CollectedAt, #method')
+
+    def test_pages_follow_cursor(self):
+        stamp_ids = []
+        cursor = None
+        while True:
+            params = {'limit': '3'}
+            if cursor:
+                params['cursor'] = cursor
+            status, body = self.get(**params)
+            self.assertEqual(status, 200)
+            self.assertLessEqual(body['total'], 3)
+            stamp_ids.extend(stamp['stamp_id'] for stamp in body['stamps'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(stamp_ids, [f'stamp_{number:03d}' for number in range(1, 9)])
+
+    def test_since_returns_only_new_stamps(self):
+        status, body = self.get(since='600')
+
+        self.assertEqual(status, 200)
+        self.assertEqual([stamp['stamp_id'] for stamp in body['stamps']], ['stamp_006', 'stamp_007', 'stamp_008'])
+        self.assertEqual(self.client.requests[0]['FilterExpression'], 'CollectedAt >= :since')
+
+    def test_limit_with_since_reads_until_page_is_full(self):
+        # 先頭の評価範囲はフィルタでほぼ除外されるため、limit件揃うまで続きを読む
+        status, body = self.get(since='300', limit='4')
+
+        self.assertEqual([stamp['stamp_id'] for stamp in body['stamps']],
+                         ['stamp_003', 'stamp_004', 'stamp_005', 'stamp_006'])
+        self.assertIsNotNone(body['next_cursor'])
+
+        status, body = self.get(since='300', limit='4', cursor=body['next_cursor'])
+
+        self.assertEqual([stamp['stamp_id'] for stamp in body['stamps']], ['stamp_007', 'stamp_008'])
+        self.assertIsNone(body['next_cursor'])
+
+    def test_limit_is_capped(self):
+        with mock.patch.object(lambda_function, 'STAMPS_PAGE_SIZE_MAX', 2):
+            status, body = self.get(limit='1000')
+
+        self.assertEqual(body['total'], 2)
+        self.assertEqual(self.client.requests[0]['Limit'], 2)
+
+    def test_invalid_parameters_are_rejected(self):
+        other_user_cursor = lambda_function.encode_cursor('U0002', 'stamp_003')
+        for params in ({'limit': 'ten'}, {'since': 'yesterday'}, {'cursor': 'not a cursor!'},
+                       {'cursor': other_user_cursor}):
+            status, body = self.get(**params)
+            self.assertEqual(status, 400, params)
+            self.assertTrue(body['message'].startswith('Invalid pagination parameters'), params)
+        self.assertEqual(self.client.requests, [])
+
+    def test_cursor_round_trip(self):
+        cursor = lambda_function.encode_cursor('U0001', 'stamp_003')
+
+        self.assertEqual(lambda_function.decode_cursor('U0001', cursor), 'stamp_003')
+        with self.assertRaises(ValueError):
+            lambda_function.decode_cursor('U0002', cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
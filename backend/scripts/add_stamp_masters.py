@@ -13,6 +13,7 @@ DynamoDBのStampMastersテーブルにスタンプマスターデータを追加
 import json
 import os
 import sys
+import time
 import boto3
 from decimal import Decimal
 from typing import List, Dict, Any
@@ -127,6 +128,20 @@ def add_stamp_masters_to_dynamodb(table_name: str, stamp_masters: List[Dict[str,
             print(f"❌ {stamp_id}: {name} の追加に失敗しました: {str(e)}")
             error_count += 1
     
+    # Lambdaのスタンプカタログキャッシュ（stamp_catalog.py）に更新を知らせる
+    if success_count > 0:
+        try:
+            response = table.update_item(
+                Key={'StampId': '#CATALOG'},
+                UpdateExpression='ADD #version :one SET UpdatedAt = :now',
+                ExpressionAttributeNames={'#version': 'Version'},
+                ExpressionAttributeValues={':one': 1, ':now': int(time.time())},
+                ReturnValues='UPDATED_NEW'
+            )
+            print(f"✅ カタログのバージョンを更新しました: {response['Attributes']['Version']}")
+        except Exception as e:
+            print(f"❌ カタログのバージョン更新に失敗しました: {str(e)}")
+    
     print(f"\n--- 完了 ---")
     print(f"成功: {success_count}件")
     print(f"失敗: {error_count}件")
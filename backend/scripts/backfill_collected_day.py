@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+UserStampsテーブルの既存データに日付バケット（CollectedDay）を追加するスクリプト
+
+award関数・objectCustomLabel関数はスタンプ授与時にCollectedDayを書き込むが、
+それ以前に授与されたスタンプにはないため、CollectedDayIndex（GSI）に載らない。
+このスクリプトで一度だけ補完してから、POST /ranking/calculate?source=index を使用する。
+
+使用方法:
+    python3 backfill_collected_day.py
+
+環境変数:
+    TABLE_USERSTAMPS: テーブル名（デフォルト: UserStamps）
+    AWS_REGION: AWSリージョン（デフォルト: us-east-1）
+"""
+
+import os
+import sys
+import boto3
+from datetime import datetime
+
+
+def get_day_bucket(timestamp: int) -> str:
+    """タイムスタンプの日付バケット（例: "2025-11-10"）を返す（award関数と同じ形式）"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+
+def backfill_collected_day(table_name: str, region: str) -> int:
+    """
+    CollectedDayを持たないスタンプにCollectedDayを設定
+    
+    Returns:
+        int: 更新した件数
+    """
+    dynamodb = boto3.resource('dynamodb', region_name=region)
+    table = dynamodb.Table(table_name)
+    
+    updated_count = 0
+    scan_kwargs = {
+        'FilterExpression': 'attribute_not_exists(CollectedDay) AND attribute_exists(CollectedAt)',
+        'ProjectionExpression': 'UserId, StampId, CollectedAt'
+    }
+    
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            table.update_item(
+                Key={'UserId': item['UserId'], 'StampId': item['StampId']},
+                UpdateExpression='SET CollectedDay = :day',
+                ExpressionAttributeValues={':day': get_day_bucket(int(item['CollectedAt']))}
+            )
+            updated_count += 1
+        
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+        print(f"  {updated_count}件更新済み...")
+    
+    return updated_count
+
+
+def main():
+    """メイン処理"""
+    table_name = os.environ.get('TABLE_USERSTAMPS', 'UserStamps')
+    region = os.environ.get('AWS_REGION', 'us-east-1')
+    
+    print("=" * 60)
+    print("UserStamps CollectedDay 補完スクリプト")
+    print("=" * 60)
+    print(f"テーブル名: {table_name}")
+    print(f"リージョン: {region}\n")
+    
+    response = input("CollectedDayのないスタンプを更新します。続行しますか？ (y/N): ")
+    if response.lower() != 'y':
+        print("キャンセルしました。")
+        sys.exit(0)
+    
+    try:
+        updated_count = backfill_collected_day(table_name, region)
+    except Exception as e:
+        print(f"\nエラー: {str(e)}")
+        sys.exit(1)
+    
+    print(f"\n✅ 完了: {updated_count}件のスタンプにCollectedDayを設定しました")
+
+
+if __name__ == '__main__':
+    main()
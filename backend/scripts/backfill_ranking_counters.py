@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+RankingCountersテーブルの期間別カウンターをUserStampsから再構築するスクリプト
+
+award関数・objectCustomLabel関数はスタンプ授与時にカウンターを加算するが、
+それ以前に授与されたスタンプは含まれないため、カウンターからのランキングが過少になる。
+ranking関数はデフォルトでカウンターからランキングを計算するため、デプロイ時に
+（award関数のカウンター加算を有効にした後、最初のランキング計算の前に）このスクリプトを一度実行する。
+
+開始日以降に始まる週間・月間・日別の期間を対象に、UserStampsの再集計値でStampCountを上書きする
+（カウンターはあるがスタンプがないユーザーは0にする）。開始日を省略した場合は、
+現在の週と現在の月のうち早い方の開始日から集計する（ウィンドウランキングで過去の日別カウンターも
+使う場合は、RANKING_WINDOW_MAX_DAYS日前を開始日に指定する）。
+集計から書き込みまでの間に加算されたスタンプは上書きで失われるため、授与の少ない時間帯に実行すること。
+
+使用方法:
+    python3 backfill_ranking_counters.py [開始日（例: 2025-11-01）]
+
+環境変数:
+    TABLE_USERSTAMPS: UserStampsテーブル名（デフォルト: UserStamps）
+    TABLE_RANKINGCOUNTERS: RankingCountersテーブル名（デフォルト: RankingCounters）
+    RANKING_COUNTER_TTL_DAYS: カウンターの保持日数（デフォルト: 400、award関数と同じ値）
+    AWS_REGION: AWSリージョン（デフォルト: us-east-1）
+"""
+
+import os
+import sys
+import time
+import boto3
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+
+def get_period_keys(timestamp: int) -> List[str]:
+    """タイムスタンプが属する期間キー（週間・月間・日別）を返す（award関数と同じ形式）"""
+    dt = datetime.fromtimestamp(timestamp)
+    year, week, _ = dt.isocalendar()
+    return [
+        f'weekly-{year}-W{week:02d}',
+        f'monthly-{dt.year}-{dt.month:02d}',
+        f'daily-{dt.strftime("%Y-%m-%d")}'
+    ]
+
+
+def get_period_start(period_key: str) -> datetime:
+    """期間キーの開始日時を返す"""
+    period_type, period = period_key.split('-', 1)
+    if period_type == 'weekly':
+        year, week = period.split('-W')
+        return datetime.fromisocalendar(int(year), int(week), 1)
+    if period_type == 'monthly':
+        return datetime.strptime(period, '%Y-%m')
+    return datetime.strptime(period, '%Y-%m-%d')
+
+
+def get_default_since() -> datetime:
+    """現在の週（月曜日）と現在の月（1日）のうち早い方の開始日を返す"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    return min(week_start, month_start)
+
+
+def count_stamps_by_period(dynamodb, table_name: str, since: datetime) -> Dict[str, Counter]:
+    """
+    開始日以降のスタンプを期間キー・ユーザーごとに集計
+
+    Returns:
+        Dict[str, Counter]: 期間キー -> (UserId -> スタンプ数)（開始日より前に始まる期間は含まない）
+    """
+    table = dynamodb.Table(table_name)
+
+    counts = defaultdict(Counter)
+    scanned_count = 0
+    scan_kwargs = {
+        'FilterExpression': 'CollectedAt >= :since',
+        'ProjectionExpression': 'UserId, CollectedAt',
+        'ExpressionAttributeValues': {':since': int(since.timestamp())}
+    }
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            for period_key in get_period_keys(int(item['CollectedAt'])):
+                counts[period_key][item['UserId']] += 1
+            scanned_count += 1
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+        print(f"  {scanned_count}件集計済み...")
+
+    return {
+        period_key: period_counts for period_key, period_counts in counts.items()
+        if get_period_start(period_key) >= since
+    }
+
+
+def rebuild_counters(dynamodb, table_name: str, counts: Dict[str, Counter], ttl_days: int) -> int:
+    """
+    期間キーごとにStampCountを再集計値で上書き（既存のカウンターで再集計にないユーザーは0）
+
+    Returns:
+        int: 更新した件数
+    """
+    table = dynamodb.Table(table_name)
+
+    now = int(time.time())
+    updated_count = 0
+    for period_key in sorted(counts.keys()):
+        period_counts = Counter(counts[period_key])
+
+        query_kwargs = {
+            'KeyConditionExpression': 'Period = :period',
+            'ExpressionAttributeValues': {':period': period_key},
+            'ProjectionExpression': 'UserId'
+        }
+        while True:
+            response = table.query(**query_kwargs)
+            for item in response.get('Items', []):
+                period_counts.setdefault(item['UserId'], 0)
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            query_kwargs['ExclusiveStartKey'] = last_key
+
+        for user_id, count in period_counts.items():
+            table.update_item(
+                Key={'Period': period_key, 'UserId': user_id},
+                UpdateExpression='SET StampCount = :count, UpdatedAt = :now, #ttl = :ttl',
+                ExpressionAttributeNames={'#ttl': 'TTL'},
+                ExpressionAttributeValues={
+                    ':count': count,
+                    ':now': now,
+                    ':ttl': now + ttl_days * 86400
+                }
+            )
+            updated_count += 1
+        print(f"  {period_key}: {len(period_counts)}件")
+
+    return updated_count
+
+
+def main():
+    """メイン処理"""
+    userstamps_table = os.environ.get('TABLE_USERSTAMPS', 'UserStamps')
+    counters_table = os.environ.get('TABLE_RANKINGCOUNTERS', 'RankingCounters')
+    ttl_days = int(os.environ.get('RANKING_COUNTER_TTL_DAYS', '400'))
+    region = os.environ.get('AWS_REGION', 'us-east-1')
+
+    try:
+        since = datetime.strptime(sys.argv[1], '%Y-%m-%d') if len(sys.argv) > 1 else get_default_since()
+    except ValueError:
+        print("開始日は YYYY-MM-DD 形式で指定してください")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("RankingCounters 再構築スクリプト")
+    print("=" * 60)
+    print(f"UserStampsテーブル: {userstamps_table}")
+    print(f"RankingCountersテーブル: {counters_table}")
+    print(f"開始日: {since.strftime('%Y-%m-%d')}")
+    print(f"リージョン: {region}\n")
+
+    response = input("開始日以降の期間のカウンターを再集計値で上書きします。続行しますか？ (y/N): ")
+    if response.lower() != 'y':
+        print("キャンセルしました。")
+        sys.exit(0)
+
+    try:
+        dynamodb = boto3.resource('dynamodb', region_name=region)
+        counts = count_stamps_by_period(dynamodb, userstamps_table, since)
+        updated_count = rebuild_counters(dynamodb, counters_table, counts, ttl_days)
+    except Exception as e:
+        print(f"\nエラー: {str(e)}")
+        sys.exit(1)
+
+    print(f"\n✅ 完了: {len(counts)}期間・{updated_count}件のカウンターを再構築しました")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Usersテーブルの既存ユーザーに累計スタンプ数（StampCount）を設定するスクリプト
+
+auth関数は新規ユーザー作成時にStampCountを0で初期化し、award関数はStampCountがある
+ユーザーだけを加算するため、それ以前に登録したユーザーにはStampCountがない
+（ranking関数はUserStampsのCOUNTクエリにフォールバックする）。
+このスクリプトで一度だけUserStampsの件数を数えて設定する。
+既に設定済みのユーザーは上書きしない（if_not_exists）。数えてから設定するまでの間に
+授与されたスタンプは含まれないため、授与の少ない時間帯に実行すること。
+
+使用方法:
+    python3 backfill_user_stamp_count.py
+
+環境変数:
+    TABLE_USERS: Usersテーブル名（デフォルト: Users）
+    TABLE_USERSTAMPS: UserStampsテーブル名（デフォルト: UserStamps）
+    AWS_REGION: AWSリージョン（デフォルト: us-east-1）
+"""
+
+import os
+import sys
+import boto3
+
+
+def count_user_stamps(userstamps_table, user_id: str) -> int:
+    """ユーザーのスタンプ数をSelect='COUNT'のQueryで数える（アイテム本体は読まない）"""
+    count = 0
+    query_kwargs = {
+        'KeyConditionExpression': 'UserId = :user_id',
+        'ExpressionAttributeValues': {':user_id': user_id},
+        'Select': 'COUNT'
+    }
+
+    while True:
+        response = userstamps_table.query(**query_kwargs)
+        count += response.get('Count', 0)
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return count
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def backfill_user_stamp_count(users_table_name: str, userstamps_table_name: str, region: str) -> int:
+    """
+    StampCountを持たないユーザーにUserStampsの件数を設定
+
+    Returns:
+        int: 更新した件数
+    """
+    dynamodb = boto3.resource('dynamodb', region_name=region)
+    users_table = dynamodb.Table(users_table_name)
+    userstamps_table = dynamodb.Table(userstamps_table_name)
+
+    updated_count = 0
+    scan_kwargs = {
+        'FilterExpression': 'attribute_not_exists(StampCount)',
+        'ProjectionExpression': 'UserId'
+    }
+
+    while True:
+        response = users_table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            stamp_count = count_user_stamps(userstamps_table, item['UserId'])
+            users_table.update_item(
+                Key={'UserId': item['UserId']},
+                UpdateExpression='SET StampCount = if_not_exists(StampCount, :count)',
+                ExpressionAttributeValues={':count': stamp_count}
+            )
+            updated_count += 1
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+        print(f"  {updated_count}件更新済み...")
+
+    return updated_count
+
+
+def main():
+    """メイン処理"""
+    users_table_name = os.environ.get('TABLE_USERS', 'Users')
+    userstamps_table_name = os.environ.get('TABLE_USERSTAMPS', 'UserStamps')
+    region = os.environ.get('AWS_REGION', 'us-east-1')
+
+    print("=" * 60)
+    print("Users StampCount 補完スクリプト")
+    print("=" * 60)
+    print(f"Usersテーブル: {users_table_name}")
+    print(f"UserStampsテーブル: {userstamps_table_name}")
+    print(f"リージョン: {region}\n")
+
+    response = input("StampCountのないユーザーにスタンプ数を設定します。続行しますか？ (y/N): ")
+    if response.lower() != 'y':
+        print("キャンセルしました。")
+        sys.exit(0)
+
+    try:
+        updated_count = backfill_user_stamp_count(users_table_name, userstamps_table_name, region)
+    except Exception as e:
+        print(f"\nエラー: {str(e)}")
+        sys.exit(1)
+
+    print(f"\n✅ 完了: {updated_count}人のユーザーにStampCountを設定しました")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+NotificationOutboxテーブルとDynamoDB Streamsのトリガーを作成するスクリプト
+
+award関数・objectCustomLabel関数はデフォルト（NOTIFICATION_OUTBOX=dynamodb）で通知を
+NotificationOutboxテーブルに書き込むだけで応答し、notify関数がテーブルのストリームから
+まとめて送信する。award関数・objectCustomLabel関数をデプロイする前に、このスクリプトを一度実行する。
+
+以下を作成する（作成済みのものはそのまま使う）:
+    - NotificationOutboxテーブル（NotificationId、オンデマンド、ストリーム: NEW_IMAGE）
+    - TTL（TTL属性）
+    - テーブルのストリームからnotify関数へのイベントソースマッピング
+
+notify関数は先にデプロイし、IAMロールにストリームの読み取り権限
+（dynamodb:DescribeStream / GetRecords / GetShardIterator / ListStreams）を追加しておくこと。
+
+使用方法:
+    python3 create_notification_outbox.py
+
+環境変数:
+    TABLE_NOTIFICATIONOUTBOX: テーブル名（デフォルト: NotificationOutbox）
+    NOTIFY_FUNCTION_NAME: notify関数の関数名（デフォルト: notify）
+    AWS_REGION: AWSリージョン（デフォルト: us-east-1）
+"""
+
+import os
+import sys
+import boto3
+
+# ストリームから1回に読み取るレコード数と待ち時間（同じユーザーの通知をまとめて送るため）
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_BATCHING_WINDOW_SECONDS = 1
+
+
+def create_outbox_table(dynamodb_client, table_name: str) -> str:
+    """
+    ストリーム付きのNotificationOutboxテーブルを作成（既存の場合はストリームを有効化）
+
+    Returns:
+        str: ストリームのARN
+    """
+    try:
+        table = dynamodb_client.describe_table(TableName=table_name)['Table']
+        print(f"テーブルは作成済みです: {table_name}")
+    except dynamodb_client.exceptions.ResourceNotFoundException:
+        print(f"テーブルを作成中: {table_name}")
+        dynamodb_client.create_table(
+            TableName=table_name,
+            AttributeDefinitions=[{'AttributeName': 'NotificationId', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'NotificationId', 'KeyType': 'HASH'}],
+            BillingMode='PAY_PER_REQUEST',
+            StreamSpecification={'StreamEnabled': True, 'StreamViewType': 'NEW_IMAGE'}
+        )
+        dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+        table = dynamodb_client.describe_table(TableName=table_name)['Table']
+
+    if not table.get('StreamSpecification', {}).get('StreamEnabled'):
+        print("ストリームを有効化中（NEW_IMAGE）...")
+        dynamodb_client.update_table(
+            TableName=table_name,
+            StreamSpecification={'StreamEnabled': True, 'StreamViewType': 'NEW_IMAGE'}
+        )
+        dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+        table = dynamodb_client.describe_table(TableName=table_name)['Table']
+
+    ttl = dynamodb_client.describe_time_to_live(TableName=table_name)['TimeToLiveDescription']
+    if ttl.get('TimeToLiveStatus') not in ('ENABLED', 'ENABLING'):
+        print("TTLを有効化中（TTL属性）...")
+        dynamodb_client.update_time_to_live(
+            TableName=table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'TTL'}
+        )
+
+    return table['LatestStreamArn']
+
+
+def create_notify_trigger(lambda_client, stream_arn: str, function_name: str) -> str:
+    """
+    ストリームからnotify関数へのイベントソースマッピングを作成（既存の場合はそのまま）
+
+    Returns:
+        str: イベントソースマッピングのUUID
+    """
+    mappings = lambda_client.list_event_source_mappings(
+        EventSourceArn=stream_arn,
+        FunctionName=function_name
+    ).get('EventSourceMappings', [])
+    if mappings:
+        print(f"トリガーは作成済みです: {mappings[0]['UUID']}")
+        return mappings[0]['UUID']
+
+    print(f"トリガーを作成中: {function_name}")
+    # notify関数は送信の失敗をログのみで再送しない（再送すると送信済みのプッシュが重複する）
+    mapping = lambda_client.create_event_source_mapping(
+        EventSourceArn=stream_arn,
+        FunctionName=function_name,
+        StartingPosition='LATEST',
+        BatchSize=OUTBOX_BATCH_SIZE,
+        MaximumBatchingWindowInSeconds=OUTBOX_BATCHING_WINDOW_SECONDS,
+        MaximumRetryAttempts=0
+    )
+    return mapping['UUID']
+
+
+def main():
+    """メイン処理"""
+    table_name = os.environ.get('TABLE_NOTIFICATIONOUTBOX', 'NotificationOutbox')
+    function_name = os.environ.get('NOTIFY_FUNCTION_NAME', 'notify')
+    region = os.environ.get('AWS_REGION', 'us-east-1')
+
+    print("=" * 60)
+    print("NotificationOutbox 作成スクリプト")
+    print("=" * 60)
+    print(f"テーブル: {table_name}")
+    print(f"notify関数: {function_name}")
+    print(f"リージョン: {region}\n")
+
+    response = input("テーブル・ストリーム・トリガーを作成します。続行しますか？ (y/N): ")
+    if response.lower() != 'y':
+        print("キャンセルしました。")
+        sys.exit(0)
+
+    try:
+        dynamodb_client = boto3.client('dynamodb', region_name=region)
+        lambda_client = boto3.client('lambda', region_name=region)
+        stream_arn = create_outbox_table(dynamodb_client, table_name)
+        mapping_id = create_notify_trigger(lambda_client, stream_arn, function_name)
+    except Exception as e:
+        print(f"\nエラー: {str(e)}")
+        sys.exit(1)
+
+    print(f"\n✅ 完了: ストリーム {stream_arn} → {function_name}（{mapping_id}）")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,35 @@
 // API呼び出しラッパー
 
+/**
+ * CDNから静的ランキングを取得
+ * マニフェスト（短期キャッシュ）で最新の期間とキーを調べ、内容ハッシュ付きのランキング本体を取得する
+ * @param {string} boardName - ランキング名（weekly または monthly）
+ * @param {string} period - 期間（オプション、省略時は最新）
+ * @returns {Promise} ランキングデータ（マニフェストに存在しない場合はnull）
+ */
+async function getStaticRankings(boardName, period = null) {
+    const baseUrl = CONFIG.RANKING_CDN_URL.replace(/\/$/, '');
+    const manifestResponse = await fetch(`${baseUrl}/manifest.json`);
+    if (!manifestResponse.ok) {
+        throw new Error(`manifest status: ${manifestResponse.status}`);
+    }
+    const manifest = await manifestResponse.json();
+    
+    const periodKey = period ? `${boardName}-${period}` : (manifest.latest || {})[boardName];
+    const entry = periodKey && (manifest.boards || {})[periodKey];
+    if (!entry) {
+        return null;
+    }
+    
+    // キーはバケット内のフルパス（rankings/...）なので、プレフィックス部分を除いて連結
+    const objectPath = entry.key.substring(entry.key.indexOf(periodKey));
+    const boardResponse = await fetch(`${baseUrl}/${objectPath}`);
+    if (!boardResponse.ok) {
+        throw new Error(`board status: ${boardResponse.status}`);
+    }
+    return await boardResponse.json();
+}
+
 /**
  * 汎用API呼び出し関数
  * @param {string} endpoint - APIエンドポイント
@@ -223,6 +253,18 @@ try {
             });
         },
         
+        /**
+         * スタンプカタログを取得
+         * @param {boolean} activeOnly - trueの場合、現在有効期間内のスタンプのみ
+         * @returns {Promise} スタンプカタログ
+         */
+        async getStampCatalog(activeOnly = true) {
+            const endpoint = `${CONFIG.API_ENDPOINTS.STAMP_CATALOG}${activeOnly ? '?active=now' : ''}`;
+            return await apiCall(endpoint, {
+                method: 'GET'
+            });
+        },
+        
         /**
          * スタンプを授与
          * @param {string} userId - ユーザーID
@@ -241,6 +283,22 @@ try {
             });
         },
         
+        /**
+         * オフライン中に収集したスタンプをまとめて授与（同期）
+         * @param {string} userId - ユーザーID
+         * @param {Array<{stamp_id: string, method: string, client_collected_at: number}>} entries - 収集したスタンプ
+         * @returns {Promise} エントリーごとの授与結果（results）
+         */
+        async syncStamps(userId, entries) {
+            return await apiCall(CONFIG.API_ENDPOINTS.AWARD_BATCH, {
+                method: 'POST',
+                body: JSON.stringify({
+                    user_id: userId,
+                    entries: entries
+                })
+            });
+        },
+        
         /**
          * GPS位置情報を検証
          * @param {string} userId - ユーザーID
@@ -276,6 +334,19 @@ try {
          * @returns {Promise} ランキングデータ
          */
         async getRankings(endpoint, period = null) {
+            // 週間・月間ランキングはCDNの静的JSONを優先（取得できない場合はAPIにフォールバック）
+            const boardName = endpoint.replace(/^\/ranking\//, '');
+            if (CONFIG.RANKING_CDN_URL && (boardName === 'weekly' || boardName === 'monthly')) {
+                try {
+                    const board = await getStaticRankings(boardName, period);
+                    if (board) {
+                        return board;
+                    }
+                } catch (error) {
+                    console.warn('静的ランキングの取得に失敗、APIから取得します:', error);
+                }
+            }
+            
             let url = endpoint;
             if (period) {
                 url += `?period=${encodeURIComponent(period)}`;
@@ -7,6 +7,10 @@ const CONFIG = {
     // LINE Developersコンソールで取得
     LIFF_ID: window.LIFF_ID || '2008407212-wpMNWMbB',
     
+    // 静的ランキングの配信URL（CloudFront等、S3の rankings/ プレフィックスを指す）
+    // 未設定の場合はランキングAPIから取得
+    RANKING_CDN_URL: window.RANKING_CDN_URL || '',
+    
     // セッションストレージのキー
     STORAGE_KEYS: {
         ACCESS_TOKEN: 'stamp_rally_access_token',
@@ -18,7 +22,9 @@ const CONFIG = {
     API_ENDPOINTS: {
         AUTH: '/auth/verify',
         STAMPS: '/stamps',
+        STAMP_CATALOG: '/stamps/catalog',
         AWARD: '/stamps/award',
+        AWARD_BATCH: '/stamps/award/batch',
         GPS_VERIFY: '/gps/verify',
         S3_UPLOAD_URL: '/s3/upload-url'
     }